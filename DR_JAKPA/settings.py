@@ -24,6 +24,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'tinymce',
     'main',
     'blog',
@@ -56,6 +57,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'analytics.context_processors.analytics_beacon',
             ],
         },
     },
@@ -79,6 +81,27 @@ DATABASES = {
 }
 
 
+# Caches. Per process by default, which is right for one worker. With
+# several workers (gunicorn --workers / WEB_CONCURRENCY) set REDIS_URL:
+# analytics dedup, the live visitor counter, dashboard payloads and the
+# blog page cache then share one view (needs the redis package). System
+# checks analytics.W001/W002 warn about a per-process setup with
+# ANALYTICS_WORKERS > 1.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -207,4 +230,106 @@ TINYMCE_DEFAULT_CONFIG = {
     'images_reuse_filename': True,
     'file_picker_types': 'image',
     'images_file_types': 'jpg,jpeg,png,gif,webp',
-}
\ No newline at end of file
+}
+
+# Analytics ingestion buffer (see analytics/ingest.py)
+ANALYTICS_BUFFER_MAX_SIZE = 10000
+ANALYTICS_BUFFER_BATCH_SIZE = 500
+ANALYTICS_BUFFER_FLUSH_INTERVAL = 2.0
+
+# Offline GeoIP lookup (build with `manage.py load_geoip ranges.csv`)
+ANALYTICS_GEOIP_BACKEND = 'analytics.geoip.RangeDatabaseBackend'
+ANALYTICS_GEOIP_DATABASE = BASE_DIR / 'geoip' / 'ip-ranges.bin'
+ANALYTICS_GEOIP_CACHE_SIZE = 4096
+
+# Visitor dedup: LocalDedupBackend is per worker and needs no I/O;
+# CacheDedupBackend shares one view across workers through
+# ANALYTICS_DEDUP_CACHE and is used when Redis is configured
+ANALYTICS_DEDUP_BACKEND = (
+    'analytics.dedup.CacheDedupBackend' if os.getenv('REDIS_URL') else 'analytics.dedup.LocalDedupBackend'
+)
+ANALYTICS_DEDUP_CACHE = 'default'
+ANALYTICS_DEDUP_WINDOW = 600
+# Worker processes serving the site, for the per-process cache checks
+ANALYTICS_WORKERS = int(os.getenv('WEB_CONCURRENCY', 1))
+
+# Raw page views younger than this are left out of rollup_analytics runs.
+# Must exceed the oldest timestamp a beacon may carry (beacon.MAX_EVENT_AGE)
+# plus ANALYTICS_BUFFER_FLUSH_INTERVAL, or late rows land behind the
+# watermark (system check analytics.E001)
+ANALYTICS_ROLLUP_GRACE = 600
+
+# Dashboard payloads: fresh for TTL seconds, then served stale for up to
+# STALE_TTL more while one background refresh runs
+ANALYTICS_PAYLOAD_CACHE = 'default'
+ANALYTICS_PAYLOAD_TTL = 60
+ANALYTICS_PAYLOAD_STALE_TTL = 300
+
+# PageView partitions (PostgreSQL): created this many months ahead; raw
+# months older than ANALYTICS_RETENTION_MONTHS are archived to gzip CSV in
+# ANALYTICS_ARCHIVE_DIR and dropped once rolled up. None keeps everything.
+ANALYTICS_PARTITION_MONTHS_AHEAD = 3
+ANALYTICS_RETENTION_MONTHS = None
+ANALYTICS_ARCHIVE_DIR = BASE_DIR / 'archive' / 'pageviews'
+
+# Referrer classification: a referrer whose host is (or is a subdomain of)
+# one of these domains is counted as search/social; our own domains count
+# as direct. Search engines also match under any country suffix
+# (google.com.ng, google.co.uk). Anything else is a referral.
+ANALYTICS_SEARCH_ENGINES = [
+    'google.com', 'bing.com', 'yahoo.com', 'duckduckgo.com',
+    'yandex.com', 'baidu.com', 'ask.com',
+]
+ANALYTICS_SOCIAL_PLATFORMS = [
+    'facebook.com', 'twitter.com', 'x.com', 'linkedin.com',
+    'instagram.com', 'youtube.com', 'tiktok.com', 'pinterest.com',
+    'reddit.com', 'telegram.org', 'whatsapp.com', 'medium.com', 'threads.com',
+]
+ANALYTICS_INTERNAL_DOMAINS = ['doclumina.org']
+
+# How long a worker trusts its cached "is staff/author" answer for a user.
+# The local entry is dropped immediately on group changes.
+ANALYTICS_ROLE_CACHE_TTL = 300
+
+# Count page views from a browser beacon (POST /analytics/beacon/) instead
+# of in AnalyticsMiddleware, so public pages can be served from a cache
+ANALYTICS_BEACON = False
+
+# Collect LCP/INP/CLS/TTFB from real visitors through the same beacon and
+# keep them as per-day page histograms (see analytics/vitals.py)
+ANALYTICS_VITALS = True
+ANALYTICS_VITALS_FLUSH_INTERVAL = 10.0
+
+# How long a worker trusts its /blog/ slug -> title map before reloading it.
+# Saves and deletes in the same worker update it immediately.
+ANALYTICS_BLOG_TITLE_TTL = 300
+
+# Live visitor counter (analytics/live.py): a visitor is "active" if seen in
+# the last ACTIVE_MINUTES; the ring keeps MINUTES of per-minute views. It is
+# in memory unless ANALYTICS_LIVE_CACHE is shared (Redis), in which case up
+# to MAX_WORKERS workers publish their slots there. Under ASGI the
+# dashboard streams it (SSE), pushing every INTERVAL seconds and closing
+# after STREAM_SECONDS (the browser reconnects); under WSGI it polls every
+# INTERVAL seconds.
+ANALYTICS_LIVE_MINUTES = 30
+ANALYTICS_LIVE_ACTIVE_MINUTES = 5
+ANALYTICS_LIVE_INTERVAL = 5
+ANALYTICS_LIVE_STREAM_SECONDS = 300
+ANALYTICS_LIVE_CACHE = 'default'
+ANALYTICS_LIVE_MAX_WORKERS = 64
+
+# A visit ends after this many seconds without a page view from the same
+# ip + user agent (see analytics/visits.py)
+ANALYTICS_VISIT_TIMEOUT = 1800
+
+# Text search configuration (stemming, stop words) for blog post search
+BLOG_SEARCH_CONFIG = 'english'
+
+# Anonymous renders of the public blog pages are cached for this many
+# seconds (0 disables) in the BLOG_PAGE_CACHE alias and invalidated by
+# post/category/comment signals; use a shared cache across workers. Hit
+# counters are per process; on Redis they are summed across workers every
+# STATS_INTERVAL seconds (see page_cache_stats)
+BLOG_PAGE_CACHE = 'default'
+BLOG_PAGE_CACHE_TIMEOUT = 600
+BLOG_PAGE_CACHE_STATS_INTERVAL = 30
@@ -5,6 +5,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 
 from DR_JAKPA.views import tinymce_upload
+from analytics.views import beacon
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -15,6 +16,7 @@ urlpatterns = [
     path('dashboard/', include('dashboard.urls')),
     path('media-library/', include('media_manager.urls')),
     path('dashboard/analytics/', include('analytics.urls')),
+    path('analytics/beacon/', beacon, name='analytics_beacon'),
     path('chat/', include('jakpa_bot.urls')),
 ] 
 if settings.DEBUG:
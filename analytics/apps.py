@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class AnalyticsConfig(AppConfig):
     name = 'analytics'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,134 @@
+# analytics/beacon.py
+import json
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+from .dedup import get_dedup_backend
+from .ingest import page_view_buffer
+from .middleware import (
+    BOT_PATTERN, get_client_ip, get_page_title, page_view_event,
+)
+from .roles import role_cache
+from .vitals import METRIC_LIMITS, vitals_buffer, vitals_sample
+
+# A beacon body is a few hundred bytes per event; anything larger is not ours
+MAX_BODY_BYTES = 16384
+MAX_EVENTS = 20
+# Client timestamps older than this (or in the future) are replaced by "now"
+MAX_EVENT_AGE = 300
+MAX_CLOCK_SKEW = 60
+
+
+def parse_beacon(body):
+    """
+    (events, vitals) from a beacon body: one page-view event, a list of
+    them, or {"events": [...], "vitals": [...]} with either key optional.
+    An event is {"path": "/blog/x/", "referrer": "...", "ts": <epoch ms>};
+    only ``path`` is required. A vitals sample is {"path": ..., "name":
+    "LCP", "value": 1830}. Raises ValueError when the body is not a valid
+    beacon.
+    """
+    if len(body) > MAX_BODY_BYTES:
+        raise ValueError('body too large')
+    try:
+        payload = json.loads(body)
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError('invalid JSON')
+
+    if isinstance(payload, list):
+        payload = {'events': payload}
+    elif isinstance(payload, dict) and 'events' not in payload and 'vitals' not in payload:
+        payload = {'events': [payload]}
+    if not isinstance(payload, dict):
+        raise ValueError('expected an object or a list')
+    raw_events = payload.get('events') or []
+    raw_vitals = payload.get('vitals') or []
+    if not isinstance(raw_events, list) or not isinstance(raw_vitals, list):
+        raise ValueError('events and vitals must be lists')
+    if not 0 < len(raw_events) + len(raw_vitals) <= MAX_EVENTS:
+        raise ValueError('expected 1 to %d events' % MAX_EVENTS)
+
+    events = []
+    for event in raw_events:
+        if not isinstance(event, dict):
+            raise ValueError('event is not an object')
+        referrer = event.get('referrer') or ''
+        if not isinstance(referrer, str) or len(referrer) > 2000:
+            raise ValueError('invalid referrer')
+        events.append({
+            'path': _path(event),
+            'referrer': referrer,
+            'timestamp': _event_time(event.get('ts')),
+        })
+
+    vitals = []
+    for sample in raw_vitals:
+        if not isinstance(sample, dict):
+            raise ValueError('vitals sample is not an object')
+        name, value = sample.get('name'), sample.get('value')
+        if name not in METRIC_LIMITS:
+            raise ValueError('unknown metric')
+        if (
+            not isinstance(value, (int, float)) or isinstance(value, bool)
+            or not 0 <= value <= METRIC_LIMITS[name]
+        ):
+            raise ValueError('invalid %s value' % name)
+        vitals.append({'path': _path(sample), 'name': name, 'value': value})
+    return events, vitals
+
+
+def _path(item):
+    path = item.get('path')
+    if not isinstance(path, str) or not path.startswith('/') or len(path) > 255:
+        raise ValueError('invalid path')
+    return path
+
+
+def _event_time(ts):
+    now = timezone.now()
+    if not isinstance(ts, (int, float)) or isinstance(ts, bool):
+        return now
+    try:
+        when = datetime.fromtimestamp(ts / 1000, tz=dt_timezone.utc)
+    except (OverflowError, OSError, ValueError):
+        return now
+    age = (now - when).total_seconds()
+    return when if -MAX_CLOCK_SKEW <= age <= MAX_EVENT_AGE else now
+
+
+def record_beacon(request, events, vitals=()):
+    """
+    Apply the middleware's filters to a parsed beacon and queue what
+    counts: page views (only with ANALYTICS_BEACON, otherwise the
+    middleware records them) and Web Vitals samples. Paths come from the
+    client, so only TRACKED_PAGES and known post/category pages are kept;
+    anything else would add Page and DailyVitalStat rows at will. Returns
+    how many page views were queued.
+    """
+    user_agent = request.META.get('HTTP_USER_AGENT', '')
+    if not user_agent or BOT_PATTERN.search(user_agent):
+        return 0
+    if role_cache.is_excluded(request.user):
+        return 0
+    if not getattr(settings, 'ANALYTICS_BEACON', False):
+        events = []
+
+    for sample in vitals:
+        if get_page_title(sample['path'], strict=True):
+            vitals_buffer.put(vitals_sample(sample['path'], sample['name'], sample['value']))
+
+    ip_address = get_client_ip(request)
+    dedup = get_dedup_backend()
+    queued = 0
+    for event in events:
+        path = event['path']
+        page_title = get_page_title(path, strict=True)
+        if not page_title or dedup.seen_recently((ip_address, path)):
+            continue
+        page_view_buffer.put(page_view_event(
+            path, page_title, ip_address, user_agent, event['referrer'], event['timestamp'],
+        ))
+        queued += 1
+    return queued
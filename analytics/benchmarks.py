@@ -0,0 +1,405 @@
+# analytics/benchmarks.py
+# Benchmarks for the analytics layer, run with
+# `manage.py benchmark_analytics <name>`. They read (and with --seed, write)
+# the configured database, so point them at a scratch copy.
+import asyncio
+import math
+import random
+import re
+import time
+from datetime import timedelta
+from urllib.parse import urlparse
+
+import numpy as np
+from django.db import connection
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.test import AsyncClient, AsyncRequestFactory, Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from .dimensions import encode_page_views
+from .middleware import AnalyticsMiddleware
+from .models import PageView
+from .periods import DateRange
+from .services import AnalyticsService
+from .trends import analyze
+from .utils import TrafficSourceDetector, _classify_host, _referrer_host
+
+PERIODS = ['today', 'week', 'month', 'year']
+
+
+def seed_page_views(rows, days=3 * 365, batch_size=10000, seed=0):
+    """Insert ``rows`` synthetic PageViews spread over the last ``days``."""
+    rnd = random.Random(seed)
+    now = timezone.now()
+    pages = ['/', '/about/', '/services/', '/blog/'] + [f'/blog/post-{i}/' for i in range(200)]
+    sources = [('direct', None), ('search', 'google.com'), ('social', 'facebook.com'),
+               ('social', 'x.com'), ('referral', 'example.org')]
+    countries = [('Nigeria', 'Lagos', 'Lagos'), ('Nigeria', 'FCT', 'Abuja'),
+                 ('Germany', 'Berlin', 'Berlin'), ('Ghana', 'Greater Accra', 'Accra')]
+    user_agents = [
+        f'Mozilla/5.0 ({platform}) AppleWebKit/537.36 (KHTML, like Gecko) '
+        f'Chrome/{version}.0.0.0 {"Mobile " if "Android" in platform else ""}Safari/537.36'
+        for platform in [
+            'Windows NT 10.0; Win64; x64', 'Macintosh; Intel Mac OS X 10_15_7',
+            'X11; Linux x86_64', 'Linux; Android 10; K', 'Linux; Android 14; SM-A546E',
+        ]
+        for version in range(110, 130)
+    ]
+
+    created = 0
+    while created < rows:
+        batch = []
+        for _ in range(min(batch_size, rows - created)):
+            ts = now - timedelta(seconds=rnd.randint(0, days * 86400))
+            source, domain = rnd.choice(sources)
+            country, region, city = rnd.choice(countries)
+            page = rnd.choice(pages)
+            batch.append({
+                'page_url': page,
+                'page_title': page.strip('/').replace('-', ' ').title() or 'Homepage',
+                'traffic_source': source,
+                'referrer': f'https://{domain}/search?q={rnd.randint(0, 10 ** 6)}' if domain else None,
+                'referrer_domain': domain,
+                'ip_address': f'41.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}',
+                'user_agent': rnd.choice(user_agents),
+                'country': country,
+                'region': region,
+                'city': city,
+                'date': timezone.localdate(ts),
+                'timestamp': ts,
+            })
+        PageView.objects.bulk_create(encode_page_views(batch), batch_size=batch_size)
+        created += len(batch)
+    return created
+
+
+def measure(fn, repeat=5):
+    """Return (queries per call, best wall time in ms) over ``repeat`` runs."""
+    best = None
+    queries = 0
+    for _ in range(repeat):
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            fn()
+            elapsed = (time.perf_counter() - start) * 1000
+        queries = len(ctx.captured_queries)
+        best = elapsed if best is None else min(best, elapsed)
+    return queries, best
+
+
+def legacy_chart_data(period):
+    """The per-bucket COUNT implementation get_chart_data replaced."""
+    today = timezone.now().date()
+    if period == 'today':
+        return [
+            PageView.objects.filter(date=today, timestamp__hour=hour).count()
+            for hour in range(24)
+        ]
+    if period == 'week':
+        return [
+            PageView.objects.filter(
+                date__range=[today - timedelta(days=i * 7 + 6), today - timedelta(days=i * 7)]
+            ).count()
+            for i in range(3, -1, -1)
+        ]
+    if period == 'month':
+        data = []
+        for i in range(5, -1, -1):
+            month_date = (today.replace(day=1) - timedelta(days=32 * i)).replace(day=1)
+            next_month = (month_date + timedelta(days=32)).replace(day=1)
+            data.append(PageView.objects.filter(date__gte=month_date, date__lt=next_month).count())
+        return data
+    return [
+        PageView.objects.filter(date__year=today.year - i).count()
+        for i in range(2, -1, -1)
+    ]
+
+
+def bench_chart(out, repeat=5):
+    out.write(f"PageView rows: {PageView.objects.count()}")
+    out.write(f"{'period':<8} {'before q':>9} {'before ms':>10} {'after q':>8} {'after ms':>9}")
+    for period in PERIODS:
+        before_q, before_ms = measure(lambda: legacy_chart_data(period), repeat)
+        after_q, after_ms = measure(lambda: AnalyticsService.get_chart_data(period), repeat)
+        out.write(f"{period:<8} {before_q:>9} {before_ms:>10.1f} {after_q:>8} {after_ms:>9.1f}")
+    # Custom ranges with a comparison period, one query each regardless of span
+    out.write(f"{'range':<8} {'granularity':>11} {'points':>7} {'q':>4} {'ms':>7}")
+    today = timezone.localdate()
+    for days in (1, 30, 180, 730):
+        date_range = DateRange(today - timedelta(days=days - 1), today)
+        data = AnalyticsService.get_chart_data(date_range, compare=True)
+        queries, ms = measure(lambda: AnalyticsService.get_chart_data(date_range, compare=True), repeat)
+        out.write(f"{days:>5} d  {date_range.granularity:>11} {len(data):>7} {queries:>4} {ms:>7.1f}")
+
+
+def bench_visitors(out, repeat=5):
+    out.write(f"PageView rows: {PageView.objects.count()}")
+    out.write(f"{'period':<8} {'exact':>8} {'exact ms':>9} {'hll':>8} {'hll ms':>7} {'error':>7}")
+    for period in PERIODS:
+        filtered = AnalyticsService._filter_by_period(PageView.objects.all(), period)
+        exact = filtered.values('ip_address').distinct().count()
+        _, exact_ms = measure(lambda: filtered.values('ip_address').distinct().count(), repeat)
+        estimate = AnalyticsService.get_unique_visitors(period)
+        _, hll_ms = measure(lambda: AnalyticsService.get_unique_visitors(period), repeat)
+        error = (estimate - exact) / exact * 100 if exact else 0
+        out.write(f"{period:<8} {exact:>8} {exact_ms:>9.1f} {estimate:>8} {hll_ms:>7.1f} {error:>6.2f}%")
+
+
+def legacy_classify(referrer):
+    """The substring-scan TrafficSourceDetector plus the middleware's second urlparse."""
+    if not referrer:
+        return 'direct', None
+    domain = urlparse(referrer).netloc.lower()
+    if 'doclumina.org' in domain:
+        source = 'direct'
+    elif any(search in domain for search in TrafficSourceDetector.SEARCH_ENGINES):
+        source = 'search'
+    elif any(social in domain for social in TrafficSourceDetector.SOCIAL_PLATFORMS):
+        source = 'social'
+    else:
+        source = 'referral'
+    if source == 'direct':
+        return source, None
+    return source, urlparse(referrer).netloc.lower().replace('www.', '')
+
+
+def bench_classifier(out, repeat=5, calls=100000):
+    rnd = random.Random(0)
+    hosts = ['www.google.com', 'news.ycombinator.com', 'l.facebook.com', 'x.com',
+             'www.doclumina.org', 'example.org', 'blog.some-site.co.uk', 'www.linkedin.com']
+    referrers = [
+        f'https://{rnd.choice(hosts)}/path/{rnd.randint(0, 500)}?q={rnd.randint(0, 10 ** 6)}'
+        for _ in range(calls)
+    ]
+    unique = list(dict.fromkeys(referrers))
+
+    def run(fn, items):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for referrer in items:
+                fn(referrer)
+            elapsed = (time.perf_counter() - start) * 1e9 / len(items)
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def uncached(referrer):
+        host = _referrer_host(referrer)
+        return _classify_host.__wrapped__(host) if host else ('direct', None)
+
+    out.write(f"{calls} referrers, {len(unique)} distinct")
+    out.write(f"{'variant':<22} {'ns/call':>8}")
+    out.write(f"{'legacy':<22} {run(legacy_classify, referrers):>8.0f}")
+    out.write(f"{'classify (uncached)':<22} {run(uncached, referrers):>8.0f}")
+    _classify_host.cache_clear()
+    out.write(f"{'classify (LRU)':<22} {run(TrafficSourceDetector.classify, referrers):>8.0f}")
+    out.write(f"LRU: {_classify_host.cache_info()}")
+
+
+def table_sizes():
+    """
+    {table: (rows, table bytes, index bytes)} for the analytics tables.
+    PostgreSQL sums over partitions; SQLite needs the dbstat extension.
+    """
+    partition = re.compile(r'_(y\d{4}m\d{2}|default)$')
+    with connection.cursor() as cursor:
+        tables = [
+            name for name in connection.introspection.table_names(cursor)
+            if name.startswith('analytics_') and not partition.search(name)
+        ]
+        sizes = {}
+        for table in tables:
+            cursor.execute(f'SELECT count(*) FROM "{table}"')
+            rows = cursor.fetchone()[0]
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT coalesce(sum(pg_table_size(relid)), 0), '
+                    'coalesce(sum(pg_indexes_size(relid)), 0) FROM ('
+                    'SELECT relid FROM pg_partition_tree(%s::regclass) '
+                    'UNION SELECT %s::regclass) tree',
+                    [table, table],
+                )
+                table_bytes, index_bytes = cursor.fetchone()
+            else:
+                cursor.execute(
+                    "SELECT sum(CASE WHEN name = %s THEN pgsize END), "
+                    "sum(CASE WHEN name != %s THEN pgsize END) FROM dbstat WHERE name IN "
+                    "(SELECT name FROM sqlite_master WHERE tbl_name = %s)",
+                    [table, table, table],
+                )
+                table_bytes, index_bytes = cursor.fetchone()
+            sizes[table] = (rows, table_bytes or 0, index_bytes or 0)
+    return sizes
+
+
+def bench_storage(out, repeat=None):
+    out.write(f"{'table':<36} {'rows':>10} {'table MB':>9} {'index MB':>9} {'B/row':>7}")
+    for table, (rows, table_bytes, index_bytes) in sorted(table_sizes().items()):
+        per_row = (table_bytes + index_bytes) / rows if rows else 0
+        out.write(
+            f"{table:<36} {rows:>10} {table_bytes / 2 ** 20:>9.2f} "
+            f"{index_bytes / 2 ** 20:>9.2f} {per_row:>7.0f}"
+        )
+
+
+def legacy_analyze(series, season=7, ma_window=7, z_window=28, threshold=3.0):
+    """analyze() for one series at a time in plain Python, for comparison."""
+    current = sum(series[-season:])
+    previous = sum(series[-2 * season:-season])
+    moving = [sum(series[t - ma_window + 1:t + 1]) / ma_window for t in range(ma_window - 1, len(series))]
+    spikes = []
+    for t in range(z_window, len(series)):
+        window = series[t - z_window:t]
+        mean = sum(window) / z_window
+        std = max(math.sqrt(sum((v - mean) ** 2 for v in window) / z_window), math.sqrt(mean), 1.0)
+        spikes.append((series[t] - mean) / std > threshold)
+    return current, previous, moving, spikes
+
+
+def bench_trends(out, repeat=5, buckets=112):
+    """analyze() over synthetic daily series vs a per-series Python loop."""
+    rng = np.random.default_rng(0)
+    out.write(f"{'series':>7} {'buckets':>8} {'loop ms':>9} {'numpy ms':>9} {'speedup':>8}")
+    for series in (100, 1000, 5000):
+        matrix = rng.poisson(rng.gamma(2, 20, size=(series, 1)), size=(series, buckets)).astype(float)
+        rows = matrix.tolist()
+        loop_ms = numpy_ms = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for row in rows:
+                legacy_analyze(row)
+            elapsed = (time.perf_counter() - start) * 1000
+            loop_ms = elapsed if loop_ms is None else min(loop_ms, elapsed)
+            start = time.perf_counter()
+            analyze(matrix)
+            elapsed = (time.perf_counter() - start) * 1000
+            numpy_ms = elapsed if numpy_ms is None else min(numpy_ms, elapsed)
+        out.write(f"{series:>7} {buckets:>8} {loop_ms:>9.1f} {numpy_ms:>9.1f} {loop_ms / numpy_ms:>7.0f}x")
+
+
+class SyncOnlyAnalyticsMiddleware(AnalyticsMiddleware):
+    """AnalyticsMiddleware as a sync-only middleware, adapted onto a thread under ASGI."""
+    async_capable = False
+
+
+ANALYTICS_MIDDLEWARE = 'analytics.middleware.AnalyticsMiddleware'
+
+MIDDLEWARE_MODES = [
+    # (label, ASGI?, analytics middleware in the stack)
+    ('wsgi, no analytics', False, None),
+    ('wsgi', False, ANALYTICS_MIDDLEWARE),
+    ('asgi, no analytics', True, None),
+    ('asgi-sync', True, 'analytics.benchmarks.SyncOnlyAnalyticsMiddleware'),
+    ('asgi-async', True, ANALYTICS_MIDDLEWARE),
+]
+
+
+def _middleware_with(replacement):
+    return [
+        m for m in (replacement if m == ANALYTICS_MIDDLEWARE else m for m in settings.MIDDLEWARE)
+        if m
+    ]
+
+
+def bench_middleware(out, repeat=5, requests=200):
+    """
+    Requests per second through the full handler (test client, in-process),
+    each request from a new IP so the middleware records a view every time.
+    """
+    headers = {'user-agent': 'Mozilla/5.0 (benchmark)'}
+    counter = iter(range(10 ** 9))
+
+    def next_headers():
+        n = next(counter)
+        return {**headers, 'x-forwarded-for': f'10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}'}
+
+    def run_wsgi(path):
+        client = Client()
+        for _ in range(requests):
+            client.get(path, headers=next_headers())
+
+    async def run_asgi(path):
+        client = AsyncClient()
+        for _ in range(requests):
+            await client.get(path, headers=next_headers())
+
+    out.write(f"{requests} sequential requests per run, best of {repeat}")
+    out.write(f"{'mode':<20} {'path':<8} {'req/s':>8} {'ms/req':>7}")
+    for label, is_asgi, middleware in MIDDLEWARE_MODES:
+        with override_settings(MIDDLEWARE=_middleware_with(middleware)):
+            for path in ['/', '/blog/']:
+                best = None
+                # First run warms templates, connections and caches
+                for _ in range(repeat + 1):
+                    start = time.perf_counter()
+                    if is_asgi:
+                        asyncio.run(run_asgi(path))
+                    else:
+                        run_wsgi(path)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                out.write(f"{label:<20} {path:<8} {requests / best:>8.0f} {best * 1000 / requests:>7.2f}")
+
+    # The middleware alone around a trivial view, which is what it adds per request
+    response = HttpResponse()
+    sync_mw = AnalyticsMiddleware(lambda request: response)
+
+    async def async_view(request):
+        return response
+
+    async_mw = AnalyticsMiddleware(async_view)
+
+    async def auser():
+        return AnonymousUser()
+
+    def requests_for(factory, path):
+        batch = []
+        for _ in range(requests):
+            request = factory.get(path, headers=next_headers())
+            request.user = AnonymousUser()
+            request.auser = auser
+            batch.append(request)
+        return batch
+
+    def time_sync(batch):
+        start = time.perf_counter()
+        for request in batch:
+            sync_mw(request)
+        return time.perf_counter() - start
+
+    async def time_async(batch, hop):
+        start = time.perf_counter()
+        for request in batch:
+            if hop:
+                # How Django runs a sync-only middleware under ASGI
+                await sync_to_async(sync_mw, thread_sensitive=True)(request)
+            else:
+                await async_mw(request)
+        return time.perf_counter() - start
+
+    out.write("")
+    out.write("Middleware only, recording every request")
+    out.write(f"{'mode':<20} {'path':<8} {'us/req':>7}")
+    for label, run in [
+        ('wsgi', lambda path: time_sync(requests_for(RequestFactory(), path))),
+        ('asgi-sync', lambda path: asyncio.run(time_async(requests_for(AsyncRequestFactory(), path), True))),
+        ('asgi-async', lambda path: asyncio.run(time_async(requests_for(AsyncRequestFactory(), path), False))),
+    ]:
+        for path in ['/', '/blog/']:
+            best = min(run(path) for _ in range(repeat + 1))
+            out.write(f"{label:<20} {path:<8} {best * 1e6 / requests:>7.1f}")
+
+
+BENCHMARKS = {
+    'chart': bench_chart,
+    'visitors': bench_visitors,
+    'classifier': bench_classifier,
+    'middleware': bench_middleware,
+    'storage': bench_storage,
+    'trends': bench_trends,
+}
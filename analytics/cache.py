@@ -0,0 +1,99 @@
+# analytics/cache.py
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'analytics:payload:version'
+
+
+class PayloadCache:
+    """
+    Short-lived cache for dashboard JSON payloads with stale-while-revalidate.
+
+    Entries are fresh for ``ttl`` seconds and then served stale for up to
+    ``stale_ttl`` more while one background refresh runs. Recomputes are
+    coalesced: a per-process lock serialises threads, and a cache.add lock
+    keeps other workers from recomputing the same payload at the same time
+    (when the cache is shared). Bumping the version (done when rollups
+    advance) orphans every cached payload at once.
+    """
+    LOCK_TIMEOUT = 30
+    WAIT_INTERVAL = 0.05
+
+    def __init__(self, ttl=None, stale_ttl=None, alias=None):
+        self.ttl = getattr(settings, 'ANALYTICS_PAYLOAD_TTL', 60) if ttl is None else ttl
+        self.stale_ttl = getattr(settings, 'ANALYTICS_PAYLOAD_STALE_TTL', 300) if stale_ttl is None else stale_ttl
+        self.alias = alias or getattr(settings, 'ANALYTICS_PAYLOAD_CACHE', 'default')
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _key(self, name):
+        return f'analytics:payload:{self.cache.get(VERSION_KEY, 0)}:{name}'
+
+    def _local_lock(self, key):
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _build(self, key, builder):
+        payload = builder()
+        self.cache.set(key, (time.time(), payload), self.ttl + self.stale_ttl)
+        return payload
+
+    def _refresh(self, key, builder):
+        try:
+            self._build(key, builder)
+        except Exception:
+            logger.exception('Background refresh of %s failed', key)
+        finally:
+            self.cache.delete(f'{key}:lock')
+            close_old_connections()
+
+    def get(self, name, builder):
+        key = self._key(name)
+        entry = self.cache.get(key)
+        if entry is not None:
+            built_at, payload = entry
+            if time.time() - built_at >= self.ttl and self.cache.add(f'{key}:lock', 1, self.LOCK_TIMEOUT):
+                threading.Thread(target=self._refresh, args=(key, builder), daemon=True).start()
+            return payload
+
+        # Miss: the first caller computes, everyone else waits for its result
+        with self._local_lock(key):
+            entry = self.cache.get(key)
+            if entry is not None:
+                return entry[1]
+
+            deadline = time.monotonic() + self.LOCK_TIMEOUT
+            while not self.cache.add(f'{key}:lock', 1, self.LOCK_TIMEOUT):
+                # Another worker is computing this payload
+                time.sleep(self.WAIT_INTERVAL)
+                entry = self.cache.get(key)
+                if entry is not None:
+                    return entry[1]
+                if time.monotonic() > deadline:
+                    return self._build(key, builder)
+            try:
+                return self._build(key, builder)
+            finally:
+                self.cache.delete(f'{key}:lock')
+
+    def invalidate(self):
+        cache = self.cache
+        cache.add(VERSION_KEY, 0, None)
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 1, None)
+
+
+payload_cache = PayloadCache()
@@ -0,0 +1,59 @@
+# analytics/checks.py
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+# Cache backends that live inside one process
+PROCESS_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def dedup_backend_check(app_configs, **kwargs):
+    """
+    With more than one worker, visitor dedup that is not shared counts a
+    visitor once per worker.
+    """
+    if getattr(settings, 'ANALYTICS_WORKERS', 1) <= 1:
+        return []
+    backend = getattr(settings, 'ANALYTICS_DEDUP_BACKEND', 'analytics.dedup.LocalDedupBackend')
+    if backend == 'analytics.dedup.LocalDedupBackend':
+        return [Warning(
+            'ANALYTICS_DEDUP_BACKEND is LocalDedupBackend, which is per process, '
+            'but ANALYTICS_WORKERS is more than 1.',
+            hint='Set REDIS_URL so dedup uses analytics.dedup.CacheDedupBackend with a shared cache.',
+            id='analytics.W001',
+        )]
+    if backend == 'analytics.dedup.CacheDedupBackend':
+        alias = getattr(settings, 'ANALYTICS_DEDUP_CACHE', 'default')
+        cache_backend = settings.CACHES.get(alias, {}).get('BACKEND')
+        if cache_backend in PROCESS_CACHES:
+            return [Warning(
+                f'ANALYTICS_DEDUP_CACHE ({alias!r}) is a per-process cache ({cache_backend}), '
+                'but ANALYTICS_WORKERS is more than 1.',
+                hint='Set REDIS_URL (or point the alias at Memcached) so every worker shares it.',
+                id='analytics.W002',
+            )]
+    return []
+
+
+@register()
+def rollup_grace_check(app_configs, **kwargs):
+    """
+    A beacon may carry a timestamp up to MAX_EVENT_AGE old and waits up to
+    a flush interval in the buffer; a row written later than the grace
+    lands behind the rollup watermark and never reaches the reports.
+    """
+    from .beacon import MAX_EVENT_AGE
+
+    grace = getattr(settings, 'ANALYTICS_ROLLUP_GRACE', 600)
+    flush_interval = getattr(settings, 'ANALYTICS_BUFFER_FLUSH_INTERVAL', 2.0)
+    if grace <= MAX_EVENT_AGE + flush_interval:
+        return [Error(
+            f'ANALYTICS_ROLLUP_GRACE ({grace}s) must be greater than the beacon MAX_EVENT_AGE '
+            f'({MAX_EVENT_AGE}s) plus ANALYTICS_BUFFER_FLUSH_INTERVAL ({flush_interval}s).',
+            hint=f'Raise ANALYTICS_ROLLUP_GRACE above {MAX_EVENT_AGE + flush_interval:g}.',
+            id='analytics.E001',
+        )]
+    return []
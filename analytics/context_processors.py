@@ -0,0 +1,10 @@
+# analytics/context_processors.py
+from django.conf import settings
+
+
+def analytics_beacon(request):
+    """Tells base.html whether the beacon script reports page views and/or Web Vitals."""
+    return {
+        'analytics_beacon': getattr(settings, 'ANALYTICS_BEACON', False),
+        'analytics_vitals': getattr(settings, 'ANALYTICS_VITALS', False),
+    }
@@ -0,0 +1,131 @@
+# analytics/dedup.py
+import hashlib
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+DEDUP_WINDOW = 600  # 10 minutes in seconds
+
+
+class BaseDedupBackend:
+    """
+    Answers "was this (ip, path) recorded within the last ``window``
+    seconds?". A miss marks the key, so the next call inside the window is
+    a hit; hits do not extend the window.
+    """
+
+    def __init__(self, window=None):
+        self.window = window or getattr(settings, 'ANALYTICS_DEDUP_WINDOW', DEDUP_WINDOW)
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._counter_lock = threading.Lock()
+
+    def _incr(self, name, amount=1):
+        with self._counter_lock:
+            self._counters[name] += amount
+
+    def seen_recently(self, key):
+        raise NotImplementedError
+
+    async def aseen_recently(self, key):
+        # In-memory backends answer without blocking, so run them inline
+        return self.seen_recently(key)
+
+    def stats(self):
+        with self._counter_lock:
+            return dict(self._counters)
+
+
+class LocalDedupBackend(BaseDedupBackend):
+    """
+    Per-process store. Keys are filed into a ring of BUCKETS time buckets
+    spanning the window; whole buckets fall off the end as time advances,
+    so expiry costs O(1) amortized per key instead of a periodic full
+    scan. A key is remembered for between ``window - window/BUCKETS`` and
+    ``window`` seconds.
+    """
+    BUCKETS = 60
+
+    def __init__(self, window=None):
+        super().__init__(window)
+        self._width = self.window / self.BUCKETS
+        self._lock = threading.Lock()
+        self._ring = deque()   # (bucket_id, set of keys), oldest first
+        self._marks = {}       # key -> bucket_id of the last miss
+
+    def _expire(self, current):
+        oldest_live = current - self.BUCKETS + 1
+        evicted = 0
+        while self._ring and self._ring[0][0] < oldest_live:
+            bucket_id, keys = self._ring.popleft()
+            for key in keys:
+                # The key may have been re-marked in a newer bucket
+                if self._marks.get(key) == bucket_id:
+                    del self._marks[key]
+                    evicted += 1
+        if evicted:
+            self._incr('evictions', evicted)
+        return oldest_live
+
+    def seen_recently(self, key):
+        current = int(time.time() // self._width)
+        with self._lock:
+            oldest_live = self._expire(current)
+            bucket_id = self._marks.get(key)
+            if bucket_id is not None and bucket_id >= oldest_live:
+                hit = True
+            else:
+                hit = False
+                self._marks[key] = current
+                if not self._ring or self._ring[-1][0] != current:
+                    self._ring.append((current, set()))
+                self._ring[-1][1].add(key)
+        self._incr('hits' if hit else 'misses')
+        return hit
+
+    def __len__(self):
+        return len(self._marks)
+
+
+class CacheDedupBackend(BaseDedupBackend):
+    """
+    Uses a Django cache (ANALYTICS_DEDUP_CACHE alias) so every worker
+    shares one view of recent visitors. ``cache.add`` is atomic on the
+    shared backends (Redis, Memcached, database), so one round-trip both
+    tests and marks a key. Expiry is left to the cache, so evictions are
+    not counted here.
+    """
+
+    def __init__(self, window=None, alias=None):
+        super().__init__(window)
+        self.cache = caches[alias or getattr(settings, 'ANALYTICS_DEDUP_CACHE', 'default')]
+
+    def _cache_key(self, key):
+        digest = hashlib.blake2b(repr(key).encode('utf-8'), digest_size=16).hexdigest()
+        return f'analytics:dedup:{digest}'
+
+    def seen_recently(self, key):
+        added = self.cache.add(self._cache_key(key), 1, timeout=self.window)
+        self._incr('misses' if added else 'hits')
+        return not added
+
+    async def aseen_recently(self, key):
+        added = await self.cache.aadd(self._cache_key(key), 1, timeout=self.window)
+        self._incr('misses' if added else 'hits')
+        return not added
+
+
+_backend = None
+
+
+def get_dedup_backend():
+    global _backend
+    if _backend is None:
+        backend_path = getattr(
+            settings, 'ANALYTICS_DEDUP_BACKEND', 'analytics.dedup.LocalDedupBackend'
+        )
+        _backend = import_string(backend_path)()
+    return _backend
@@ -0,0 +1,122 @@
+# analytics/dimensions.py
+import threading
+from collections import OrderedDict
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Location, Page, PageView, ReferrerDomain, UserAgent
+
+
+class DimensionCache:
+    """
+    In-process LRU of natural key -> id for one lookup table. ``resolve``
+    answers a whole batch of keys: hits come from memory, misses are
+    fetched in one query, and keys that do not exist yet are inserted with
+    bulk_create(ignore_conflicts=True) and fetched again, so concurrent
+    writers cannot create duplicates.
+    """
+    FETCH_CHUNK = 200
+
+    def __init__(self, model, fields, max_size=10000):
+        self.model = model
+        self.fields = fields
+        self.max_size = max_size
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fetch(self, keys):
+        found = {}
+        keys = list(keys)
+        for i in range(0, len(keys), self.FETCH_CHUNK):
+            chunk = keys[i:i + self.FETCH_CHUNK]
+            if len(self.fields) == 1:
+                condition = Q(**{f'{self.fields[0]}__in': [key[0] for key in chunk]})
+            else:
+                condition = reduce(or_, (Q(**dict(zip(self.fields, key))) for key in chunk))
+            for row in self.model.objects.filter(condition).values_list('id', *self.fields):
+                found[row[1:]] = row[0]
+        return found
+
+    def resolve(self, keys):
+        """{key: id} for an iterable of key tuples (in ``fields`` order)."""
+        ids = {}
+        missing = []
+        with self._lock:
+            for key in set(keys):
+                if key in self._ids:
+                    self._ids.move_to_end(key)
+                    ids[key] = self._ids[key]
+                else:
+                    missing.append(key)
+        if not missing:
+            return ids
+
+        found = self._fetch(missing)
+        new = [key for key in missing if key not in found]
+        if new:
+            self.model.objects.bulk_create(
+                [self.model(**dict(zip(self.fields, key))) for key in new],
+                ignore_conflicts=True,
+            )
+            found.update(self._fetch(new))
+
+        with self._lock:
+            for key, pk in found.items():
+                self._ids[key] = pk
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+        ids.update(found)
+        return ids
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+
+pages = DimensionCache(Page, ('url', 'title'))
+user_agents = DimensionCache(UserAgent, ('value',))
+referrer_domains = DimensionCache(ReferrerDomain, ('name',))
+locations = DimensionCache(Location, ('country', 'region', 'city'))
+
+
+def encode_page_views(events):
+    """
+    Unsaved PageViews for raw page-view events: dicts with page_url,
+    page_title, user_agent, referrer_domain, country, region, city plus the
+    plain PageView fields (traffic_source, referrer, ip_address, date,
+    timestamp). Each lookup table is resolved once for the whole batch.
+    """
+    def page_key(e):
+        return (e['page_url'][:255], (e.get('page_title') or '')[:255])
+
+    def agent_key(e):
+        return ((e.get('user_agent') or '')[:500],)
+
+    def location_key(e):
+        return tuple((e.get(f) or '')[:100] for f in ('country', 'region', 'city'))
+
+    page_ids = pages.resolve(page_key(e) for e in events)
+    agent_ids = user_agents.resolve(agent_key(e) for e in events)
+    domain_ids = referrer_domains.resolve(
+        (e['referrer_domain'][:255],) for e in events if e.get('referrer_domain')
+    )
+    location_ids = locations.resolve(location_key(e) for e in events)
+
+    page_views = []
+    for e in events:
+        timestamp = e.get('timestamp') or timezone.now()
+        page_views.append(PageView(
+            page_id=page_ids[page_key(e)],
+            traffic_source=e.get('traffic_source') or 'direct',
+            referrer=e.get('referrer') or None,
+            domain_id=domain_ids[(e['referrer_domain'][:255],)] if e.get('referrer_domain') else None,
+            ip_address=e['ip_address'],
+            agent_id=agent_ids[agent_key(e)],
+            location_id=location_ids[location_key(e)],
+            date=e.get('date') or timezone.localdate(timestamp),
+            timestamp=timestamp,
+        ))
+    return page_views
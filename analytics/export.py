@@ -0,0 +1,108 @@
+# analytics/export.py
+# Raw PageView export as NDJSON or CSV, optionally gzip'd. Rows are read
+# through a server-side cursor and encoded chunk by chunk, so memory use
+# does not grow with the size of the export.
+import csv
+import io
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import PageView, pageview_lookup
+
+EXPORT_FIELDS = [
+    'id', 'date', 'timestamp', 'page_url', 'page_title', 'traffic_source',
+    'referrer', 'referrer_domain', 'ip_address', 'user_agent',
+    'country', 'region', 'city',
+]
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+
+CHUNK_SIZE = 2000
+
+
+def export_queryset(start, end):
+    return (
+        PageView.objects
+        .filter(date__range=(start, end))
+        .order_by('timestamp')
+        .values_list(*map(pageview_lookup, EXPORT_FIELDS))
+    )
+
+
+def _chunks(rows, chunk_size):
+    chunk = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _encode_ndjson(chunks):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for chunk in chunks:
+        yield ''.join(
+            encoder.encode(dict(zip(EXPORT_FIELDS, row))) + '\n' for row in chunk
+        ).encode('utf-8')
+
+
+def _encode_csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _gzip(parts):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    first = True
+    for part in parts:
+        data = compressor.compress(part)
+        if first:
+            # Push the header and first rows out now so the client sees
+            # the download start instead of waiting for zlib's buffer to fill
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            first = False
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(start, end, fmt='ndjson', compress=True, chunk_size=CHUNK_SIZE):
+    """Yield the encoded export of PageViews dated ``start``..``end`` as bytes."""
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown export format {fmt!r}')
+    chunks = _chunks(export_queryset(start, end), chunk_size)
+    parts = _encode_csv(chunks) if fmt == 'csv' else _encode_ndjson(chunks)
+    return _gzip(parts) if compress else parts
+
+
+def export_filename(start, end, fmt, compress=True):
+    extension = FORMATS[fmt][1]
+    return f"pageviews-{start.isoformat()}-{end.isoformat()}.{extension}{'.gz' if compress else ''}"
+
+
+async def aiter_export(parts):
+    """
+    Async wrapper for ASGI responses, which would otherwise read a sync
+    iterator to the end before sending anything. Each chunk is produced on
+    the same (thread-sensitive) thread, which owns the DB cursor.
+    """
+    next_part = sync_to_async(next, thread_sensitive=True)
+    done = object()
+    while True:
+        part = await next_part(parts, done)
+        if part is done:
+            break
+        yield part
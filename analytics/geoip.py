@@ -0,0 +1,201 @@
+# analytics/geoip.py
+import array
+import contextlib
+import ipaddress
+import logging
+import mmap
+import os
+import socket
+import struct
+import threading
+import time
+from bisect import bisect_right
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+EMPTY_LOCATION = {'country': '', 'city': '', 'region': ''}
+LOCAL_LOCATION = {'country': 'Local', 'city': 'Local', 'region': 'Local'}
+
+# Range database layout (native byte order, uint32 throughout):
+#   header   MAGIC, record count, byte offset of the location table
+#   starts   sorted first address of each IPv4 range
+#   ends     last address of each range (inclusive)
+#   loc_ids  index into the location table for each range
+#   table    UTF-8 "country\tregion\tcity\n" lines
+MAGIC = b'DJGEOIP1'
+HEADER = struct.Struct('=8sII')
+
+
+def ip_to_int(ip_address):
+    return int.from_bytes(socket.inet_aton(ip_address), 'big')
+
+
+def write_range_database(path, ranges):
+    """
+    Write (start_int, end_int, country, region, city) tuples to ``path``.
+    The file is written next to the target and swapped in atomically so
+    running workers never see a half-written database.
+    """
+    ranges = sorted(ranges, key=lambda r: r[0])
+    locations = {}
+    starts, ends, loc_ids = array.array('I'), array.array('I'), array.array('I')
+    for start, end, country, region, city in ranges:
+        key = (country or '', region or '', city or '')
+        starts.append(start)
+        ends.append(end)
+        loc_ids.append(locations.setdefault(key, len(locations)))
+
+    table = ''.join(
+        '\t'.join(part.replace('\t', ' ').replace('\n', ' ') for part in key) + '\n'
+        for key in locations
+    ).encode('utf-8')
+    table_offset = HEADER.size + 3 * len(starts) * starts.itemsize
+
+    os.makedirs(os.path.dirname(os.fspath(path)) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as fh:
+        fh.write(HEADER.pack(MAGIC, len(starts), table_offset))
+        starts.tofile(fh)
+        ends.tofile(fh)
+        loc_ids.tofile(fh)
+        fh.write(table)
+    os.replace(tmp_path, path)
+    return len(starts), len(locations)
+
+
+class BaseGeoIPBackend:
+    def lookup(self, ip_address):
+        """Return a {'country', 'city', 'region'} dict for a public IP."""
+        raise NotImplementedError
+
+    def locate(self, ip_address):
+        try:
+            ip = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return EMPTY_LOCATION
+        if ip.is_private or ip.is_loopback or ip.is_link_local:
+            return LOCAL_LOCATION
+        try:
+            return self.lookup(ip_address)
+        except Exception:
+            return EMPTY_LOCATION
+
+
+class NullGeoIPBackend(BaseGeoIPBackend):
+    def lookup(self, ip_address):
+        return EMPTY_LOCATION
+
+
+class RangeDatabaseBackend(BaseGeoIPBackend):
+    """
+    Resolves IPv4 addresses against a memory-mapped file of sorted integer
+    ranges (see write_range_database / the load_geoip command) with a
+    binary search, behind an LRU of recently seen addresses. The file is
+    re-opened when its mtime changes, checked at most every RELOAD_CHECK
+    seconds.
+    """
+    RELOAD_CHECK = 60
+
+    def __init__(self, path=None, cache_size=None):
+        self.path = os.fspath(path or settings.ANALYTICS_GEOIP_DATABASE)
+        self.cache_size = cache_size or getattr(settings, 'ANALYTICS_GEOIP_CACHE_SIZE', 4096)
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = None
+        self._db = None
+        self._cached_locate = lru_cache(maxsize=self.cache_size)(super().locate)
+
+    def _open(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            self._db, self._mtime = None, None
+            return
+        if mtime == self._mtime:
+            return
+
+        try:
+            db = self._read()
+        except (OSError, ValueError, TypeError, struct.error):
+            # A bad file (truncated, wrong format) keeps the database
+            # already loaded; it is read again once its mtime changes
+            logger.exception('Could not load GeoIP database %s; keeping the previous one', self.path)
+        else:
+            # The previous mapping is left for the garbage collector; in-flight
+            # lookups on other threads may still hold views into it.
+            self._db = db
+            self._cached_locate.cache_clear()
+        self._mtime = mtime
+
+    def _read(self):
+        with open(self.path, 'rb') as fh:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, count, table_offset = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC:
+                raise ValueError(f'{self.path} is not an analytics GeoIP database')
+            width = count * 4
+            offset = HEADER.size
+            if table_offset != offset + 3 * width or len(mm) < table_offset:
+                raise ValueError(f'{self.path} is truncated')
+            view = memoryview(mm)
+            starts = view[offset:offset + width].cast('I')
+            ends = view[offset + width:offset + 2 * width].cast('I')
+            loc_ids = view[offset + 2 * width:offset + 3 * width].cast('I')
+            locations = [
+                dict(zip(('country', 'region', 'city'), line.split('\t')))
+                for line in bytes(view[table_offset:]).decode('utf-8').splitlines()
+            ]
+            if count and max(loc_ids) >= len(locations):
+                raise ValueError(f'{self.path} is truncated')
+        except Exception:
+            # Views cast above may still pin the mapping; then the
+            # garbage collector closes it
+            with contextlib.suppress(BufferError):
+                mm.close()
+            raise
+        return starts, ends, loc_ids, locations
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.RELOAD_CHECK:
+            return
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= self.RELOAD_CHECK:
+                self._checked_at = now
+                self._open()
+
+    def lookup(self, ip_address):
+        db = self._db
+        if db is None or ':' in ip_address:
+            return EMPTY_LOCATION
+        starts, ends, loc_ids, locations = db
+        value = ip_to_int(ip_address)
+        i = bisect_right(starts, value) - 1
+        if i < 0 or value > ends[i]:
+            return EMPTY_LOCATION
+        return locations[loc_ids[i]]
+
+    def locate(self, ip_address):
+        self._maybe_reload()
+        return self._cached_locate(ip_address)
+
+    def cache_info(self):
+        return self._cached_locate.cache_info()
+
+
+_backend = None
+
+
+def get_geoip_backend():
+    global _backend
+    if _backend is None:
+        backend_path = getattr(
+            settings, 'ANALYTICS_GEOIP_BACKEND', 'analytics.geoip.RangeDatabaseBackend'
+        )
+        _backend = import_string(backend_path)()
+    return _backend
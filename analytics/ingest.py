@@ -0,0 +1,186 @@
+# analytics/ingest.py
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .dimensions import encode_page_views
+from .live import live_visitors
+from .models import PageView
+
+logger = logging.getLogger(__name__)
+
+# Queued by shutdown() to wake the flusher mid-wait
+_STOP = object()
+
+
+class PageViewBuffer:
+    """
+    In-process queue of raw page-view events (see encode_page_views). A
+    daemon thread drains it, resolves each batch's lookup ids and writes
+    with bulk_create once BATCH_SIZE events are waiting or
+    FLUSH_INTERVAL seconds have passed, whichever comes first. When the
+    queue is full new views are dropped (and counted) instead of blocking
+    the request.
+
+    Subclasses can queue other event types by overriding ``save`` (and
+    ``after_save``, which runs once a batch is stored).
+    """
+    label = 'page views'
+    thread_name = 'analytics-flusher'
+
+    def __init__(self, max_size=10000, batch_size=500, flush_interval=2.0):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._counters = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'failed': 0,
+            'batches': 0,
+        }
+        self._reset()
+        atexit.register(self.shutdown)
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_size=getattr(settings, 'ANALYTICS_BUFFER_MAX_SIZE', 10000),
+            batch_size=getattr(settings, 'ANALYTICS_BUFFER_BATCH_SIZE', 500),
+            flush_interval=getattr(settings, 'ANALYTICS_BUFFER_FLUSH_INTERVAL', 2.0),
+        )
+
+    def _reset(self):
+        # Called on first use and again in a forked child (e.g. gunicorn
+        # --preload), where the parent's queue and thread are not usable.
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.max_size)
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def _incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _ensure_started(self):
+        if self._pid != os.getpid():
+            self._reset()
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name=self.thread_name, daemon=True
+                )
+                self._thread.start()
+
+    def put(self, event):
+        """Queue an event dict. Returns False if it was shed."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._incr('dropped')
+            dropped = self._counters['dropped']
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning(
+                    'Analytics buffer full (%s); %s %s dropped so far',
+                    self.max_size, dropped, self.label,
+                )
+            return False
+        self._incr('enqueued')
+        return True
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+        close_old_connections()
+
+    def _collect(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                event = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if event is _STOP:
+                break
+            batch.append(event)
+        return batch
+
+    def save(self, batch):
+        PageView.objects.bulk_create(encode_page_views(batch), batch_size=self.batch_size)
+
+    def after_save(self, batch):
+        live_visitors.add(batch)
+
+    def _write(self, batch):
+        close_old_connections()
+        try:
+            self.save(batch)
+        except Exception:
+            logger.exception('Failed to write %s buffered %s', len(batch), self.label)
+            self._incr('failed', len(batch))
+            return
+        self._incr('written', len(batch))
+        self._incr('batches')
+        # The rows are committed; a failure here must not count them as failed
+        try:
+            self.after_save(batch)
+        except Exception:
+            logger.exception('Failed to process %s written %s', len(batch), self.label)
+
+    def flush(self):
+        """Write everything currently queued from the calling thread."""
+        batch = []
+        while True:
+            try:
+                event = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if event is _STOP:
+                continue
+            batch.append(event)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def shutdown(self, timeout=5.0):
+        """Stop the flusher thread and drain whatever is left."""
+        if self._pid != os.getpid():
+            return
+        self._stopping.set()
+        if self._thread is not None:
+            try:
+                self._queue.put_nowait(_STOP)
+            except queue.Full:
+                # A full queue means the flusher is not waiting anyway
+                pass
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters)
+        data['queued'] = self._queue.qsize()
+        return data
+
+
+page_view_buffer = PageViewBuffer.from_settings()
@@ -0,0 +1,198 @@
+# analytics/live.py
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from .visits import visitor_key
+
+logger = logging.getLogger(__name__)
+
+
+class LiveVisitors:
+    """
+    Ring of the last ``minutes`` minutes of page views: one slot per minute
+    holding the view count and the set of visitor keys (ip + user agent, as
+    for visits). Fed by the ingest flusher as batches are written, read by
+    the live stream; neither side touches the database.
+
+    With a per-process cache (LocMem, Dummy) the ring stays in memory and
+    ticks do no I/O. With a shared cache each worker also writes its own
+    slots (keyed by host and pid), so workers never overwrite each other's
+    counts, and holds one of ``max_workers`` heartbeat keys naming it;
+    readers merge the slots of the workers named there.
+    """
+    WORKER_KEY = 'analytics:live:worker:{}'
+
+    def __init__(self, minutes=None, active_minutes=None, alias=None, max_workers=None):
+        self.minutes = minutes or getattr(settings, 'ANALYTICS_LIVE_MINUTES', 30)
+        self.active_minutes = active_minutes or getattr(settings, 'ANALYTICS_LIVE_ACTIVE_MINUTES', 5)
+        self.alias = alias or getattr(settings, 'ANALYTICS_LIVE_CACHE', 'default')
+        self.max_workers = max_workers or getattr(settings, 'ANALYTICS_LIVE_MAX_WORKERS', 64)
+        self._slots = [(None, 0, set()) for _ in range(self.minutes)]
+        self._lock = threading.Lock()
+        # (worker, heartbeat index, minute the heartbeat was last written)
+        self._heartbeat = (None, None, 0)
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def shared(self):
+        return not isinstance(self.cache, (LocMemCache, DummyCache))
+
+    @property
+    def worker(self):
+        # Read per call: a ring created before a fork must not share a key
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    def _key(self, worker, minute):
+        return f'analytics:live:{worker}:{minute}'
+
+    def _slot(self, minute):
+        index = minute % self.minutes
+        slot = self._slots[index]
+        if slot[0] != minute:
+            slot = (minute, 0, set())
+            self._slots[index] = slot
+        return index, slot
+
+    def _beat(self, worker, now):
+        """
+        Key of this worker's heartbeat, or None if every one is taken. The
+        heartbeat expires with the slots written alongside it, so while it
+        is alive it is still ours; once it may have lapsed, claim one again
+        with an atomic add.
+        """
+        name, index, seen = self._heartbeat
+        if name != worker or index is None or now - seen >= self.minutes:
+            keys = [self.WORKER_KEY.format(index) for index in range(self.max_workers)]
+            holders = self.cache.get_many(keys)
+            index = next((i for i, key in enumerate(keys) if holders.get(key) == worker), None)
+            if index is None:
+                ttl = self.minutes * 60
+                index = next((i for i, key in enumerate(keys) if key not in holders and self.cache.add(key, worker, ttl)), None)
+        self._heartbeat = (worker, index, now)
+        return None if index is None else self.WORKER_KEY.format(index)
+
+    def add(self, events):
+        """Count raw page-view events (dicts with timestamp, ip_address, user_agent)."""
+        now = int(time.time() // 60)
+        worker = self.worker
+        touched = {}
+        with self._lock:
+            for event in events:
+                minute = int(event['timestamp'].timestamp() // 60)
+                if not now - self.minutes < minute <= now:
+                    continue
+                index, (_, views, visitors) = self._slot(minute)
+                visitors.add(visitor_key(event['ip_address'], event['user_agent']))
+                self._slots[index] = touched[minute] = (minute, views + 1, visitors)
+            entries = {
+                self._key(worker, minute): (views, list(visitors))
+                for minute, views, visitors in touched.values()
+            }
+        if not entries or not self.shared:
+            return
+        heartbeat = self._beat(worker, now)
+        if heartbeat is None:
+            logger.warning('Live visitors: all %d worker heartbeats are taken', self.max_workers)
+            return
+        entries[heartbeat] = worker
+        self.cache.set_many(entries, self.minutes * 60)
+
+    def _local(self, minutes):
+        with self._lock:
+            found = {slot[0]: (slot[1], slot[2]) for slot in self._slots if slot[0] in minutes}
+        return [found]
+
+    def _shared(self, minutes):
+        keys = [self.WORKER_KEY.format(index) for index in range(self.max_workers)]
+        workers = self.cache.get_many(keys).values()
+        found = self.cache.get_many([self._key(worker, minute) for worker in workers for minute in minutes])
+        return [
+            {minute: found[self._key(worker, minute)] for minute in minutes if self._key(worker, minute) in found}
+            for worker in workers
+        ]
+
+    def snapshot(self):
+        """
+        {'active': distinct visitors in the last ``active_minutes``,
+         'minutes': [[epoch minute, views], ...] oldest first}, across
+        every worker sharing the cache.
+        """
+        now = int(time.time() // 60)
+        minutes = range(now - self.minutes + 1, now + 1)
+        views = dict.fromkeys(minutes, 0)
+        active = set()
+        for rings in (self._shared if self.shared else self._local)(minutes):
+            for minute, (count, visitors) in rings.items():
+                views[minute] += count
+                if minute > now - self.active_minutes:
+                    active.update(visitors)
+        return {
+            'active': len(active),
+            'minutes': [[minute, count] for minute, count in views.items()],
+        }
+
+
+live_visitors = LiveVisitors()
+
+
+def sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'.encode()
+
+
+def delta(previous, current):
+    """The parts of ``current`` that differ from ``previous`` (both snapshots)."""
+    changed = {}
+    if current['active'] != previous['active']:
+        changed['active'] = current['active']
+    before = dict(previous['minutes'])
+    minutes = [pair for pair in current['minutes'] if before.get(pair[0]) != pair[1]]
+    if minutes:
+        changed['minutes'] = minutes
+    return changed
+
+
+class LiveStream:
+    """
+    SSE frames for one dashboard tab: a full 'snapshot' first, then on each
+    tick a 'delta' with whatever changed (or a ': ping' comment). The
+    stream ends after ``duration`` seconds; EventSource reconnects on its
+    own and gets a fresh snapshot. Async only: under WSGI each open stream
+    would hold a worker thread for ``duration``.
+    """
+
+    def __init__(self, interval=None, duration=None):
+        self.interval = interval or getattr(settings, 'ANALYTICS_LIVE_INTERVAL', 5)
+        self.duration = duration or getattr(settings, 'ANALYTICS_LIVE_STREAM_SECONDS', 300)
+        self._previous = None
+
+    def first(self, current):
+        self._previous = current
+        return b'retry: 3000\n\n' + sse('snapshot', current)
+
+    def tick(self, current):
+        changed = delta(self._previous, current)
+        self._previous = current
+        return sse('delta', changed) if changed else b': ping\n\n'
+
+    async def __aiter__(self):
+        # A shared ring is read from the cache, which may block
+        snapshot = sync_to_async(live_visitors.snapshot)
+        yield self.first(await snapshot())
+        deadline = time.monotonic() + self.duration
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.interval)
+            yield self.tick(await snapshot())
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from analytics.benchmarks import BENCHMARKS, seed_page_views
+from analytics.rollups import compact
+
+
+class Command(BaseCommand):
+    help = (
+        'Run an analytics benchmark against the configured database. '
+        'Use a scratch database: --seed inserts synthetic PageView rows.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(BENCHMARKS))
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Insert this many synthetic PageView rows first',
+        )
+        parser.add_argument(
+            '--rollup',
+            action='store_true',
+            help='Run rollup compaction before measuring',
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            created = seed_page_views(options['seed'])
+            self.stdout.write(f"Seeded {created} page views")
+        if options['rollup']:
+            days = compact()
+            self.stdout.write(f"Rolled up {len(days)} day(s)")
+        BENCHMARKS[options['name']](self.stdout, repeat=options['repeat'])
@@ -0,0 +1,60 @@
+import sys
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from analytics.export import CHUNK_SIZE, FORMATS, stream_export
+
+
+def _date(value):
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise CommandError(f"Invalid date {value!r}; use YYYY-MM-DD")
+    return parsed
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream raw PageView rows for a date range as NDJSON or CSV '
+        '(gzip by default) to a file or stdout.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day (YYYY-MM-DD); default 30 days ago')
+        parser.add_argument('--end', help='Last day (YYYY-MM-DD); default today')
+        parser.add_argument('--format', choices=sorted(FORMATS), default='ndjson')
+        parser.add_argument('--no-gzip', action='store_true', help='Write uncompressed output')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--output', '-o', default='-', help="Output path, or '-' for stdout")
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        start = _date(options['start']) if options['start'] else today - timedelta(days=29)
+        end = _date(options['end']) if options['end'] else today
+        if start > end:
+            raise CommandError('--start is after --end')
+
+        parts = stream_export(
+            start, end, options['format'],
+            compress=not options['no_gzip'], chunk_size=options['chunk_size'],
+        )
+        to_stdout = options['output'] == '-'
+        out = sys.stdout.buffer if to_stdout else open(options['output'], 'wb')
+        written = 0
+        try:
+            for part in parts:
+                out.write(part)
+                written += len(part)
+        finally:
+            if not to_stdout:
+                out.close()
+
+        if not to_stdout:
+            self.stdout.write(
+                self.style.SUCCESS(f"Exported {start} → {end} to {options['output']} ({written} bytes)")
+            )
@@ -0,0 +1,70 @@
+import csv
+import ipaddress
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.geoip import write_range_database
+
+
+def _parse_ip(value):
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    ip = ipaddress.ip_address(value)
+    if ip.version != 4:
+        return None
+    return int(ip)
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the offline GeoIP range database from a CSV of '
+        'start_ip,end_ip,country,region,city rows (dotted or integer IPs)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path')
+        parser.add_argument(
+            '--output',
+            default=None,
+            help='Database path (defaults to settings.ANALYTICS_GEOIP_DATABASE)',
+        )
+
+    def handle(self, *args, **options):
+        output = options['output'] or settings.ANALYTICS_GEOIP_DATABASE
+        ranges = []
+        skipped = 0
+
+        try:
+            with open(options['csv_path'], newline='', encoding='utf-8') as fh:
+                for row in csv.reader(fh):
+                    if len(row) < 3:
+                        skipped += 1
+                        continue
+                    try:
+                        start, end = _parse_ip(row[0]), _parse_ip(row[1])
+                    except ValueError:
+                        # Header row or malformed address
+                        skipped += 1
+                        continue
+                    if start is None or end is None or end < start:
+                        skipped += 1
+                        continue
+                    country = row[2].strip()
+                    region = row[3].strip() if len(row) > 3 else ''
+                    city = row[4].strip() if len(row) > 4 else ''
+                    ranges.append((start, end, country, region, city))
+        except FileNotFoundError as e:
+            raise CommandError(str(e))
+
+        if not ranges:
+            raise CommandError('No IPv4 ranges found in CSV')
+
+        count, locations = write_range_database(output, ranges)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {count} ranges ({locations} locations) to {output}"
+                + (f", skipped {skipped} rows" if skipped else '')
+            )
+        )
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from analytics.partitions import (
+    ensure_partitions, expire_partitions, expired_partitions, is_partitioned,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Create upcoming monthly PageView partitions and archive/drop the '
+        'ones past the retention window (PostgreSQL only). Run it daily.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=getattr(settings, 'ANALYTICS_PARTITION_MONTHS_AHEAD', 3),
+        )
+        parser.add_argument(
+            '--retention-months',
+            type=int,
+            default=getattr(settings, 'ANALYTICS_RETENTION_MONTHS', None),
+            help='Keep this many whole months of raw rows; omit to keep everything',
+        )
+        parser.add_argument(
+            '--archive-dir',
+            default=str(getattr(settings, 'ANALYTICS_ARCHIVE_DIR', 'pageview-archive')),
+        )
+        parser.add_argument(
+            '--detach-only',
+            action='store_true',
+            help='Detach expired partitions after archiving instead of dropping them',
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('PageView partitioning requires PostgreSQL')
+
+        with connection.cursor() as cursor:
+            if not is_partitioned(cursor):
+                raise CommandError(
+                    'analytics_pageview is not partitioned; run migrations first'
+                )
+            retention = options['retention_months']
+            expired = expired_partitions(cursor, retention) if retention else []
+
+        if options['dry_run']:
+            for month, name in expired:
+                self.stdout.write(f"Would archive and {'detach' if options['detach_only'] else 'drop'} {name}")
+            return
+
+        for name in ensure_partitions(options['months_ahead']):
+            self.stdout.write(self.style.SUCCESS(f"Created {name}"))
+
+        if retention:
+            for name, path in expire_partitions(
+                retention, options['archive_dir'], drop=not options['detach_only']
+            ):
+                self.stdout.write(self.style.SUCCESS(f"Archived {name} to {path}"))
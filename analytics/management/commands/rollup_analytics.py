@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from analytics.rollups import compact, get_watermark
+
+
+class Command(BaseCommand):
+    help = (
+        'Fold raw PageView rows into the daily/hourly rollup tables. '
+        'Run it from cron (e.g. hourly); the dashboard reads rollups up to '
+        'the watermark and only counts raw rows recorded after it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Ignore the watermark and rebuild from the oldest raw row',
+        )
+
+    def handle(self, *args, **options):
+        days = compact(rebuild=options['rebuild'])
+        if days:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Rolled up {len(days)} day(s) ({days[0]} → {days[-1]}); "
+                    f"watermark now {get_watermark()}"
+                )
+            )
+        else:
+            self.stdout.write(f"Nothing to roll up; watermark at {get_watermark()}")
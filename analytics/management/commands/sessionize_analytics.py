@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from analytics.rollups import get_watermark
+from analytics.visits import WATERMARK, sessionize
+
+
+class Command(BaseCommand):
+    help = (
+        'Group PageViews recorded since the last run into Visits and refresh '
+        'the daily visit rollups. Run it from cron alongside rollup_analytics.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Delete all visits and sessionize every PageView again',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=int,
+            help='Seconds of inactivity that end a visit (default ANALYTICS_VISIT_TIMEOUT)',
+        )
+
+    def handle(self, *args, **options):
+        days = sessionize(timeout=options['timeout'], rebuild=options['rebuild'])
+        watermark = get_watermark(WATERMARK)
+        if days:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Updated visits for {len(days)} day(s) ({days[0]} → {days[-1]}); "
+                    f"watermark now {watermark}"
+                )
+            )
+        else:
+            self.stdout.write(f"No new visits; watermark at {watermark}")
@@ -1,9 +1,14 @@
 # analytics/middleware.py
 import re
-import time
-from django.utils.deprecation import MiddlewareMixin
-from django.urls import resolve
-from .models import PageView
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+from .dedup import get_dedup_backend
+from .geoip import get_geoip_backend
+from .ingest import page_view_buffer
+from .roles import role_cache
+from .titles import blog_titles
 from .utils import TrafficSourceDetector, TRACKED_PAGES
 
 # UA patterns to skip
@@ -14,136 +19,172 @@ BOT_PATTERN = re.compile(
     re.IGNORECASE
 )
 
-# Simple in-process dedup cache: {(ip, path): last_recorded_timestamp}
-_dedup_cache: dict = {}
-DEDUP_WINDOW = 600  # 10 minutes in seconds
 
+# Never tracked: admin, static files, API endpoints and the dashboard
+SKIP_PREFIXES = (
+    '/admin/', '/static/', '/media/', '/api/',
+    '/analytics/', '/dashboard/',
+)
 
-class AnalyticsMiddleware(MiddlewareMixin):
-    def process_response(self, request, response):
+
+def get_page_title(path, refresh=True, strict=False):
+    """
+    Title to record for ``path``, or '' when the page is not tracked. Only
+    a /blog/ path reads the blog title map, reloading it first when stale
+    (pass ``refresh=False`` where that has already been awaited). With
+    ``strict`` only TRACKED_PAGES and /blog/<slug>/ of a published post or
+    category count, for paths a client reports rather than ones that
+    answered 200.
+    """
+    page_title = TRACKED_PAGES.get(path)
+    if page_title is not None:
+        return page_title
+    if not path.startswith('/blog/'):
+        return ''
+    if refresh:
+        blog_titles.refresh_if_stale()
+
+    # /blog/<slug>/ is a category or a published post; anything else under
+    # /blog/ that answered 200 (search, load-more) is just "Blog"
+    slug = path[len('/blog/'):].rstrip('/')
+    if strict and path != f'/blog/{slug}/':
+        return ''
+    return blog_titles.lookup(slug) or ('' if strict else 'Blog')
+
+
+class AnalyticsMiddleware:
+    """
+    Records page views for anonymous/regular visitors. Works in both sync
+    (WSGI) and async (ASGI) stacks: under ASGI the checks run on the event
+    loop, only a role-cache miss or a stale blog title map touches a
+    thread, and the page view is handed to the ingest buffer (a
+    non-blocking put) for the background flusher to write. Building the
+    event (GeoIP lookup, referrer classification) runs in a worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        # With ANALYTICS_BEACON the pages report their own views (see
+        # analytics/beacon.py), so counting them here would be redundant
+        if getattr(settings, 'ANALYTICS_BEACON', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return await self.aprocess_response(request, response)
+
+    def is_trackable(self, request, response):
+        """Checks that need neither the user nor any I/O."""
         # Only track GET requests with 200 status
         if request.method != 'GET' or response.status_code != 200:
+            return False
+
+        if request.path.startswith(SKIP_PREFIXES):
+            return False
+
+        # Skip bots and crawlers
+        user_agent = request.META.get('HTTP_USER_AGENT', '')
+        return bool(user_agent) and not BOT_PATTERN.search(user_agent)
+
+    def process_response(self, request, response):
+        if not self.is_trackable(request, response):
             return response
 
-        # Skip admin, static files, and API endpoints
-        skip_prefixes = [
-            '/admin/', '/static/', '/media/', '/api/',
-            '/analytics/', '/dashboard/',
-        ]
-        if any(request.path.startswith(p) for p in skip_prefixes):
+        # Skip if page not in tracking list and not a blog post
+        page_title = get_page_title(request.path)
+        if not page_title:
             return response
 
         # Skip authenticated staff, superusers, administrators, and authors
-        if request.user.is_authenticated:
-            if request.user.is_staff or request.user.is_superuser:
-                return response
-            if request.user.groups.filter(
-                name__in=['Administrator', 'Author']
-            ).exists():
-                return response
-
-        # Skip bots and crawlers
-        user_agent = request.META.get('HTTP_USER_AGENT', '')
-        if not user_agent or BOT_PATTERN.search(user_agent):
+        if role_cache.is_excluded(request.user):
             return response
 
-        # Deduplicate: same IP + same page within 10 minutes = skip
+        # Deduplicate: same IP + same page within DEDUP_WINDOW = skip
         ip_address = self.get_client_ip(request)
-        dedup_key = (ip_address, request.path)
-        now = time.time()
-        last_seen = _dedup_cache.get(dedup_key, 0)
-        if now - last_seen < DEDUP_WINDOW:
+        if get_dedup_backend().seen_recently((ip_address, request.path)):
             return response
-        _dedup_cache[dedup_key] = now
-
-        # Prune cache if it grows too large (keep memory bounded)
-        if len(_dedup_cache) > 5000:
-            cutoff = now - DEDUP_WINDOW
-            expired = [k for k, v in _dedup_cache.items() if v < cutoff]
-            for k in expired:
-                _dedup_cache.pop(k, None)
 
         try:
-            self.track_page_view(request, ip_address, user_agent)
+            self.track_page_view(request, ip_address, page_title)
         except Exception:
             pass
 
         return response
 
-    def track_page_view(self, request, ip_address, user_agent):
-        referrer = request.META.get('HTTP_REFERER', '')
-        traffic_source = TrafficSourceDetector.detect_source(referrer)
-
-        # Get page title
-        page_title = TRACKED_PAGES.get(request.path, '')
-
-        # Handle blog posts dynamically
-        if request.path.startswith('/blog/') and not page_title:
-            try:
-                resolved = resolve(request.path)
-                if hasattr(resolved, 'kwargs') and 'slug' in resolved.kwargs:
-                    page_title = (
-                        f"Blog: {resolved.kwargs['slug'].replace('-', ' ').title()}"
-                    )
-                else:
-                    page_title = 'Blog Post'
-            except Exception:
-                page_title = 'Blog'
+    async def aprocess_response(self, request, response):
+        if not self.is_trackable(request, response):
+            return response
 
-        # Skip if page not in tracking list and not a blog post
+        # The title map reloads in a thread, not on the event loop
+        if request.path.startswith('/blog/'):
+            await blog_titles.arefresh_if_stale()
+        page_title = get_page_title(request.path, refresh=False)
         if not page_title:
-            return
-
-        # Extract referrer domain
-        referrer_domain = None
-        if referrer and traffic_source != 'direct':
-            try:
-                from urllib.parse import urlparse
-                parsed = urlparse(referrer)
-                if parsed.netloc:
-                    referrer_domain = parsed.netloc.lower().replace('www.', '')
-            except Exception:
-                pass
-
-        location_data = self.get_location_from_ip(ip_address)
-
-        PageView.objects.create(
-            page_url=request.path,
-            page_title=page_title,
-            traffic_source=traffic_source,
-            referrer=referrer if referrer else None,
-            referrer_domain=referrer_domain,
-            ip_address=ip_address,
-            user_agent=user_agent[:500],
-            country=location_data['country'],
-            city=location_data['city'],
-            region=location_data['region'],
-        )
+            return response
 
-    def get_client_ip(self, request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            return x_forwarded_for.split(',')[0].strip()
-        return request.META.get('REMOTE_ADDR', '127.0.0.1')
+        if await role_cache.ais_excluded(await request.auser()):
+            return response
+
+        ip_address = self.get_client_ip(request)
+        if await get_dedup_backend().aseen_recently((ip_address, request.path)):
+            return response
 
-    def get_location_from_ip(self, ip_address):
+        # The GeoIP lookup may reload its database file; keep it off the
+        # event loop. Nothing here touches the database, so any thread will do
         try:
-            if ip_address in ('127.0.0.1', 'localhost') or \
-               ip_address.startswith(('192.168.', '10.', '172.')):
-                return {'country': 'Local', 'city': 'Local', 'region': 'Local'}
-
-            import requests as req
-            response = req.get(
-                f'http://ip-api.com/json/{ip_address}',
-                timeout=2
-            )
-            if response.status_code == 200:
-                data = response.json()
-                return {
-                    'country': data.get('country', ''),
-                    'city': data.get('city', ''),
-                    'region': data.get('regionName', ''),
-                }
+            await sync_to_async(self.track_page_view, thread_sensitive=False)(request, ip_address, page_title)
         except Exception:
             pass
-        return {'country': '', 'city': '', 'region': ''}
\ No newline at end of file
+
+        return response
+
+    def track_page_view(self, request, ip_address, page_title):
+        # Persisted in batches by the background flusher, off the request path
+        page_view_buffer.put(page_view_event(
+            request.path,
+            page_title,
+            ip_address,
+            request.META.get('HTTP_USER_AGENT', ''),
+            request.META.get('HTTP_REFERER', ''),
+        ))
+
+    def get_client_ip(self, request):
+        return get_client_ip(request)
+
+
+def get_client_ip(request):
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '127.0.0.1')
+
+
+def page_view_event(path, page_title, ip_address, user_agent, referrer, timestamp=None):
+    """The raw event page_view_buffer expects (see dimensions.encode_page_views)."""
+    traffic_source, referrer_domain = TrafficSourceDetector.classify(referrer)
+    # Resolved from the local range database; never touches the network
+    location_data = get_geoip_backend().locate(ip_address)
+    return {
+        'page_url': path,
+        'page_title': page_title,
+        'traffic_source': traffic_source,
+        'referrer': referrer if referrer else None,
+        'referrer_domain': referrer_domain,
+        'ip_address': ip_address,
+        'user_agent': user_agent[:500],
+        'country': location_data['country'],
+        'city': location_data['city'],
+        'region': location_data['region'],
+        'timestamp': timestamp or timezone.now(),
+    }
@@ -0,0 +1,71 @@
+# Generated by Django 6.0.2 on 2026-10-17 15:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('position', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HourlyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(unique=True)),
+                ('views', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyLocationStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('country', models.CharField(blank=True, max_length=100)),
+                ('region', models.CharField(blank=True, max_length=100)),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('views', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'country'], name='analytics_d_date_f6cae0_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyPageStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('page_url', models.CharField(max_length=255)),
+                ('page_title', models.CharField(blank=True, max_length=255)),
+                ('traffic_source', models.CharField(choices=[('direct', 'Direct'), ('social', 'Social'), ('search', 'Search Engine'), ('referral', 'Referral')], default='direct', max_length=20)),
+                ('views', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'page_url'], name='analytics_d_date_6e2eb5_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyReferrerStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('referrer_domain', models.CharField(blank=True, max_length=255)),
+                ('traffic_source', models.CharField(choices=[('direct', 'Direct'), ('social', 'Social'), ('search', 'Search Engine'), ('referral', 'Referral')], default='direct', max_length=20)),
+                ('views', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'traffic_source'], name='analytics_d_date_7ef13a_idx')],
+            },
+        ),
+    ]
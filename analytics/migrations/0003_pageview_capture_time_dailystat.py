@@ -0,0 +1,36 @@
+# Generated by Django 6.0.2 on 2026-10-17 16:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('views', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='pageview',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.AlterField(
+            model_name='pageview',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='pageview',
+            index=models.Index(fields=['timestamp'], name='analytics_p_timesta_835321_idx'),
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Converts analytics_pageview into a table range-partitioned by month on
+# `date`. PostgreSQL only; a no-op on other backends.
+
+from datetime import date
+
+from django.db import migrations
+from django.utils import timezone
+
+PARENT = 'analytics_pageview'
+
+# Must match the indexes PageView.Meta declares as of 0003
+INDEXES = [
+    ('analytics_p_page_ur_c02477_idx', '(page_url, date)'),
+    ('analytics_p_traffic_b9cace_idx', '(traffic_source, date)'),
+    ('analytics_p_date_cdf4b5_idx', '(date)'),
+    ('analytics_p_timesta_835321_idx', '("timestamp")'),
+]
+
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def _create_indexes_and_sequence(cursor):
+    for index_name, columns in INDEXES:
+        cursor.execute(f'CREATE INDEX "{index_name}" ON "{PARENT}" {columns}')
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence('{PARENT}', 'id'), "
+        f'coalesce((SELECT max(id) FROM "{PARENT}"), 0) + 1, false)'
+    )
+
+
+def partition_pageview(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'SELECT min(date), max(date) FROM "{PARENT}"')
+        first, last = cursor.fetchone()
+        today = timezone.localdate()
+        month = (first or today).replace(day=1)
+        last = _add_months(max(last or today, today).replace(day=1), 3)
+
+        legacy = f'{PARENT}_legacy'
+        cursor.execute(f'ALTER TABLE "{PARENT}" RENAME TO "{legacy}"')
+        cursor.execute(
+            f'CREATE TABLE "{PARENT}" (LIKE "{legacy}" INCLUDING DEFAULTS INCLUDING IDENTITY) '
+            f'PARTITION BY RANGE (date)'
+        )
+        while month <= last:
+            cursor.execute(
+                f'CREATE TABLE "{PARENT}_y{month.year}m{month.month:02d}" PARTITION OF "{PARENT}" '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+            )
+            month = _add_months(month, 1)
+        # Catches rows for months manage_pageview_partitions has not created yet
+        cursor.execute(f'CREATE TABLE "{PARENT}_default" PARTITION OF "{PARENT}" DEFAULT')
+
+        cursor.execute(f'INSERT INTO "{PARENT}" OVERRIDING SYSTEM VALUE SELECT * FROM "{legacy}"')
+        cursor.execute(f'DROP TABLE "{legacy}"')
+        # The partition key has to be part of every unique index
+        cursor.execute(f'ALTER TABLE "{PARENT}" ADD PRIMARY KEY (id, date)')
+        _create_indexes_and_sequence(cursor)
+
+
+def unpartition_pageview(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        partitioned = f'{PARENT}_partitioned'
+        cursor.execute(f'ALTER TABLE "{PARENT}" RENAME TO "{partitioned}"')
+        for index_name, _ in INDEXES:
+            cursor.execute(f'DROP INDEX "{index_name}"')
+        cursor.execute(
+            f'CREATE TABLE "{PARENT}" (LIKE "{partitioned}" INCLUDING DEFAULTS INCLUDING IDENTITY)'
+        )
+        cursor.execute(f'INSERT INTO "{PARENT}" OVERRIDING SYSTEM VALUE SELECT * FROM "{partitioned}"')
+        cursor.execute(f'DROP TABLE "{partitioned}" CASCADE')
+        cursor.execute(f'ALTER TABLE "{PARENT}" ADD PRIMARY KEY (id)')
+        _create_indexes_and_sequence(cursor)
+
+
+class Migration(migrations.Migration):
+
+    atomic = True
+
+    dependencies = [
+        ('analytics', '0003_pageview_capture_time_dailystat'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_pageview, unpartition_pageview),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-17 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_partition_pageview'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailystat',
+            name='visitor_sketch',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.2 on 2026-10-17 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0005_dailystat_visitor_sketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyVisitStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('visits', models.PositiveIntegerField(default=0)),
+                ('bounces', models.PositiveIntegerField(default=0)),
+                ('pageviews', models.PositiveIntegerField(default=0)),
+                ('duration', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Visit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('visitor_key', models.CharField(max_length=32)),
+                ('date', models.DateField()),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField()),
+                ('entry_page', models.CharField(max_length=255)),
+                ('exit_page', models.CharField(max_length=255)),
+                ('traffic_source', models.CharField(choices=[('direct', 'Direct'), ('social', 'Social'), ('search', 'Search Engine'), ('referral', 'Referral')], default='direct', max_length=20)),
+                ('referrer_domain', models.CharField(blank=True, max_length=255)),
+                ('depth', models.PositiveIntegerField(default=1)),
+                ('duration', models.PositiveIntegerField(default=0, help_text='Seconds from first to last view')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='analytics_v_date_560a1d_idx'), models.Index(fields=['ended_at'], name='analytics_v_ended_a_26022e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 6.0.2 on 2026-10-17 17:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0006_visits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('country', models.CharField(blank=True, max_length=100)),
+                ('region', models.CharField(blank=True, max_length=100)),
+                ('city', models.CharField(blank=True, max_length=100)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('country', 'region', 'city'), name='analytics_location_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Page',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=255)),
+                ('title', models.CharField(blank=True, max_length=255)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('url', 'title'), name='analytics_page_url_title_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReferrerDomain',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserAgent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=500, unique=True)),
+            ],
+        ),
+        # Nullable until 0008 has filled them in; 0009 makes page/agent required
+        migrations.AddField(
+            model_name='pageview',
+            name='page',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='analytics.page'),
+        ),
+        migrations.AddField(
+            model_name='pageview',
+            name='agent',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='analytics.useragent'),
+        ),
+        migrations.AddField(
+            model_name='pageview',
+            name='domain',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='analytics.referrerdomain'),
+        ),
+        migrations.AddField(
+            model_name='pageview',
+            name='location',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='analytics.location'),
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Fills PageView's lookup ids from its string columns, in id-range batches.
+# Not atomic: each batch commits on its own, and a rerun only touches rows
+# that have no page id yet.
+
+from django.db import migrations
+from django.db.models import Max, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+
+BATCH_SIZE = 20000
+
+# lookup model, its fields, the PageView columns they come from
+DIMENSIONS = [
+    ('Page', ('url', 'title'), ('page_url', 'page_title')),
+    ('UserAgent', ('value',), ('user_agent',)),
+    ('ReferrerDomain', ('name',), ('referrer_domain',)),
+    ('Location', ('country', 'region', 'city'), ('country', 'region', 'city')),
+]
+
+MAX_LENGTHS = {'url': 255, 'title': 255, 'value': 500, 'name': 255}
+
+
+def _id_batches(PageView):
+    bounds = PageView.objects.aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return
+    for start in range(bounds['first'], bounds['last'] + 1, BATCH_SIZE):
+        yield PageView.objects.filter(id__gte=start, id__lt=start + BATCH_SIZE)
+
+
+def _create_lookups(apps, PageView):
+    for model_name, fields, columns in DIMENSIONS:
+        model = apps.get_model('analytics', model_name)
+        rows = PageView.objects.values_list(*columns).distinct().order_by()
+        batch = []
+        for values in rows.iterator(chunk_size=BATCH_SIZE):
+            values = tuple(
+                (value or '')[:MAX_LENGTHS.get(field, 100)] for field, value in zip(fields, values)
+            )
+            if model_name == 'ReferrerDomain' and not values[0]:
+                continue
+            batch.append(model(**dict(zip(fields, values))))
+            if len(batch) >= 5000:
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        model.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def encode_pageviews(apps, schema_editor):
+    PageView = apps.get_model('analytics', 'PageView')
+    Page = apps.get_model('analytics', 'Page')
+    UserAgent = apps.get_model('analytics', 'UserAgent')
+    ReferrerDomain = apps.get_model('analytics', 'ReferrerDomain')
+    Location = apps.get_model('analytics', 'Location')
+
+    _create_lookups(apps, PageView)
+
+    def coalesced(column):
+        return Coalesce(OuterRef(column), Value(''))
+
+    ids = {
+        'page': Page.objects.filter(url=OuterRef('page_url'), title=OuterRef('page_title')),
+        'agent': UserAgent.objects.filter(value=Substr(OuterRef('user_agent'), 1, 500)),
+        'domain': ReferrerDomain.objects.filter(name=OuterRef('referrer_domain')),
+        'location': Location.objects.filter(
+            country=coalesced('country'), region=coalesced('region'), city=coalesced('city')
+        ),
+    }
+    for batch in _id_batches(PageView):
+        batch.filter(page__isnull=True).update(**{
+            field: Subquery(lookup.values('id')[:1]) for field, lookup in ids.items()
+        })
+
+
+def decode_pageviews(apps, schema_editor):
+    PageView = apps.get_model('analytics', 'PageView')
+    Page = apps.get_model('analytics', 'Page')
+    UserAgent = apps.get_model('analytics', 'UserAgent')
+    ReferrerDomain = apps.get_model('analytics', 'ReferrerDomain')
+    Location = apps.get_model('analytics', 'Location')
+
+    def value(model, fk, field):
+        return Subquery(model.objects.filter(id=OuterRef(fk)).values(field)[:1])
+
+    for batch in _id_batches(PageView):
+        batch.update(
+            page_url=value(Page, 'page_id', 'url'),
+            page_title=value(Page, 'page_id', 'title'),
+            user_agent=value(UserAgent, 'agent_id', 'value'),
+            referrer_domain=value(ReferrerDomain, 'domain_id', 'name'),
+            country=value(Location, 'location_id', 'country'),
+            region=value(Location, 'location_id', 'region'),
+            city=value(Location, 'location_id', 'city'),
+        )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('analytics', '0007_dimensions'),
+    ]
+
+    operations = [
+        migrations.RunPython(encode_pageviews, decode_pageviews),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 6.0.2 on 2026-10-17 17:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0008_backfill_dimensions'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='pageview',
+            name='analytics_p_page_ur_c02477_idx',
+        ),
+        migrations.RemoveField(
+            model_name='pageview',
+            name='city',
+        ),
+        migrations.RemoveField(
+            model_name='pageview',
+            name='country',
+        ),
+        migrations.RemoveField(
+            model_name='pageview',
+            name='page_title',
+        ),
+        migrations.RemoveField(
+            model_name='pageview',
+            name='page_url',
+        ),
+        migrations.RemoveField(
+            model_name='pageview',
+            name='referrer_domain',
+        ),
+        migrations.RemoveField(
+            model_name='pageview',
+            name='region',
+        ),
+        migrations.RemoveField(
+            model_name='pageview',
+            name='user_agent',
+        ),
+        migrations.AlterField(
+            model_name='pageview',
+            name='page',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='analytics.page'),
+        ),
+        migrations.AlterField(
+            model_name='pageview',
+            name='agent',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='analytics.useragent'),
+        ),
+        migrations.AddIndex(
+            model_name='pageview',
+            index=models.Index(fields=['page', 'date'], name='analytics_p_page_id_76ebfd_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.2 on 2026-10-17 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0009_drop_pageview_strings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyVitalStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('page_url', models.CharField(max_length=255)),
+                ('metric', models.CharField(choices=[('LCP', 'Largest Contentful Paint'), ('INP', 'Interaction to Next Paint'), ('CLS', 'Cumulative Layout Shift'), ('TTFB', 'Time to First Byte')], max_length=4)),
+                ('bucket', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'page_url', 'metric', 'bucket'), name='analytics_vital_bucket_uniq')],
+            },
+        ),
+    ]
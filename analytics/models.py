@@ -1,7 +1,55 @@
 from django.db import models
 from django.utils import timezone
 from django.db.models import Sum
-from datetime import timedelta
+
+from .periods import resolve_period
+
+# ── Dimensions ───────────────────────────────────────────────────────
+# Repeated PageView strings are stored once here and referenced by id.
+# Rows are created on demand by analytics/dimensions.py and never deleted.
+
+class Page(models.Model):
+    url = models.CharField(max_length=255)
+    title = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['url', 'title'], name='analytics_page_url_title_uniq'),
+        ]
+
+    def __str__(self):
+        return self.url
+
+
+class UserAgent(models.Model):
+    value = models.CharField(max_length=500, unique=True)
+
+    def __str__(self):
+        return self.value
+
+
+class ReferrerDomain(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Location(models.Model):
+    country = models.CharField(max_length=100, blank=True)
+    region = models.CharField(max_length=100, blank=True)
+    city = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['country', 'region', 'city'], name='analytics_location_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return ', '.join(part for part in (self.city, self.region, self.country) if part)
+
 
 class PageView(models.Model):
     TRAFFIC_SOURCES = [
@@ -11,64 +59,223 @@ class PageView(models.Model):
         ('referral', 'Referral'),
     ]
     
-    page_url = models.CharField(max_length=255)
-    page_title = models.CharField(max_length=255, blank=True)
+    page = models.ForeignKey(Page, on_delete=models.PROTECT, db_index=False)
     traffic_source = models.CharField(max_length=20, choices=TRAFFIC_SOURCES, default='direct')
     referrer = models.URLField(blank=True, null=True)
+    # The referrer's domain
+    domain = models.ForeignKey(
+        ReferrerDomain, on_delete=models.PROTECT, null=True, blank=True, db_index=False
+    )
     ip_address = models.GenericIPAddressField()
-    user_agent = models.TextField()
-    country = models.CharField(max_length=100, blank=True, null=True)
-    city = models.CharField(max_length=100, blank=True, null=True)  
-    region = models.CharField(max_length=100, blank=True, null=True)
-    date = models.DateField(auto_now_add=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
-    referrer_domain = models.CharField(max_length=255, blank=True, null=True)
+    agent = models.ForeignKey(UserAgent, on_delete=models.PROTECT, db_index=False)
+    location = models.ForeignKey(
+        Location, on_delete=models.PROTECT, null=True, blank=True, db_index=False
+    )
+    # Set when the view is captured rather than when the buffered row is
+    # flushed, so batched and backfilled rows keep their real time
+    date = models.DateField(default=timezone.localdate)
+    timestamp = models.DateTimeField(default=timezone.now)
     
     class Meta:
         indexes = [
-            models.Index(fields=['page_url', 'date']),
+            models.Index(fields=['page', 'date']),
             models.Index(fields=['traffic_source', 'date']),
             models.Index(fields=['date']),
+            models.Index(fields=['timestamp']),
         ]
     
     def __str__(self):
-        return f"{self.page_url} - {self.date}"
+        return f"{self.page.url} - {self.date}"
+
+
+# PageView columns as they were before dictionary encoding, mapped to the
+# lookups that now hold them. Used to query raw rows by the same names the
+# rollup tables use.
+PAGEVIEW_FIELDS = {
+    'page_url': 'page__url',
+    'page_title': 'page__title',
+    'referrer_domain': 'domain__name',
+    'user_agent': 'agent__value',
+    'country': 'location__country',
+    'region': 'location__region',
+    'city': 'location__city',
+}
+
+
+def pageview_lookup(lookup):
+    """'page_url__startswith' -> 'page__url__startswith'; other lookups unchanged."""
+    field, sep, rest = lookup.partition('__')
+    return PAGEVIEW_FIELDS.get(field, field) + sep + rest
+
+
+def pageview_values(queryset, *fields):
+    """``queryset.values(*fields)`` over PageView, keyed by the pre-encoding column names."""
+    plain = [f for f in fields if pageview_lookup(f) == f]
+    joined = {f: models.F(pageview_lookup(f)) for f in fields if pageview_lookup(f) != f}
+    return queryset.values(*plain, **joined)
+
 
 class AnalyticsManager:
+    @staticmethod
+    def _in_period(queryset, period):
+        date_range = resolve_period(period)
+        return queryset if date_range is None else queryset.filter(date__range=date_range)
+
     @staticmethod
     def get_views_by_period(queryset, period='today'):
-        today = timezone.now().date()
-        
-        if period == 'today':
-            return queryset.filter(date=today).count()
-        elif period == 'week':
-            start_week = today - timedelta(days=today.weekday())
-            return queryset.filter(date__gte=start_week).count()
-        elif period == 'month':
-            start_month = today.replace(day=1)
-            return queryset.filter(date__gte=start_month).count()
-        elif period == 'year':
-            start_year = today.replace(month=1, day=1)
-            return queryset.filter(date__gte=start_year).count()
-        
-        return queryset.count()
-    
+        return AnalyticsManager._in_period(queryset, period).count()
+
     @staticmethod
     def get_traffic_sources(queryset, period='today'):
-        today = timezone.now().date()
-        
-        if period == 'today':
-            filtered = queryset.filter(date=today)
-        elif period == 'week':
-            start_week = today - timedelta(days=today.weekday())
-            filtered = queryset.filter(date__gte=start_week)
-        elif period == 'month':
-            start_month = today.replace(day=1)
-            filtered = queryset.filter(date__gte=start_month)
-        elif period == 'year':
-            start_year = today.replace(month=1, day=1)
-            filtered = queryset.filter(date__gte=start_year)
-        else:
-            filtered = queryset
-            
+        filtered = AnalyticsManager._in_period(queryset, period)
         return filtered.values('traffic_source').annotate(count=models.Count('id'))
+
+
+# ── Rollups ──────────────────────────────────────────────────────────
+# Pre-aggregated view counts, rebuilt per day from raw PageView rows by
+# the rollup_analytics command (see analytics/rollups.py). Everything
+# before the 'rollups' watermark is read from these tables; only rows
+# after it are counted from PageView.
+
+class AnalyticsWatermark(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    position = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+class DailyStat(models.Model):
+    date = models.DateField(unique=True)
+    views = models.PositiveIntegerField(default=0)
+    # HyperLogLog registers over the day's IP addresses (see analytics/hll.py)
+    visitor_sketch = models.BinaryField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.date}: {self.views}"
+
+
+class DailyPageStat(models.Model):
+    date = models.DateField()
+    page_url = models.CharField(max_length=255)
+    page_title = models.CharField(max_length=255, blank=True)
+    traffic_source = models.CharField(max_length=20, choices=PageView.TRAFFIC_SOURCES, default='direct')
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'page_url']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.page_url} ({self.traffic_source}): {self.views}"
+
+
+class DailyReferrerStat(models.Model):
+    date = models.DateField()
+    referrer_domain = models.CharField(max_length=255, blank=True)
+    traffic_source = models.CharField(max_length=20, choices=PageView.TRAFFIC_SOURCES, default='direct')
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'traffic_source']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.referrer_domain}: {self.views}"
+
+
+class DailyLocationStat(models.Model):
+    date = models.DateField()
+    country = models.CharField(max_length=100, blank=True)
+    region = models.CharField(max_length=100, blank=True)
+    city = models.CharField(max_length=100, blank=True)
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'country']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.country}/{self.city}: {self.views}"
+
+
+class HourlyStat(models.Model):
+    hour = models.DateTimeField(unique=True)
+    views = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.hour}: {self.views}"
+
+
+# ── Visits ───────────────────────────────────────────────────────────
+# Page views grouped into visits by (ip, user agent) with an inactivity
+# timeout, built incrementally by the sessionize_analytics command (see
+# analytics/visits.py). Visits stay open, and can still grow, until no
+# view from the same visitor arrives within the timeout.
+
+class Visit(models.Model):
+    # blake2b of ip + user agent; visitors are not otherwise identified
+    visitor_key = models.CharField(max_length=32)
+    date = models.DateField()
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+    entry_page = models.CharField(max_length=255)
+    exit_page = models.CharField(max_length=255)
+    traffic_source = models.CharField(max_length=20, choices=PageView.TRAFFIC_SOURCES, default='direct')
+    referrer_domain = models.CharField(max_length=255, blank=True)
+    depth = models.PositiveIntegerField(default=1)
+    duration = models.PositiveIntegerField(default=0, help_text='Seconds from first to last view')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date']),
+            models.Index(fields=['ended_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.entry_page} → {self.exit_page} ({self.depth} pages)"
+
+
+class DailyVisitStat(models.Model):
+    date = models.DateField(unique=True)
+    visits = models.PositiveIntegerField(default=0)
+    bounces = models.PositiveIntegerField(default=0)
+    pageviews = models.PositiveIntegerField(default=0)
+    duration = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date}: {self.visits} visits"
+
+
+# ── Web Vitals ───────────────────────────────────────────────────────
+# Real-user performance samples from the page beacon, kept only as
+# per-day × page × metric histograms (see analytics/vitals.py for the
+# bucket scheme and percentile math).
+
+class DailyVitalStat(models.Model):
+    METRICS = [
+        ('LCP', 'Largest Contentful Paint'),
+        ('INP', 'Interaction to Next Paint'),
+        ('CLS', 'Cumulative Layout Shift'),
+        ('TTFB', 'Time to First Byte'),
+    ]
+
+    date = models.DateField()
+    page_url = models.CharField(max_length=255)
+    metric = models.CharField(max_length=4, choices=METRICS)
+    bucket = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'page_url', 'metric', 'bucket'], name='analytics_vital_bucket_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.page_url} {self.metric}[{self.bucket}]: {self.count}"
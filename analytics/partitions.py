@@ -0,0 +1,179 @@
+# analytics/partitions.py
+# Monthly range partitioning of analytics_pageview on `date` (PostgreSQL
+# only). Migration 0004 converts the table; the manage_pageview_partitions
+# command keeps future partitions created and archives/drops expired ones.
+import gzip
+import os
+import re
+from datetime import date
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .export import EXPORT_FIELDS
+from .models import PageView, pageview_lookup
+from .rollups import get_watermark
+
+PARENT = 'analytics_pageview'
+# Catches rows for months that have no partition yet (see migration 0004)
+DEFAULT_PARTITION = f'{PARENT}_default'
+PARTITION_NAME = re.compile(rf'^{PARENT}_y(\d{{4}})m(\d{{2}})$')
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{PARENT}_y{month.year}m{month.month:02d}'
+
+
+def is_partitioned(cursor):
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = %s",
+        [PARENT],
+    )
+    return cursor.fetchone() is not None
+
+
+def list_partitions(cursor):
+    """Monthly partitions currently attached, as (first day of month, name)."""
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = %s",
+        [PARENT],
+    )
+    partitions = []
+    for (name,) in cursor.fetchall():
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((date(int(match[1]), int(match[2]), 1), name))
+    return sorted(partitions)
+
+
+def create_partition(cursor, month):
+    """
+    Create the partition for ``month``. Rows the DEFAULT partition caught
+    for that month would make the CREATE fail, so when there are any the
+    DEFAULT partition is detached, the rows moved into the new partition
+    and it is attached again, all in one transaction.
+    """
+    name = partition_name(month)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    with transaction.atomic(using=cursor.db.alias):
+        cursor.execute(
+            f'SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE date >= %s AND date < %s LIMIT 1',
+            [start, end],
+        )
+        stranded = cursor.fetchone() is not None
+        if stranded:
+            cursor.execute(f'ALTER TABLE "{PARENT}" DETACH PARTITION "{DEFAULT_PARTITION}"')
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{PARENT}" '
+            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        )
+        if stranded:
+            cursor.execute(
+                f'INSERT INTO "{name}" SELECT * FROM "{DEFAULT_PARTITION}" WHERE date >= %s AND date < %s',
+                [start, end],
+            )
+            cursor.execute(f'DELETE FROM "{DEFAULT_PARTITION}" WHERE date >= %s AND date < %s', [start, end])
+            cursor.execute(f'ALTER TABLE "{PARENT}" ATTACH PARTITION "{DEFAULT_PARTITION}" DEFAULT')
+    return name
+
+
+def ensure_partitions(months_ahead, today=None):
+    """Create any missing monthly partitions from this month to ``months_ahead`` out."""
+    month = month_start(today or timezone.localdate())
+    last = add_months(month, months_ahead)
+    created = []
+    with connection.cursor() as cursor:
+        existing = {m for m, _ in list_partitions(cursor)}
+        while month <= last:
+            if month not in existing:
+                created.append(create_partition(cursor, month))
+            month = add_months(month, 1)
+    return created
+
+
+def archive_query(name):
+    """
+    SELECT over partition ``name`` with the dimension tables joined back
+    in, giving the same columns as the raw export (analytics/export.py),
+    so an archive stays readable after its partition is dropped.
+    """
+    columns, joins = [], {}
+    for field in EXPORT_FIELDS:
+        lookup = pageview_lookup(field)
+        if '__' not in lookup:
+            columns.append(f'v."{PageView._meta.get_field(field).column}"')
+            continue
+        fk, column = lookup.split('__')
+        relation = PageView._meta.get_field(fk)
+        kind = 'LEFT JOIN' if relation.null else 'JOIN'
+        joins[fk] = (
+            f'{kind} "{relation.related_model._meta.db_table}" "{fk}" '
+            f'ON "{fk}".id = v."{relation.column}"'
+        )
+        columns.append(f'"{fk}"."{relation.related_model._meta.get_field(column).column}" AS "{field}"')
+    return f'SELECT {", ".join(columns)} FROM "{name}" v {" ".join(joins.values())} ORDER BY v.id'
+
+
+def archive_partition(cursor, name, archive_dir):
+    """Stream a partition's rows, as exported, to ``<archive_dir>/<name>.csv.gz`` via COPY."""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f'{name}.csv.gz')
+    tmp_path = f'{path}.tmp'
+    sql = f'COPY ({archive_query(name)}) TO STDOUT WITH CSV HEADER'
+    raw_cursor = cursor.cursor
+    with gzip.open(tmp_path, 'wb') as fh:
+        if hasattr(raw_cursor, 'copy_expert'):
+            # psycopg2
+            raw_cursor.copy_expert(sql, fh)
+        else:
+            # psycopg 3
+            with raw_cursor.copy(sql) as copy:
+                for chunk in copy:
+                    fh.write(chunk)
+    os.replace(tmp_path, path)
+    return path
+
+
+def expired_partitions(cursor, retention_months, today=None):
+    """
+    Partitions entirely older than the retention window and already folded
+    into the rollups (so dropping them never loses dashboard history).
+    """
+    today = today or timezone.localdate()
+    cutoff = add_months(month_start(today), -retention_months)
+    watermark = get_watermark()
+    if watermark is None:
+        return []
+    rolled_through = watermark.date()
+    return [
+        (month, name) for month, name in list_partitions(cursor)
+        if add_months(month, 1) <= cutoff and add_months(month, 1) <= rolled_through
+    ]
+
+
+def expire_partitions(retention_months, archive_dir, drop=True, today=None):
+    """
+    Archive then detach (and by default drop) expired partitions. Returns
+    [(partition name, archive path)].
+    """
+    expired = []
+    with connection.cursor() as cursor:
+        for month, name in expired_partitions(cursor, retention_months, today):
+            path = archive_partition(cursor, name, archive_dir)
+            cursor.execute(f'ALTER TABLE "{PARENT}" DETACH PARTITION "{name}"')
+            if drop:
+                cursor.execute(f'DROP TABLE "{name}"')
+            expired.append((name, path))
+    return expired
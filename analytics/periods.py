@@ -0,0 +1,85 @@
+# analytics/periods.py
+from datetime import date, timedelta
+from typing import NamedTuple
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+PRESETS = ('today', 'week', 'month', 'year')
+
+# Longest custom range accepted, to keep a report bounded
+MAX_RANGE_DAYS = 3 * 366
+
+
+class DateRange(NamedTuple):
+    """Inclusive range of local dates, used wherever a preset period is accepted."""
+    start: date
+    end: date
+
+    def __str__(self):
+        return f'{self.start.isoformat()}..{self.end.isoformat()}'
+
+    @property
+    def days(self):
+        return (self.end - self.start).days + 1
+
+    def previous(self):
+        """The range of the same length that ends the day before this one starts."""
+        return DateRange(self.start - timedelta(days=self.days), self.start - timedelta(days=1))
+
+    @property
+    def granularity(self):
+        """Bucket size for a chart of this range: hour, day, week or month."""
+        if self.days <= 2:
+            return 'hour'
+        if self.days <= 62:
+            return 'day'
+        if self.days <= 182:
+            return 'week'
+        return 'month'
+
+
+def resolve_period(period):
+    """
+    The DateRange a preset name or DateRange covers, ending today for
+    presets. None for anything else, which callers treat as all time.
+    """
+    if isinstance(period, DateRange):
+        return period
+    today = timezone.localdate()
+    if period == 'today':
+        return DateRange(today, today)
+    if period == 'week':
+        return DateRange(today - timedelta(days=today.weekday()), today)
+    if period == 'month':
+        return DateRange(today.replace(day=1), today)
+    if period == 'year':
+        return DateRange(today.replace(month=1, day=1), today)
+    return None
+
+
+def period_from_params(params, default='week'):
+    """
+    The period a request asks for: a DateRange for ?start=&end=
+    (YYYY-MM-DD, either may be omitted for a single day), otherwise the
+    ?period= preset (falling back to ``default``). Raises ValueError for
+    unparseable, reversed or over-long ranges.
+    """
+    start, end = params.get('start'), params.get('end')
+    if not start and not end:
+        period = params.get('period', default)
+        return period if period in PRESETS else default
+
+    try:
+        start = parse_date(start or end)
+        end = parse_date(end or start.isoformat())
+    except (AttributeError, ValueError):
+        start = end = None
+    if start is None or end is None:
+        raise ValueError('Invalid date')
+    if start > end:
+        raise ValueError('start is after end')
+    date_range = DateRange(start, end)
+    if date_range.days > MAX_RANGE_DAYS:
+        raise ValueError(f'Ranges are limited to {MAX_RANGE_DAYS} days')
+    return date_range
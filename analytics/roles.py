@@ -0,0 +1,66 @@
+# analytics/roles.py
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+# Members of these groups are site staff and never tracked
+EXCLUDED_GROUPS = ('Administrator', 'Author')
+
+
+class RoleCache:
+    """
+    Per-process TTL cache of "is this user site staff" so the middleware
+    does not run a groups query on every response. Local entries are dropped
+    as soon as group membership changes (see analytics/signals.py); other
+    workers pick the change up within ``ttl`` seconds.
+    """
+    MAX_ENTRIES = 10000
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'ANALYTICS_ROLE_CACHE_TTL', 300)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def is_excluded(self, user):
+        if not user.is_authenticated:
+            return False
+        if user.is_staff or user.is_superuser:
+            return True
+
+        now = time.monotonic()
+        entry = self._entries.get(user.pk)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        excluded = user.groups.filter(name__in=EXCLUDED_GROUPS).exists()
+        with self._lock:
+            if len(self._entries) >= self.MAX_ENTRIES:
+                self._entries = {
+                    pk: e for pk, e in self._entries.items() if e[0] > now
+                }
+            self._entries[user.pk] = (now + self.ttl, excluded)
+        return excluded
+
+    async def ais_excluded(self, user):
+        if not user.is_authenticated:
+            return False
+        if user.is_staff or user.is_superuser:
+            return True
+        entry = self._entries.get(user.pk)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return await sync_to_async(self.is_excluded)(user)
+
+    def invalidate(self, user_ids=None):
+        """Forget ``user_ids`` (an iterable of pks), or everyone when None."""
+        with self._lock:
+            if user_ids is None:
+                self._entries.clear()
+            else:
+                for pk in user_ids:
+                    self._entries.pop(pk, None)
+
+
+role_cache = RoleCache()
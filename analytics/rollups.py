@@ -0,0 +1,166 @@
+# analytics/rollups.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DateTimeField, Min, Subquery, Value
+from django.db.models.functions import Coalesce, TruncHour
+from django.utils import timezone
+
+from .cache import payload_cache
+from .hll import HyperLogLog
+from .models import (
+    AnalyticsWatermark, DailyLocationStat, DailyPageStat, DailyReferrerStat,
+    DailyStat, HourlyStat, PageView, pageview_values,
+)
+
+WATERMARK = 'rollups'
+
+# Each rollup table with the PageView columns it groups by
+DAILY_ROLLUPS = [
+    (DailyPageStat, ('page_url', 'page_title', 'traffic_source')),
+    (DailyReferrerStat, ('referrer_domain', 'traffic_source')),
+    (DailyLocationStat, ('country', 'region', 'city')),
+]
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# (watermark,) while inside pinned_watermark()
+_pinned = ContextVar('analytics_pinned_watermark', default=None)
+
+
+def get_watermark(name=WATERMARK):
+    """Rows with timestamp before this are covered by the rollup tables."""
+    pinned = _pinned.get()
+    if pinned is not None and name == WATERMARK:
+        return pinned[0]
+    return (
+        AnalyticsWatermark.objects
+        .filter(name=name)
+        .values_list('position', flat=True)
+        .first()
+    )
+
+
+@contextmanager
+def pinned_watermark():
+    """
+    Read the watermark once for a whole report: every get_watermark() and
+    watermark_subquery() inside the block sees that value, so the report
+    costs one watermark query and a compaction running meanwhile cannot
+    split it between two positions. Nested blocks reuse the outer value.
+    """
+    if _pinned.get() is not None:
+        yield
+        return
+    token = _pinned.set((get_watermark(),))
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def watermark_subquery():
+    """
+    The watermark as a SQL expression (epoch when unset), so a query can
+    filter raw rows after it without a separate round-trip. A literal
+    inside pinned_watermark().
+    """
+    pinned = _pinned.get()
+    if pinned is not None:
+        return Value(pinned[0] or EPOCH, output_field=DateTimeField())
+    return Coalesce(
+        Subquery(
+            AnalyticsWatermark.objects.filter(name=WATERMARK).values('position')[:1]
+        ),
+        Value(EPOCH),
+        output_field=DateTimeField(),
+    )
+
+
+def _floor_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _day_bounds(day):
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(day, dt_time.min), tz)
+    return start, start + timedelta(days=1)
+
+
+def rollup_day(day, until):
+    """
+    Rebuild every rollup row for ``day`` from the raw rows recorded before
+    ``until``. Rebuilding the whole day keeps the command idempotent; the
+    cost is bounded by one day of raw data.
+    """
+    raw = PageView.objects.filter(date=day, timestamp__lt=until)
+    day_start, day_end = _day_bounds(day)
+
+    with transaction.atomic():
+        for model, fields in DAILY_ROLLUPS:
+            model.objects.filter(date=day).delete()
+            model.objects.bulk_create(
+                [
+                    model(date=day, views=row['views'], **{f: row[f] or '' for f in fields})
+                    for row in pageview_values(raw, *fields).annotate(views=Count('id')).order_by()
+                ],
+                batch_size=1000,
+            )
+
+        sketch = HyperLogLog().update(
+            raw.values_list('ip_address', flat=True).distinct().order_by().iterator()
+        )
+        DailyStat.objects.update_or_create(
+            date=day,
+            defaults={'views': raw.count(), 'visitor_sketch': sketch.to_bytes()},
+        )
+
+        HourlyStat.objects.filter(hour__gte=day_start, hour__lt=min(day_end, until)).delete()
+        HourlyStat.objects.bulk_create([
+            HourlyStat(hour=row['hour'], views=row['views'])
+            for row in (
+                raw.annotate(hour=TruncHour('timestamp'))
+                .values('hour')
+                .annotate(views=Count('id'))
+                .order_by()
+            )
+        ])
+
+
+def compact(until=None, rebuild=False):
+    """
+    Advance the rollup watermark to ``until`` (default: the last full hour
+    that is at least ANALYTICS_ROLLUP_GRACE seconds old), rebuilding each
+    day the advance touches. Returns the days rebuilt.
+    """
+    if until is None:
+        grace = getattr(settings, 'ANALYTICS_ROLLUP_GRACE', 600)
+        until = _floor_hour(timezone.now() - timedelta(seconds=grace))
+
+    start = None if rebuild else get_watermark()
+    if start is None:
+        first = PageView.objects.aggregate(first=Min('timestamp'))['first']
+        if first is None:
+            return []
+        start = _floor_hour(first)
+    if until <= start:
+        return []
+
+    tz = timezone.get_current_timezone()
+    day = timezone.localtime(start, tz).date()
+    last_day = timezone.localtime(until - timedelta(microseconds=1), tz).date()
+    days = []
+    while day <= last_day:
+        rollup_day(day, until)
+        days.append(day)
+        day += timedelta(days=1)
+
+    AnalyticsWatermark.objects.update_or_create(
+        name=WATERMARK, defaults={'position': until}
+    )
+    payload_cache.invalidate()
+    return days
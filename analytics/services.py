@@ -1,185 +1,432 @@
 # analytics/services.py
-from django.db.models import Count
+from collections import Counter
+from django.db.models import Count, DateField, DateTimeField, Sum
+from django.db.models.functions import TruncDay, TruncHour, TruncMonth, TruncWeek, TruncYear
 from django.utils import timezone
-from datetime import timedelta
-from .models import PageView, AnalyticsManager
+from datetime import date, datetime, time, timedelta
+from .models import (
+    PageView, DailyStat, DailyPageStat, DailyReferrerStat, DailyLocationStat,
+    DailyVisitStat, DailyVitalStat, HourlyStat, Visit, pageview_lookup, pageview_values,
+)
+from .hll import HyperLogLog
+from .periods import DateRange, resolve_period
+from .rollups import get_watermark, pinned_watermark, watermark_subquery
+from .trends import trend_summary
+from .vitals import page_vitals
 
 
 class AnalyticsService:
 
     @staticmethod
-    def get_dashboard_data(period='today'):
-        page_views = PageView.objects.all()
-        chart_data_result = AnalyticsService.get_chart_data(period)
-        filtered = AnalyticsService._filter_by_period(page_views, period)
-
-        unique_visitors = filtered.values('ip_address').distinct().count()
+    def get_dashboard_data(period='today', compare=False):
+        with pinned_watermark():
+            return AnalyticsService._dashboard_data(period, compare)
 
+    @staticmethod
+    def _dashboard_data(period, compare):
+        chart_data_result = AnalyticsService.get_chart_data(period, compare)
         location_data = AnalyticsService.get_location_data('countries', period)
+        total_views = AnalyticsService._total_views(period)
 
-        return {
-            'total_views': AnalyticsManager.get_views_by_period(page_views, period),
-            'unique_visitors': unique_visitors,
-            'traffic_sources': list(AnalyticsManager.get_traffic_sources(page_views, period)),
+        data = {
+            'total_views': total_views,
+            'unique_visitors': AnalyticsService.get_unique_visitors(period),
+            'traffic_sources': AnalyticsService._traffic_sources(period),
             'top_pages': AnalyticsService.get_top_pages(period),
             'chart_data': chart_data_result,
             'labels': [item['label'] for item in chart_data_result],
             'top_referrers': AnalyticsService.get_top_referrers(period),
             'locations': location_data,
         }
+        date_range = resolve_period(period)
+        if isinstance(period, DateRange) or compare:
+            data['range'] = {
+                'start': date_range.start.isoformat(),
+                'end': date_range.end.isoformat(),
+                'granularity': date_range.granularity,
+            }
+        if compare:
+            # Read off the chart series, which already covers both ranges
+            previous = sum(point['previous'] for point in chart_data_result)
+            previous_range = date_range.previous()
+            data['comparison'] = {
+                'start': previous_range.start.isoformat(),
+                'end': previous_range.end.isoformat(),
+                'total_views': previous,
+                'change': round((total_views - previous) * 100 / previous, 1) if previous else None,
+            }
+        return data
 
     @staticmethod
-    def get_top_pages(period='today', limit=10):
-        page_views = PageView.objects.all()
-        filtered_views = AnalyticsService._filter_by_period(page_views, period)
-        return list(
-            filtered_views
-            .values('page_url', 'page_title')
-            .annotate(views=Count('id'))
-            .order_by('-views')[:limit]
+    def get_traffic_data(period='today', compare=False):
+        # get_dashboard_data already carries the chart series
+        with pinned_watermark():
+            return {
+                **AnalyticsService.get_dashboard_data(period, compare),
+                'blog_analytics': AnalyticsService.get_blog_analytics(period),
+                'visits': AnalyticsService.get_visit_metrics(period),
+            }
+
+    @staticmethod
+    def get_top_pages(period='today', limit=10, **filters):
+        counts = AnalyticsService._grouped_counts(
+            DailyPageStat, ('page_url', 'page_title'), period, **filters
         )
+        return [
+            {'page_url': page_url, 'page_title': page_title, 'views': views}
+            for (page_url, page_title), views in counts.most_common(limit)
+        ]
 
     @staticmethod
     def get_blog_analytics(period='today'):
-        blog_views = PageView.objects.filter(page_url__startswith='/blog/')
+        blog_filter = {'page_url__startswith': '/blog/'}
         return {
-            'total_blog_views': AnalyticsManager.get_views_by_period(blog_views, period),
-            'blog_traffic_sources': list(AnalyticsManager.get_traffic_sources(blog_views, period)),
-            'top_blog_posts': list(
-                AnalyticsService._filter_by_period(blog_views, period)
-                .values('page_url', 'page_title')
-                .annotate(views=Count('id'))
-                .order_by('-views')[:5]
-            ),
+            'total_blog_views': AnalyticsService._total_views(period, **blog_filter),
+            'blog_traffic_sources': AnalyticsService._traffic_sources(period, **blog_filter),
+            'top_blog_posts': AnalyticsService.get_top_pages(period, limit=5, **blog_filter),
         }
 
     @staticmethod
-    def _filter_by_period(queryset, period):
-        today = timezone.now().date()
+    def get_visit_metrics(period='today', limit=5):
+        """
+        Visit totals from DailyVisitStat plus top entry/exit pages. Covers
+        page views up to the last sessionize_analytics run.
+        """
+        totals = AnalyticsService._filter_by_period(DailyVisitStat.objects.all(), period).aggregate(
+            visits=Sum('visits'),
+            bounces=Sum('bounces'),
+            pageviews=Sum('pageviews'),
+            duration=Sum('duration'),
+        )
+        visits = totals['visits'] or 0
+        period_visits = AnalyticsService._filter_by_period(Visit.objects.all(), period)
 
-        if period == 'today':
-            return queryset.filter(date=today)
-        elif period == 'week':
-            start_week = today - timedelta(days=today.weekday())
-            return queryset.filter(date__gte=start_week)
-        elif period == 'month':
-            start_month = today.replace(day=1)
-            return queryset.filter(date__gte=start_month)
-        elif period == 'year':
-            start_year = today.replace(month=1, day=1)
-            return queryset.filter(date__gte=start_year)
+        def top(field):
+            return [
+                {'page_url': row[field], 'visits': row['visits']}
+                for row in period_visits.values(field).annotate(visits=Count('id')).order_by('-visits')[:limit]
+            ]
+
+        return {
+            'visits': visits,
+            'bounce_rate': round((totals['bounces'] or 0) * 100 / visits, 1) if visits else 0,
+            'pages_per_visit': round((totals['pageviews'] or 0) / visits, 2) if visits else 0,
+            'avg_duration': round((totals['duration'] or 0) / visits) if visits else 0,
+            'top_entry_pages': top('entry_page'),
+            'top_exit_pages': top('exit_page'),
+        }
+
+    @staticmethod
+    def get_vitals(period='month', limit=20):
+        """p50/p75/p95 of each Web Vitals metric for the most-sampled pages."""
+        return page_vitals(
+            AnalyticsService._filter_by_period(DailyVitalStat.objects.all(), period), limit
+        )
+
+    @staticmethod
+    def get_trends(granularity='day', limit=5):
+        """Week-over-week movers and recent spikes for pages, sources and countries."""
+        return {
+            dimension: trend_summary(dimension, granularity, limit)
+            for dimension in ('page', 'source', 'country')
+        }
+
+    @staticmethod
+    def _grouped_counts(stat_model, fields, period, **filters):
+        """
+        Counter of views keyed by ``fields`` values for the period: summed
+        from ``stat_model`` up to the rollup watermark, counted from raw
+        PageView rows after it. ``filters`` must name columns both tables
+        share.
+        """
+        watermark = get_watermark()
+        counts = Counter()
+        raw = AnalyticsService._raw_page_views(period, **filters)
+
+        if watermark is not None:
+            rolled = AnalyticsService._filter_by_period(stat_model.objects.filter(**filters), period)
+            for row in rolled.values(*fields).annotate(n=Sum('views')).order_by():
+                counts[tuple(row[f] for f in fields)] += row['n']
+            raw = raw.filter(timestamp__gte=watermark)
+
+        for row in pageview_values(raw, *fields).annotate(n=Count('id')).order_by():
+            counts[tuple(row[f] or '' for f in fields)] += row['n']
+        return counts
+
+    @staticmethod
+    def _total_views(period, **filters):
+        watermark = get_watermark()
+        raw = AnalyticsService._raw_page_views(period, **filters)
+        total = 0
+        if watermark is not None:
+            stat_model = DailyPageStat if filters else DailyStat
+            rolled = AnalyticsService._filter_by_period(stat_model.objects.filter(**filters), period)
+            total = rolled.aggregate(n=Sum('views'))['n'] or 0
+            raw = raw.filter(timestamp__gte=watermark)
+        return total + raw.count()
+
+    @staticmethod
+    def get_unique_visitors(period):
+        """
+        Approximate distinct IPs for the period: the rolled-up days' HyperLogLog
+        sketches merged in memory, plus raw IPs recorded after the watermark.
+        Accurate to about ±1.6% (one standard error); see analytics/hll.py.
+        """
+        watermark = get_watermark()
+        sketch = HyperLogLog()
+        raw = AnalyticsService._filter_by_period(PageView.objects.all(), period)
+        if watermark is not None:
+            sketches = AnalyticsService._filter_by_period(
+                DailyStat.objects.exclude(visitor_sketch=None), period
+            ).values_list('visitor_sketch', flat=True)
+            for data in sketches:
+                sketch.merge(HyperLogLog.from_bytes(data))
+            raw = raw.filter(timestamp__gte=watermark)
+        sketch.update(raw.values_list('ip_address', flat=True).distinct().order_by().iterator())
+        return sketch.count()
+
+    @staticmethod
+    def _traffic_sources(period, **filters):
+        counts = AnalyticsService._grouped_counts(
+            DailyPageStat, ('traffic_source',), period, **filters
+        )
+        return [
+            {'traffic_source': source, 'count': count}
+            for (source,), count in counts.items()
+        ]
+
+    @staticmethod
+    def _raw_page_views(period, **filters):
+        """PageViews for the period; ``filters`` use the rollup tables' column names."""
+        return AnalyticsService._filter_by_period(
+            PageView.objects.filter(**{pageview_lookup(k): v for k, v in filters.items()}),
+            period,
+        )
 
-        return queryset
+    @staticmethod
+    def _filter_by_period(queryset, period):
+        """``queryset`` (of a model with a ``date``) limited to a preset or DateRange."""
+        date_range = resolve_period(period)
+        if date_range is None:
+            return queryset
+        if date_range.start == date_range.end:
+            return queryset.filter(date=date_range.start)
+        return queryset.filter(date__range=date_range)
 
     @staticmethod
-    def get_chart_data(period='week'):
-        today = timezone.now().date()
-        now = timezone.now()
+    def get_chart_data(period='week', compare=False):
+        """
+        [{'label', 'value'}] for the chart. Presets keep their fixed
+        layouts; a DateRange, or any period with ``compare``, is bucketed
+        by its span (see get_range_chart).
+        """
+        if isinstance(period, DateRange) or compare:
+            return AnalyticsService.get_range_chart(resolve_period(period), compare)
+
+        today = timezone.localdate()
 
         if period == 'today':
             # Hourly breakdown for today (0–23)
-            data = []
-            for hour in range(24):
-                count = PageView.objects.filter(
-                    date=today,
-                    timestamp__hour=hour,
-                ).count()
-                # Format: 12am, 1am … 12pm, 1pm …
-                if hour == 0:
-                    label = '12am'
-                elif hour < 12:
-                    label = f'{hour}am'
-                elif hour == 12:
-                    label = '12pm'
-                else:
-                    label = f'{hour - 12}pm'
-                data.append({'label': label, 'value': count})
+            counts = AnalyticsService._series(TruncHour, today, today)
+            by_hour = Counter()
+            for bucket, views in counts.items():
+                by_hour[timezone.localtime(bucket).hour] += views
+
+            data = [
+                {'label': AnalyticsService._hour_label(hour), 'value': by_hour[hour]}
+                for hour in range(24)
+            ]
 
         elif period == 'week':
-            # Last 4 weeks Mon→Sun
-            data = []
-            for i in range(3, -1, -1):
-                week_end = today - timedelta(days=i * 7)
-                week_start = week_end - timedelta(days=6)
-                count = PageView.objects.filter(
-                    date__range=[week_start, week_end]
-                ).count()
-                data.append({
-                    'label': f"{week_start.strftime('%b %d')}–{week_end.strftime('%d')}",
-                    'value': count,
-                })
+            # Last 4 weeks Mon→Sun, the current week last
+            this_week = today - timedelta(days=today.weekday())
+            weeks = [this_week - timedelta(weeks=i) for i in range(3, -1, -1)]
+            counts = AnalyticsService._series(TruncWeek, weeks[0], today)
+            data = [
+                {
+                    'label': f"{week.strftime('%b %d')}–{(week + timedelta(days=6)).strftime('%d')}",
+                    'value': counts.get(week, 0),
+                }
+                for week in weeks
+            ]
 
         elif period == 'month':
             # Last 6 calendar months
-            data = []
-            for i in range(5, -1, -1):
-                month_date = (today.replace(day=1) - timedelta(days=32 * i)).replace(day=1)
-                next_month = (month_date + timedelta(days=32)).replace(day=1)
-                count = PageView.objects.filter(
-                    date__gte=month_date,
-                    date__lt=next_month,
-                ).count()
-                data.append({
-                    'label': month_date.strftime('%b %Y'),
-                    'value': count,
-                })
+            months = []
+            year, month = today.year, today.month
+            for _ in range(6):
+                months.insert(0, date(year, month, 1))
+                year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+            counts = AnalyticsService._series(TruncMonth, months[0], today)
+            data = [
+                {'label': month.strftime('%b %Y'), 'value': counts.get(month, 0)}
+                for month in months
+            ]
 
         else:  # year
             # Last 3 years
-            data = []
-            current_year = today.year
-            for i in range(2, -1, -1):
-                year = current_year - i
-                count = PageView.objects.filter(date__year=year).count()
-                data.append({'label': str(year), 'value': count})
+            years = [date(today.year - i, 1, 1) for i in range(2, -1, -1)]
+            counts = AnalyticsService._series(TruncYear, years[0], today)
+            data = [
+                {'label': str(year.year), 'value': counts.get(year, 0)}
+                for year in years
+            ]
 
         return data
 
     @staticmethod
-    def get_location_data(location_type, period='week'):
-        page_views = PageView.objects.all()
-        filtered_views = AnalyticsService._filter_by_period(page_views, period)
+    def _hour_label(hour):
+        # Format: 12am, 1am … 12pm, 1pm …
+        if hour == 0:
+            return '12am'
+        if hour < 12:
+            return f'{hour}am'
+        if hour == 12:
+            return '12pm'
+        return f'{hour - 12}pm'
+
+    @staticmethod
+    def get_range_chart(date_range, compare=False):
+        """
+        Series for ``date_range`` in hour, day, week or month buckets
+        (DateRange.granularity). With ``compare`` each point also carries
+        'previous', the matching bucket of the range just before. Both
+        ranges come from one hourly or daily query; weeks are 7-day blocks
+        from the range start and months calendar months, so previous-range
+        buckets line up by position.
+        """
+        granularity = date_range.granularity
+        first_day = date_range.previous().start if compare else date_range.start
+        trunc = TruncHour if granularity == 'hour' else TruncDay
+        counts = AnalyticsService._series(trunc, first_day, date_range.end)
+
+        def buckets(rng):
+            """[(label, [keys of ``counts`` in the bucket])] covering ``rng``."""
+            if granularity == 'hour':
+                start = timezone.make_aware(datetime.combine(rng.start, time.min))
+                hours = [timezone.localtime(start + timedelta(hours=i)) for i in range(rng.days * 24)]
+                return [
+                    (
+                        f"{hour.strftime('%a')} {AnalyticsService._hour_label(hour.hour)}"
+                        if rng.days > 1 else AnalyticsService._hour_label(hour.hour),
+                        [hour],
+                    )
+                    for hour in hours
+                ]
+            days = [rng.start + timedelta(days=i) for i in range(rng.days)]
+            if granularity == 'day':
+                return [(day.strftime('%b %d'), [day]) for day in days]
+            if granularity == 'week':
+                return [(days[i].strftime('%b %d'), days[i:i + 7]) for i in range(0, len(days), 7)]
+            months = {}
+            for day in days:
+                months.setdefault(day.strftime('%b %Y'), []).append(day)
+            return list(months.items())
+
+        def values(rng):
+            return [(label, sum(counts.get(key, 0) for key in keys)) for label, keys in buckets(rng)]
+
+        data = [{'label': label, 'value': value} for label, value in values(date_range)]
+        if compare:
+            previous = values(date_range.previous())
+            for i, point in enumerate(data):
+                point['previous'] = previous[i][1] if i < len(previous) else 0
+        return data
+
+    @staticmethod
+    def _series(trunc, first_day, last_day):
+        """
+        {bucket start: views} between two dates in a single round-trip:
+        HourlyStat/DailyStat rollups UNION ALL raw rows recorded after the
+        watermark, each grouped by ``trunc``. Empty buckets are left for the
+        caller to zero-fill. Hourly buckets are datetimes, the rest dates.
+        """
+        range_start = timezone.make_aware(datetime.combine(first_day, time.min))
+        range_end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min))
 
+        if trunc is TruncHour:
+            output_field = DateTimeField()
+            rolled = (
+                HourlyStat.objects
+                .filter(hour__gte=range_start, hour__lt=range_end)
+                .annotate(bucket=trunc('hour'))
+            )
+        else:
+            output_field = DateField()
+            rolled = (
+                DailyStat.objects
+                .filter(date__range=[first_day, last_day])
+                .annotate(bucket=trunc('date'))
+            )
+        rolled = rolled.values_list('bucket').annotate(views=Sum('views')).order_by()
+        raw = (
+            PageView.objects
+            .filter(timestamp__gte=watermark_subquery())
+            .filter(timestamp__gte=range_start, timestamp__lt=range_end)
+            .annotate(bucket=trunc('timestamp', output_field=output_field))
+            .values_list('bucket')
+            .annotate(views=Count('id'))
+            .order_by()
+        )
+
+        counts = Counter()
+        for bucket, views in rolled.union(raw, all=True):
+            counts[bucket] += views
+        return counts
+
+    @staticmethod
+    def get_location_data(location_type, period='week'):
         if location_type == 'countries':
-            location_data = list(
-                filtered_views
-                .exclude(country__isnull=True)
-                .exclude(country='')
-                .exclude(country='Local')
-                .values('country')
-                .annotate(count=Count('id'))
-                .order_by('-count')[:10]
+            counts = AnalyticsService._grouped_counts(
+                DailyLocationStat, ('country',), period
             )
-            return [{'name': item['country'], 'count': item['count']} for item in location_data]
+            return [
+                {'name': country, 'count': count}
+                for (country,), count in counts.most_common()
+                if country not in ('', 'Local')
+            ][:10]
 
         else:
-            location_data = list(
-                filtered_views
-                .exclude(city__isnull=True)
-                .exclude(city='')
-                .exclude(city='Local')
-                .values('city', 'region')
-                .annotate(count=Count('id'))
-                .order_by('-count')[:10]
+            counts = AnalyticsService._grouped_counts(
+                DailyLocationStat, ('city', 'region'), period
             )
             return [
                 {
-                    'name': f"{item['city']}, {item['region']}" if item['region'] else item['city'],
-                    'count': item['count'],
+                    'name': f"{city}, {region}" if region else city,
+                    'count': count,
                 }
-                for item in location_data
-            ]
+                for (city, region), count in counts.most_common()
+                if city not in ('', 'Local')
+            ][:10]
 
     @staticmethod
     def get_top_referrers(period='today', limit=5):
-        page_views = PageView.objects.all()
-        filtered_views = AnalyticsService._filter_by_period(page_views, period)
-        return list(
-            filtered_views
-            .exclude(traffic_source='direct')
-            .exclude(referrer_domain__isnull=True)
-            .exclude(referrer_domain='')
-            .values('referrer_domain', 'traffic_source')
-            .annotate(count=Count('id'))
-            .order_by('-count')[:limit]
-        )
\ No newline at end of file
+        counts = AnalyticsService._grouped_counts(
+            DailyReferrerStat, ('referrer_domain', 'traffic_source'), period
+        )
+        return [
+            {'referrer_domain': domain, 'traffic_source': source, 'count': count}
+            for (domain, source), count in counts.most_common()
+            if domain and source != 'direct'
+        ][:limit]
+
+    @staticmethod
+    def get_source_detail(source_type, period='week', limit=10):
+        if source_type == 'direct':
+            # For direct traffic, show page titles instead of domains
+            counts = AnalyticsService._grouped_counts(
+                DailyPageStat, ('page_title',), period, traffic_source='direct'
+            )
+            return [
+                {'domain': title or 'Homepage', 'count': count}
+                for (title,), count in counts.most_common(limit)
+            ]
+
+        counts = AnalyticsService._grouped_counts(
+            DailyReferrerStat, ('referrer_domain',), period, traffic_source=source_type
+        )
+        return [
+            {'domain': domain, 'count': count}
+            for (domain,), count in counts.most_common()
+            if domain
+        ][:limit]
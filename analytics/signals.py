@@ -0,0 +1,54 @@
+# analytics/signals.py
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from blog.models import Category, Post
+
+from .roles import role_cache
+from .titles import blog_titles
+
+User = get_user_model()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        # user.groups.add(...) / .remove(...) / .clear()
+        role_cache.invalidate([instance.pk])
+    elif pk_set is not None:
+        # group.user_set.add(...) / .remove(...)
+        role_cache.invalidate(pk_set)
+    else:
+        # group.user_set.clear(): members are no longer known
+        role_cache.invalidate()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, **kwargs):
+    # A renamed or deleted group can change who counts as staff
+    role_cache.invalidate()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, **kwargs):
+    blog_titles.post_changed(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    blog_titles.post_changed(instance, deleted=True)
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, **kwargs):
+    blog_titles.category_changed(instance)
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    blog_titles.category_changed(instance, deleted=True)
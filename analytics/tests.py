@@ -1,3 +1,753 @@
-from django.test import TestCase
+import asyncio
+import atexit
+import csv
+import gzip
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time as time_module
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .benchmarks import legacy_classify
+from .hll import HyperLogLog
+from .beacon import MAX_EVENT_AGE, record_beacon
+from .cache import PayloadCache
+from .checks import rollup_grace_check
+from .dimensions import encode_page_views, locations, pages, referrer_domains, user_agents
+from .export import EXPORT_FIELDS, FORMATS, export_queryset, stream_export
+from .geoip import EMPTY_LOCATION, LOCAL_LOCATION, RangeDatabaseBackend, ip_to_int, write_range_database
+from .ingest import PageViewBuffer
+from .live import LiveVisitors
+from .middleware import AnalyticsMiddleware
+from .models import AnalyticsWatermark, DailyVisitStat, PageView, Visit
+from .periods import MAX_RANGE_DAYS, DateRange, period_from_params, resolve_period
+from .partitions import (
+    DEFAULT_PARTITION, add_months, archive_query, create_partition, list_partitions, month_start,
+)
+from .rollups import compact, get_watermark
+from .services import AnalyticsService
+from .titles import blog_titles
+from .visits import sessionize
+from .trends import analyze
+from .utils import TrafficSourceDetector
+from .vitals import bucket_for, percentiles
+
+
+class HyperLogLogTests(SimpleTestCase):
+    def _ips(self, n, seed):
+        rnd = random.Random(seed)
+        return {
+            f'{rnd.randint(1, 223)}.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}'
+            for _ in range(n)
+        }
+
+    def test_estimate_within_error_bounds(self):
+        for n in (50, 1000, 20000, 100000):
+            ips = self._ips(n, seed=n)
+            estimate = HyperLogLog().update(ips).count()
+            # Four standard errors (1.04 / sqrt(4096) ≈ 1.6% each)
+            self.assertLessEqual(abs(estimate - len(ips)), max(2, 0.065 * len(ips)), n)
+
+    def test_merged_daily_sketches_match_exact_range_count(self):
+        days = [self._ips(3000, seed=day) for day in range(30)]
+        # Overlapping visitors across days
+        for day in days[1:]:
+            day.update(list(days[0])[:500])
+
+        merged = HyperLogLog()
+        for ips in days:
+            merged.merge(HyperLogLog.from_bytes(HyperLogLog().update(ips).to_bytes()))
+
+        exact = len(set().union(*days))
+        self.assertLessEqual(abs(merged.count() - exact), 0.065 * exact)
+        self.assertEqual(merged.count(), HyperLogLog().update(set().union(*days)).count())
+
+    def test_duplicates_do_not_inflate(self):
+        sketch = HyperLogLog().update(['41.58.1.1'] * 1000)
+        self.assertEqual(sketch.count(), 1)
+
+
+class VitalsHistogramTests(SimpleTestCase):
+    def test_percentiles_close_to_exact(self):
+        rnd = random.Random(7)
+        for metric, samples in (
+            ('LCP', [rnd.lognormvariate(7.8, 0.6) for _ in range(20000)]),
+            ('CLS', [rnd.random() * 0.3 for _ in range(5000)]),
+        ):
+            histogram = Counter(bucket_for(metric, value) for value in samples)
+            result = percentiles(metric, histogram)
+            samples.sort()
+            self.assertEqual(result['samples'], len(samples))
+            for q in (50, 75, 95):
+                exact = samples[int(len(samples) * q / 100)]
+                self.assertLessEqual(abs(result[f'p{q}'] - exact), 0.06 * exact, (metric, q))
+
+    def test_empty_histogram(self):
+        self.assertEqual(percentiles('INP', {}), {'samples': 0, 'p50': None, 'p75': None, 'p95': None})
+
+
+class TrendAnalysisTests(SimpleTestCase):
+    def test_spike_change_and_moving_average(self):
+        rng = np.random.default_rng(3)
+        matrix = rng.poisson(50, size=(200, 56)).astype(float)
+        matrix[7, -2] = 400           # one spike
+        matrix[9, -7:] *= 2           # a doubled week
+
+        stats = analyze(matrix)
+        self.assertTrue(stats['spikes'][7, -2])
+        # Poisson noise alone rarely clears z > 3
+        noise = np.delete(stats['spikes'][:, -7:], [7, 9], axis=0)
+        self.assertLess(noise.sum(), 5)
+        self.assertGreater(stats['change'][9], 60)
+        self.assertAlmostEqual(stats['moving_average'][0, -1], matrix[0, -7:].mean())
+        self.assertTrue(np.isnan(stats['moving_average'][0, 5]))
+
+    def test_empty_previous_week_has_no_change(self):
+        matrix = np.zeros((1, 14))
+        matrix[0, -7:] = 5
+        self.assertTrue(np.isnan(analyze(matrix, z_window=7)['change'][0]))
+
+
+class TrafficSourceTests(SimpleTestCase):
+    def test_country_search_domains_match_legacy(self):
+        for host in ('google.com.ng', 'www.google.com.ng', 'news.google.com.ng', 'bing.com.ng',
+                     'yahoo.com.au', 'search.yahoo.com.sg', 'yandex.com.tr', 'baidu.com.cn',
+                     'google.com', 'www.bing.com', 'duckduckgo.com',
+                     'example.com.ng', 'blog.some-site.co.uk', 'www.linkedin.com'):
+            referrer = f'https://{host}/search?q=clinic'
+            self.assertEqual(TrafficSourceDetector.classify(referrer), legacy_classify(referrer), host)
+
+    def test_engine_under_any_public_suffix_is_search(self):
+        for host in ('google.co.uk', 'www.google.de', 'yandex.ru', 'search.yahoo.co.jp', 'bing.ng'):
+            self.assertEqual(TrafficSourceDetector.classify(f'https://{host}/'), ('search', host.removeprefix('www.')))
+
+    def test_engine_name_inside_another_domain_is_referral(self):
+        for host in ('google.example.com', 'bing.some-site.co.uk', 'notgoogle.com'):
+            self.assertEqual(TrafficSourceDetector.classify(f'https://{host}/')[0], 'referral', host)
+
+
+class RangeDatabaseTests(SimpleTestCase):
+    ranges = [
+        (ip_to_int('41.58.0.0'), ip_to_int('41.58.255.255'), 'Nigeria', 'Lagos', 'Ikeja'),
+        (ip_to_int('102.89.0.0'), ip_to_int('102.89.127.255'), 'Nigeria', 'FCT', 'Abuja'),
+    ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'geoip.bin')
+        write_range_database(self.path, self.ranges)
+        self.backend = RangeDatabaseBackend(self.path)
+        self.backend.RELOAD_CHECK = 0
+
+    def _touch(self):
+        # A distinct mtime even on filesystems with coarse timestamps
+        stat = os.stat(self.path)
+        os.utime(self.path, (stat.st_atime, stat.st_mtime + 1))
+
+    def test_lookup_hits_and_misses(self):
+        self.assertEqual(self.backend.locate('41.58.200.7'), {'country': 'Nigeria', 'region': 'Lagos', 'city': 'Ikeja'})
+        self.assertEqual(self.backend.locate('102.89.127.255')['city'], 'Abuja')
+        for ip in ('102.89.128.0', '8.8.8.8', '2c0f:f5c0::1', 'not-an-ip'):
+            self.assertEqual(self.backend.locate(ip), EMPTY_LOCATION, ip)
+        self.assertEqual(self.backend.locate('::1'), LOCAL_LOCATION)
+
+    def test_reload_picks_up_a_new_file_and_keeps_the_old_one_on_errors(self):
+        self.assertEqual(self.backend.locate('8.8.8.8'), EMPTY_LOCATION)
+        write_range_database(self.path, [(ip_to_int('8.8.8.0'), ip_to_int('8.8.8.255'), 'United States', '', '')])
+        self._touch()
+        self.assertEqual(self.backend.locate('8.8.8.8')['country'], 'United States')
+
+        for content in (b'NOTGEOIP' + bytes(8), open(self.path, 'rb').read()[:-20], b'DJ'):
+            # Replaced, as load_geoip does: writing in place would change
+            # the pages the loaded database is mapped from
+            with open(f'{self.path}.tmp', 'wb') as fh:
+                fh.write(content)
+            os.replace(f'{self.path}.tmp', self.path)
+            self._touch()
+            with self.assertLogs('analytics.geoip', 'ERROR'):
+                self.assertEqual(self.backend.locate('8.8.8.9')['country'], 'United States')
+
+
+class LiveVisitorsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _view(self, ip, minutes_ago=0):
+        return {
+            'timestamp': timezone.now() - timedelta(minutes=minutes_ago),
+            'ip_address': ip, 'user_agent': 'Mozilla/5.0',
+        }
+
+    def _add(self, ring, worker):
+        with mock.patch.object(LiveVisitors, 'worker', f'host:{worker}'):
+            ring.add([self._view('41.58.1.1'), self._view(f'41.58.2.{worker}'), self._view('41.58.3.3', 20)])
+
+    def test_workers_share_the_ring(self):
+        with mock.patch.object(LiveVisitors, 'shared', True):
+            for worker in range(2):
+                self._add(LiveVisitors(), worker)
+            snapshot = LiveVisitors().snapshot()
+        # Visitor 41.58.1.1 was counted by both workers; 41.58.3.3 is no longer active
+        self.assertEqual(snapshot['active'], 3)
+        self.assertEqual(sum(views for _, views in snapshot['minutes']), 6)
+
+    def test_heartbeat_is_claimed_once_per_worker(self):
+        ring = LiveVisitors(max_workers=2)
+        with mock.patch.object(LiveVisitors, 'shared', True):
+            self._add(LiveVisitors(max_workers=2), 'other')
+            self._add(ring, 'self')
+            with mock.patch.object(cache, 'add') as add:
+                self._add(ring, 'self')
+            # Full: a third worker keeps its own count but is not published
+            with self.assertLogs('analytics.live', 'WARNING'):
+                self._add(LiveVisitors(max_workers=2), 'third')
+            snapshot = LiveVisitors(max_workers=2).snapshot()
+        add.assert_not_called()
+        self.assertEqual(sum(views for _, views in snapshot['minutes']), 9)
+
+    def test_per_process_cache_keeps_the_ring_in_memory(self):
+        ring = LiveVisitors()
+        with mock.patch.object(cache, 'set_many') as set_many, mock.patch.object(cache, 'get_many') as get_many:
+            self._add(ring, 0)
+            snapshot = ring.snapshot()
+        set_many.assert_not_called()
+        get_many.assert_not_called()
+        self.assertEqual(snapshot['active'], 2)
+        self.assertEqual(sum(views for _, views in snapshot['minutes']), 3)
+
+
+class RecordingBuffer(PageViewBuffer):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        atexit.unregister(self.shutdown)
+        self.batches = []
+
+    def save(self, batch):
+        self.batches.append(len(batch))
+
+
+class PageViewBufferTests(SimpleTestCase):
+    def _buffer(self, events, **kwargs):
+        buffer = RecordingBuffer(**{'flush_interval': 0.05, **kwargs})
+        with mock.patch('analytics.ingest.live_visitors') as live:
+            for event in events:
+                buffer.put(event)
+            buffer.shutdown()
+        return buffer, live
+
+    def test_batches_and_drains_at_shutdown(self):
+        buffer, live = self._buffer(range(5), batch_size=2)
+        self.assertEqual(sorted(buffer.batches), [1, 2, 2])
+        self.assertEqual(live.add.call_count, 3)
+        stats = buffer.stats()
+        self.assertEqual((stats['written'], stats['batches'], stats['queued']), (5, 3, 0))
+
+        # Nothing waits for the flush interval once shutdown is called
+        buffer, _ = self._buffer(range(3), batch_size=10, flush_interval=60)
+        self.assertEqual(sum(buffer.batches), 3)
+
+    def test_full_queue_drops(self):
+        buffer = RecordingBuffer(max_size=2)
+        with mock.patch.object(buffer, '_ensure_started'), self.assertLogs('analytics.ingest', 'WARNING'):
+            self.assertEqual([buffer.put(event) for event in range(3)], [True, True, False])
+        self.assertEqual((buffer.stats()['dropped'], buffer.stats()['queued']), (1, 2))
+
+    def test_failures_are_counted_per_step(self):
+        buffer = RecordingBuffer()
+        with mock.patch.object(buffer, 'save', side_effect=DatabaseError), self.assertLogs('analytics.ingest'):
+            buffer._write([1, 2])
+        with mock.patch('analytics.ingest.live_visitors') as live, self.assertLogs('analytics.ingest'):
+            live.add.side_effect = ConnectionError
+            buffer._write([3])
+        stats = buffer.stats()
+        # The live counter failing does not make a stored batch "failed"
+        self.assertEqual((stats['failed'], stats['written'], stats['batches']), (2, 1, 1))
+
+
+class PayloadCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_stale_entry_is_served_while_one_refresh_runs(self):
+        payloads = PayloadCache(ttl=0, stale_ttl=300)
+        self.assertEqual((payloads.ttl, PayloadCache().ttl), (0, 60))
+        self.assertEqual(payloads.get('report', lambda: 'first'), 'first')
+
+        release = threading.Event()
+        builds = []
+
+        def slow():
+            builds.append(1)
+            release.wait(5)
+            return 'second'
+
+        # Stale at once (ttl=0): served as is, refreshed in the background
+        self.assertEqual(payloads.get('report', slow), 'first')
+        self.assertEqual(payloads.get('report', slow), 'first')
+        release.set()
+        for _ in range(100):
+            if cache.get(payloads._key('report'))[1] == 'second':
+                break
+            time_module.sleep(0.01)
+        self.assertEqual(payloads.get('report', lambda: 'third'), 'second')
+        self.assertEqual(len(builds), 1)
+
+    def test_concurrent_misses_build_once(self):
+        payloads = PayloadCache()
+        builds = []
+
+        def slow():
+            builds.append(1)
+            time_module.sleep(0.1)
+            return {'views': len(builds)}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(payloads.get('report', slow))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(results, [{'views': 1}] * 5)
+
+    def test_waits_for_another_worker_holding_the_lock(self):
+        payloads = PayloadCache()
+        payloads.WAIT_INTERVAL = 0.01
+        key = payloads._key('report')
+        cache.add(f'{key}:lock', 1)
+        threading.Timer(0.05, lambda: cache.set(key, (time_module.time(), 'theirs'))).start()
+        self.assertEqual(payloads.get('report', lambda: 'ours'), 'theirs')
+
+
+class MiddlewareTitleRefreshTests(TestCase):
+    def _respond(self, request, status=200):
+        request.user = AnonymousUser()
+        middleware = AnalyticsMiddleware(lambda request: HttpResponse(status=status))
+        with mock.patch.object(blog_titles, 'refresh') as refresh, \
+                mock.patch.object(blog_titles, 'is_stale', return_value=True), \
+                mock.patch('analytics.middleware.page_view_buffer') as buffer:
+            middleware(request)
+        return refresh.called, buffer.put.called
+
+    def test_untracked_requests_do_not_reload_titles(self):
+        factory = RequestFactory(HTTP_USER_AGENT='Mozilla/5.0')
+        for request, status in (
+            (factory.post('/blog/some-post/'), 200),
+            (factory.get('/blog/missing/'), 404),
+            (RequestFactory(HTTP_USER_AGENT='Googlebot/2.1').get('/blog/some-post/'), 200),
+        ):
+            self.assertEqual(self._respond(request, status), (False, False), request)
+
+    def test_tracked_blog_request_reloads_stale_titles(self):
+        request = RequestFactory(HTTP_USER_AGENT='Mozilla/5.0').get('/blog/some-post/')
+        self.assertEqual(self._respond(request), (True, True))
+
+
+class AsyncMiddlewareTests(TestCase):
+    async def test_page_view_is_built_off_the_event_loop(self):
+        loops = []
+
+        def locate(ip_address):
+            try:
+                loops.append(asyncio.get_running_loop())
+            except RuntimeError:
+                loops.append(None)
+            return {'country': 'Nigeria', 'region': 'Lagos', 'city': 'Lagos'}
+
+        with mock.patch('analytics.middleware.get_geoip_backend') as geoip, \
+                mock.patch('analytics.middleware.page_view_buffer') as buffer, \
+                mock.patch('analytics.middleware.get_dedup_backend') as dedup:
+            geoip.return_value.locate.side_effect = locate
+            dedup.return_value.aseen_recently = mock.AsyncMock(return_value=False)
+            response = await self.async_client.get(
+                '/about/', headers={'User-Agent': 'Mozilla/5.0', 'X-Forwarded-For': '41.58.1.1'},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(loops, [None])
+        event = buffer.put.call_args.args[0]
+        self.assertEqual((event['page_url'], event['page_title'], event['country']), ('/about/', 'About Us', 'Nigeria'))
+
+
+class BeaconPathTests(TestCase):
+    def test_only_known_pages_are_queued(self):
+        request = RequestFactory(HTTP_USER_AGENT='Mozilla/5.0').post('/analytics/beacon/')
+        request.user = AnonymousUser()
+        paths = ['/about/', '/blog/known-post/', '/blog/known-post', '/blog/made-up-1/',
+                 '/blog/known-post/extra/', '/anything/', '/admin/']
+        now = timezone.now()
+        with mock.patch.object(blog_titles, 'is_stale', return_value=False), \
+                mock.patch.object(blog_titles, '_posts', {'known-post': 'Known Post'}), \
+                mock.patch('analytics.beacon.page_view_buffer') as views, \
+                mock.patch('analytics.beacon.vitals_buffer') as vitals, \
+                self.settings(ANALYTICS_BEACON=True):
+            record_beacon(
+                request,
+                [{'path': path, 'referrer': '', 'timestamp': now} for path in paths],
+                [{'path': path, 'name': 'LCP', 'value': 1200} for path in paths],
+            )
+        self.assertEqual([c.args[0]['page_url'] for c in views.put.call_args_list], ['/about/', '/blog/known-post/'])
+        self.assertEqual([c.args[0]['page_url'] for c in vitals.put.call_args_list], ['/about/', '/blog/known-post/'])
+
+
+class RollupGraceCheckTests(SimpleTestCase):
+    def test_grace_must_cover_event_age_and_flush(self):
+        self.assertEqual(rollup_grace_check(None), [])
+        with self.settings(ANALYTICS_ROLLUP_GRACE=MAX_EVENT_AGE, ANALYTICS_BUFFER_FLUSH_INTERVAL=2.0):
+            self.assertEqual([error.id for error in rollup_grace_check(None)], ['analytics.E001'])
+
+
+def page_view(page_url='/', timestamp=None, ip_address='41.58.1.1', **extra):
+    """A raw page-view event as the ingest buffer receives it."""
+    timestamp = timestamp or timezone.now()
+    return {
+        'page_url': page_url, 'page_title': page_url, 'traffic_source': 'direct',
+        'referrer': None, 'referrer_domain': None, 'ip_address': ip_address,
+        'user_agent': 'Mozilla/5.0', 'country': 'Nigeria', 'region': 'Lagos', 'city': 'Lagos',
+        'timestamp': timestamp, 'date': timezone.localdate(timestamp), **extra,
+    }
+
+
+def record(events):
+    """Write raw events as PageViews. The id caches may remember rows an earlier test rolled back."""
+    for cache in (pages, user_agents, referrer_domains, locations):
+        cache.clear()
+    PageView.objects.bulk_create(encode_page_views(events))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'PageView is partitioned on PostgreSQL only')
+class PartitionTests(TestCase):
+    def test_create_partition_moves_rows_out_of_default(self):
+        month = add_months(month_start(timezone.localdate()), 24)
+        when = timezone.make_aware(datetime.combine(month.replace(day=10), time(12)))
+        record([page_view('/about/', when), page_view('/', when)])
+
+        with connection.cursor() as cursor:
+            self.assertNotIn(month, dict(list_partitions(cursor)))
+            name = create_partition(cursor, month)
+            self.assertIn(month, dict(list_partitions(cursor)))
+            cursor.execute(f'SELECT count(*) FROM "{name}"')
+            self.assertEqual(cursor.fetchone()[0], 2)
+            cursor.execute(f'SELECT count(*) FROM "{DEFAULT_PARTITION}" WHERE date = %s', [when.date()])
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertEqual(PageView.objects.filter(date=month.replace(day=10)).count(), 2)
+
+
+class ArchiveQueryTests(TestCase):
+    def test_archive_rows_match_the_export(self):
+        now = timezone.now()
+        record([
+            page_view('/', now, referrer='https://www.google.com/', referrer_domain='google.com',
+                      traffic_source='search', country='Nigeria', region='Lagos', city='Ikeja'),
+            page_view('/about/', now, ip_address='41.58.2.2'),
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute(archive_query(PageView._meta.db_table))
+            self.assertEqual([column[0] for column in cursor.description], EXPORT_FIELDS)
+            rows = cursor.fetchall()
+        exported = export_queryset(now.date(), now.date()).order_by('id')
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(
+            [(row[0], row[3], row[7], row[10], row[12]) for row in rows],
+            [(row[0], row[3], row[7], row[10], row[12]) for row in exported],
+        )
+
+
+def at(day, hour, minute=0):
+    return timezone.make_aware(datetime.combine(day, time(hour, minute)))
+
+
+class CompactTests(TestCase):
+    days = [date(2026, 3, 9), date(2026, 3, 10), date(2026, 3, 11)]
+
+    def setUp(self):
+        rnd = random.Random(5)
+        sources = [('direct', None), ('search', 'google.com'), ('social', 'facebook.com'), ('referral', 'example.org')]
+        events = []
+        for day in self.days:
+            for hour, minute in ((1, 0), (8, 30), (11, 59), (12, 0), (12, 1), (17, 45), (23, 59)):
+                for _ in range(rnd.randint(1, 6)):
+                    source, domain = rnd.choice(sources)
+                    events.append(page_view(
+                        rnd.choice(['/', '/about/', '/blog/', '/blog/some-post/']), at(day, hour, minute),
+                        ip_address=f'41.58.{rnd.randint(0, 3)}.{rnd.randint(1, 20)}',
+                        traffic_source=source, referrer_domain=domain,
+                    ))
+        record(events)
+
+    def _report(self, period):
+        def ordered(rows):
+            return sorted(tuple(row.values()) for row in rows)
+        return {
+            'total': AnalyticsService._total_views(period),
+            'blog_total': AnalyticsService._total_views(period, page_url__startswith='/blog/'),
+            'top_pages': ordered(AnalyticsService.get_top_pages(period)),
+            'sources': ordered(AnalyticsService._traffic_sources(period)),
+            'referrers': ordered(AnalyticsService.get_top_referrers(period, limit=10)),
+        }
+
+    def test_reports_unchanged_by_compaction(self):
+        first, middle, last = self.days
+        periods = [
+            DateRange(first, last),     # both sides of the watermark
+            DateRange(middle, middle),  # the day the watermark splits
+            DateRange(first, middle),
+            DateRange(middle, last),
+        ]
+        before = {period: self._report(period) for period in periods}
+        self.assertEqual(before[periods[0]]['total'], PageView.objects.count())
+
+        self.assertEqual(compact(until=at(middle, 12)), [first, middle])
+        self.assertEqual(get_watermark(), at(middle, 12))
+        for period in periods:
+            self.assertEqual(self._report(period), before[period], f'watermark mid-day, {period}')
+
+        compact(until=at(last + timedelta(days=1), 0))
+        for period in periods:
+            self.assertEqual(self._report(period), before[period], f'fully compacted, {period}')
+
+
+class RangeChartTests(TestCase):
+    days = [date(2026, 3, 9), date(2026, 3, 10), date(2026, 3, 11), date(2026, 3, 12)]
+
+    def setUp(self):
+        first, second, _, fourth = self.days
+        record([page_view('/', at(first, 10)) for _ in range(3)] + [
+            page_view('/', at(second, 12, 30)), page_view('/about/', at(second, 12, 45)),
+            page_view('/', at(second, 13, 10)), page_view('/', at(fourth, 9)),
+        ])
+
+    def _charts(self):
+        first, second, third, fourth = self.days
+        return (
+            AnalyticsService.get_range_chart(DateRange(first, fourth)),
+            AnalyticsService.get_range_chart(DateRange(second, second)),
+            AnalyticsService.get_range_chart(DateRange(third, fourth), compare=True),
+        )
+
+    def test_series_spans_the_watermark_and_zero_fills(self):
+        before = self._charts()
+        # Mid-hour of the second day: rollups before, raw rows after
+        compact(until=at(self.days[1], 13))
+        self.assertEqual(self._charts(), before)
+
+        daily, hourly, compared = before
+        self.assertEqual(
+            [(point['label'], point['value']) for point in daily],
+            [('Mar 09', 3), ('Mar 10', 3), ('Mar 11', 0), ('Mar 12', 1)],
+        )
+        self.assertEqual(len(hourly), 24)
+        self.assertEqual({i: point['value'] for i, point in enumerate(hourly) if point['value']}, {12: 2, 13: 1})
+        # Two days chart by hour; 'previous' is the two days before
+        self.assertEqual(len(compared), 48)
+        self.assertEqual(compared[9]['label'], 'Wed 9am')
+        self.assertEqual(sum(point['value'] for point in compared), 1)
+        self.assertEqual([compared[i]['previous'] for i in (10, 36, 37)], [3, 2, 1])
+
+    def test_dashboard_reads_the_watermark_once(self):
+        compact(until=at(self.days[1], 13))
+        table = AnalyticsWatermark._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            data = AnalyticsService.get_traffic_data(DateRange(self.days[0], self.days[3]), compare=True)
+        self.assertEqual(sum(table in query['sql'] for query in queries.captured_queries), 1)
+        self.assertEqual(data['total_views'], 7)
+        self.assertEqual(data['comparison']['total_views'], 0)
+
+
+class PeriodParamsTests(SimpleTestCase):
+    def test_ranges_and_presets(self):
+        self.assertEqual(
+            period_from_params({'start': '2026-03-01', 'end': '2026-03-10'}),
+            DateRange(date(2026, 3, 1), date(2026, 3, 10)),
+        )
+        single = DateRange(date(2026, 3, 5), date(2026, 3, 5))
+        self.assertEqual(period_from_params({'start': '2026-03-05'}), single)
+        self.assertEqual(period_from_params({'end': '2026-03-05'}), single)
+        self.assertEqual(period_from_params({'period': 'month'}), 'month')
+        self.assertEqual(period_from_params({'period': 'decade'}), 'week')
+        for params in (
+            {'start': '2026-03-10', 'end': '2026-03-01'},
+            {'start': 'yesterday'},
+            {'start': '2026-02-30'},
+            {'start': '2020-01-01', 'end': '2026-01-01'},
+        ):
+            with self.assertRaises(ValueError, msg=params):
+                period_from_params(params)
+
+    def test_granularity_and_previous_period(self):
+        start = date(2026, 1, 1)
+        granularity = {
+            days: DateRange(start, start + timedelta(days=days - 1)).granularity
+            for days in (1, 2, 3, 62, 63, 182, 183, MAX_RANGE_DAYS)
+        }
+        self.assertEqual(granularity, {
+            1: 'hour', 2: 'hour', 3: 'day', 62: 'day', 63: 'week', 182: 'week', 183: 'month', MAX_RANGE_DAYS: 'month',
+        })
+        self.assertEqual(
+            DateRange(date(2026, 3, 10), date(2026, 3, 16)).previous(),
+            DateRange(date(2026, 3, 3), date(2026, 3, 9)),
+        )
+
+    def test_presets_end_today(self):
+        with mock.patch('analytics.periods.timezone.localdate', return_value=date(2026, 3, 11)):
+            self.assertEqual(resolve_period('week'), DateRange(date(2026, 3, 9), date(2026, 3, 11)))
+            self.assertEqual(resolve_period('month'), DateRange(date(2026, 3, 1), date(2026, 3, 11)))
+            self.assertEqual(resolve_period('year'), DateRange(date(2026, 1, 1), date(2026, 3, 11)))
+        self.assertIsNone(resolve_period('all'))
+
+
+class ExportTests(TestCase):
+    day = date(2026, 3, 9)
+
+    def setUp(self):
+        record([
+            page_view('/', at(self.day, 9), referrer='https://www.google.com/', referrer_domain='google.com',
+                      traffic_source='search'),
+            page_view('/about/', at(self.day, 10), ip_address='41.58.2.2', country='Ghana', city='Accra'),
+            page_view('/blog/', at(self.day + timedelta(days=1), 8)),
+            page_view('/', at(self.day + timedelta(days=2), 8)),
+        ])
+        self.range = (self.day, self.day + timedelta(days=1))
+
+    def _export(self, fmt, compress=False):
+        return b''.join(stream_export(*self.range, fmt, compress=compress, chunk_size=2))
+
+    def test_ndjson_and_csv(self):
+        rows = [json.loads(line) for line in self._export('ndjson').decode().splitlines()]
+        self.assertEqual([list(row) for row in rows], [EXPORT_FIELDS] * 3)
+        self.assertEqual(
+            [(row['page_url'], row['referrer_domain'], row['country'], row['city']) for row in rows],
+            [('/', 'google.com', 'Nigeria', 'Lagos'), ('/about/', None, 'Ghana', 'Accra'), ('/blog/', None, 'Nigeria', 'Lagos')],
+        )
+
+        table = list(csv.reader(io.StringIO(self._export('csv').decode())))
+        self.assertEqual(table[0], EXPORT_FIELDS)
+        self.assertEqual([row[EXPORT_FIELDS.index('page_url')] for row in table[1:]], ['/', '/about/', '/blog/'])
+
+        with self.assertRaises(ValueError):
+            self._export('xml')
+
+    def test_gzip_matches_plain_output(self):
+        for fmt in FORMATS:
+            self.assertEqual(gzip.decompress(self._export(fmt, compress=True)), self._export(fmt), fmt)
+
+    def test_view_is_staff_only(self):
+        url = reverse('analytics:export_pageviews')
+        params = {'start': '2026-03-09', 'end': '2026-03-10', 'format': 'csv'}
+        self.assertEqual(self.client.get(url, params).status_code, 302)
+        self.client.force_login(User.objects.create_user('reader'))
+        self.assertEqual(self.client.get(url, params).status_code, 302)
+
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('pageviews-2026-03-09-2026-03-10.csv.gz', response['Content-Disposition'])
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self._export('csv'))
+        for bad in ({'start': 'March'}, {'start': '2026-03-10', 'end': '2026-03-09'}, {'format': 'xml'}):
+            self.assertEqual(self.client.get(url, bad).status_code, 400, bad)
+
+    def test_command_writes_the_export(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'views.ndjson')
+            call_command(
+                'export_pageviews', start='2026-03-09', end='2026-03-10', no_gzip=True, chunk_size=2,
+                output=path, stdout=io.StringIO(),
+            )
+            with open(path, 'rb') as fh:
+                self.assertEqual(fh.read(), self._export('ndjson'))
+        with self.assertRaises(CommandError):
+            call_command('export_pageviews', start='2026-03-10', end='2026-03-09', stdout=io.StringIO())
+
+
+class SessionizeTests(TestCase):
+    day = date(2026, 3, 9)
+
+    def _record(self, *views):
+        record([page_view(path, at(self.day, hour, minute), ip_address=ip) for ip, path, hour, minute in views])
+
+    def test_visits_split_on_inactivity_and_resume(self):
+        self._record(
+            ('41.58.1.1', '/', 10, 0),
+            ('41.58.1.1', '/about/', 10, 10),
+            ('41.58.2.2', '/blog/', 10, 5),
+            # 40 minutes idle: a second visit
+            ('41.58.1.1', '/services/', 10, 50),
+        )
+        self.assertEqual(sessionize(until=at(self.day, 11), timeout=1800), [self.day])
+        visits = sorted(Visit.objects.values_list('entry_page', 'exit_page', 'depth', 'duration'))
+        self.assertEqual(visits, [('/', '/about/', 2, 600), ('/blog/', '/blog/', 1, 0), ('/services/', '/services/', 1, 0)])
+
+        # The next run extends the visit still open at the watermark
+        self._record(('41.58.1.1', '/contact/', 11, 10))
+        sessionize(until=at(self.day, 12), timeout=1800)
+        self.assertEqual(Visit.objects.count(), 3)
+        self.assertEqual(
+            Visit.objects.values_list('entry_page', 'exit_page', 'depth', 'duration').get(entry_page='/services/'),
+            ('/services/', '/contact/', 2, 1200),
+        )
+        stat = DailyVisitStat.objects.get(date=self.day)
+        self.assertEqual((stat.visits, stat.bounces, stat.pageviews, stat.duration), (3, 1, 5, 1800))
+
+
+class DimensionBackfillMigrationTests(TransactionTestCase):
+    before = [('analytics', '0007_dimensions')]
+    after = [('analytics', '0008_backfill_dimensions')]
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        self._migrate(executor.loader.graph.leaf_nodes())
+
+    def test_string_columns_become_lookup_ids(self):
+        apps = self._migrate(self.before)
+        OldPageView = apps.get_model('analytics', 'PageView')
+        now = timezone.now()
+        OldPageView.objects.bulk_create([
+            OldPageView(page_url='/', page_title='Homepage', ip_address='41.58.1.1', user_agent='Mozilla/5.0',
+                        referrer_domain='google.com', traffic_source='search',
+                        country='Nigeria', region='Lagos', city='Lagos', date=now.date(), timestamp=now),
+            OldPageView(page_url='/', page_title='Homepage', ip_address='41.58.1.2', user_agent='Mozilla/5.0',
+                        referrer_domain=None, country=None, region=None, city=None,
+                        date=now.date(), timestamp=now),
+            OldPageView(page_url='/about/', page_title='About Us', ip_address='41.58.1.3', user_agent='x' * 600,
+                        referrer_domain='', country='Ghana', region='', city='Accra',
+                        date=now.date(), timestamp=now),
+        ])
+
+        apps = self._migrate(self.after)
+        PageViewAfter = apps.get_model('analytics', 'PageView')
+        self.assertFalse(PageViewAfter.objects.filter(page__isnull=True).exists())
+        self.assertEqual(apps.get_model('analytics', 'Page').objects.count(), 2)
+        self.assertEqual(apps.get_model('analytics', 'UserAgent').objects.count(), 2)
+        rows = sorted(PageViewAfter.objects.values_list(
+            'ip_address', 'page__url', 'page__title', 'agent__value', 'domain__name',
+            'location__country', 'location__region', 'location__city',
+        ))
+        self.assertEqual(rows, [
+            ('41.58.1.1', '/', 'Homepage', 'Mozilla/5.0', 'google.com', 'Nigeria', 'Lagos', 'Lagos'),
+            ('41.58.1.2', '/', 'Homepage', 'Mozilla/5.0', None, '', '', ''),
+            ('41.58.1.3', '/about/', 'About Us', 'x' * 500, None, 'Ghana', '', 'Accra'),
+        ])
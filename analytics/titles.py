@@ -0,0 +1,87 @@
+# analytics/titles.py
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+
+class BlogTitleCache:
+    """
+    Per-process map of /blog/<slug>/ slugs to the title recorded for the
+    page: the post's real title, or "Category: <name>" for a category page
+    (categories win, as in posts_by_category_or_post). ``lookup`` is a plain
+    dict read; the map is (re)built from the database by ``refresh`` when it
+    is older than ``ttl``. Local saves/deletes update it immediately (see
+    analytics/signals.py); other workers catch up on their next refresh.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'ANALYTICS_BLOG_TITLE_TTL', 300)
+        self._posts = {}
+        self._categories = {}
+        # pk -> slug, so a renamed slug can be dropped on save
+        self._post_slugs = {}
+        self._category_slugs = {}
+        self._expires = 0
+        self._lock = threading.Lock()
+
+    def is_stale(self):
+        return self._expires <= time.monotonic()
+
+    def refresh(self):
+        from blog.models import Category, Post
+
+        posts, titles = {}, {}
+        for pk, slug, title in Post.objects.published().values_list('pk', 'slug', 'title'):
+            posts[pk], titles[slug] = slug, title
+        categories, names = {}, {}
+        for pk, slug, name in Category.objects.values_list('pk', 'slug', 'name'):
+            categories[pk], names[slug] = slug, name
+        with self._lock:
+            self._post_slugs, self._posts = posts, titles
+            self._category_slugs, self._categories = categories, names
+            self._expires = time.monotonic() + self.ttl
+
+    def refresh_if_stale(self):
+        if self.is_stale():
+            self.refresh()
+
+    async def arefresh_if_stale(self):
+        if self.is_stale():
+            await sync_to_async(self.refresh)()
+
+    def lookup(self, slug):
+        """Title for ``slug``, or None when no published post or category has it."""
+        name = self._categories.get(slug)
+        if name is not None:
+            return f'Category: {name}'
+        return self._posts.get(slug)
+
+    def post_changed(self, post, deleted=False):
+        published = not deleted and post.status == 'published' and not post.is_trashed
+        with self._lock:
+            old_slug = self._post_slugs.pop(post.pk, None)
+            if old_slug is not None:
+                self._posts.pop(old_slug, None)
+            if published:
+                self._post_slugs[post.pk] = post.slug
+                self._posts[post.slug] = post.title
+
+    def category_changed(self, category, deleted=False):
+        with self._lock:
+            old_slug = self._category_slugs.pop(category.pk, None)
+            if old_slug is not None:
+                self._categories.pop(old_slug, None)
+            if not deleted:
+                self._category_slugs[category.pk] = category.slug
+                self._categories[category.slug] = category.name
+
+    def clear(self):
+        with self._lock:
+            self._posts, self._categories = {}, {}
+            self._post_slugs, self._category_slugs = {}, {}
+            self._expires = 0
+
+
+blog_titles = BlogTitleCache()
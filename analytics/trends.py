@@ -0,0 +1,187 @@
+# analytics/trends.py
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import DailyLocationStat, DailyPageStat, PageView, pageview_values
+from .rollups import get_watermark
+
+# Dimension -> (rollup table, its column, PageView column) for series loading
+DIMENSIONS = {
+    'page': (DailyPageStat, 'page_url', 'page_url'),
+    'source': (DailyPageStat, 'traffic_source', 'traffic_source'),
+    'country': (DailyLocationStat, 'country', 'country'),
+}
+
+# Buckets per season: week-over-week compares the last SEASON buckets with
+# the SEASON before them
+SEASON = {'day': 7, 'hour': 24 * 7}
+
+
+def load_series(dimension, granularity='day', buckets=None):
+    """
+    (keys, starts, matrix) for every value of ``dimension`` seen in the
+    last ``buckets`` complete days (from the rollup tables) or hours (from
+    raw PageViews): ``matrix[i, t]`` is the views of ``keys[i]`` in the
+    bucket starting at ``starts[t]``, zero-filled. One grouped query.
+    """
+    stat_model, column, raw_column = DIMENSIONS[dimension]
+    if granularity == 'day':
+        buckets = buckets or 56
+        watermark = get_watermark()
+        if watermark is None:
+            return [], [], np.zeros((0, buckets))
+        # Only days the rollups cover completely; today would read as a drop
+        last = timezone.localtime(watermark).date() - timedelta(days=1)
+        starts = [last - timedelta(days=i) for i in range(buckets - 1, -1, -1)]
+        rows = (
+            (row[column], row['date'], row['views'])
+            for row in stat_model.objects
+            .filter(date__range=(starts[0], last))
+            .values(column, 'date')
+            .annotate(views=Sum('views'))
+            .order_by()
+        )
+    elif granularity == 'hour':
+        buckets = buckets or 24 * 14
+        end = timezone.localtime().replace(minute=0, second=0, microsecond=0)
+        starts = [end - timedelta(hours=i) for i in range(buckets, 0, -1)]
+        raw = PageView.objects.filter(timestamp__gte=starts[0], timestamp__lt=end)
+        rows = (
+            (row[raw_column], timezone.localtime(row['bucket']), row['views'])
+            for row in pageview_values(raw.annotate(bucket=TruncHour('timestamp')), raw_column, 'bucket')
+            .annotate(views=Count('id'))
+            .order_by()
+        )
+    else:
+        raise ValueError(f'Unknown granularity {granularity!r}')
+
+    index = {start: t for t, start in enumerate(starts)}
+    keys, key_index, cells = [], {}, []
+    for key, start, views in rows:
+        if start not in index:
+            continue
+        key = key or ''
+        if key not in key_index:
+            key_index[key] = len(keys)
+            keys.append(key)
+        cells.append((key_index[key], index[start], views))
+
+    matrix = np.zeros((len(keys), len(starts)))
+    if cells:
+        rows_, cols, values = np.array(cells, dtype=np.int64).T
+        np.add.at(matrix, (rows_, cols), values)
+    return keys, starts, matrix
+
+
+def _running_totals(matrix):
+    """Row-wise cumulative sums with a leading zero column."""
+    totals = np.zeros((matrix.shape[0], matrix.shape[1] + 1))
+    np.cumsum(matrix, axis=1, out=totals[:, 1:])
+    return totals
+
+
+def moving_average(matrix, window):
+    """Trailing mean over ``window`` buckets per row; NaN until the window fills."""
+    result = np.full(matrix.shape, np.nan)
+    if matrix.shape[1] >= window:
+        totals = _running_totals(matrix)
+        result[:, window - 1:] = (totals[:, window:] - totals[:, :-window]) / window
+    return result
+
+
+def rolling_zscores(matrix, window):
+    """
+    z-score of each bucket against the ``window`` buckets before it. The
+    deviation is floored at sqrt(mean) (Poisson noise) and 1 so a quiet
+    series does not flag a spike for every stray view. NaN until the
+    baseline fills.
+    """
+    z = np.full(matrix.shape, np.nan)
+    if matrix.shape[1] <= window:
+        return z
+    # Window sums from running totals of x and x², so the cost does not
+    # grow with the window
+    sums = _running_totals(matrix)
+    squares = _running_totals(matrix * matrix)
+    mean = (sums[:, window:-1] - sums[:, :-window - 1]) / window
+    variance = (squares[:, window:-1] - squares[:, :-window - 1]) / window - mean ** 2
+    std = np.maximum(np.sqrt(np.maximum(variance, 0)), np.maximum(np.sqrt(mean), 1.0))
+    z[:, window:] = (matrix[:, window:] - mean) / std
+    return z
+
+
+def analyze(matrix, season=7, ma_window=7, z_window=28, threshold=3.0):
+    """
+    Per-series statistics in one vectorized pass over a (series x buckets)
+    matrix: last-season total and the season before it, their % change
+    (NaN when the previous season was empty), the moving average, rolling
+    z-scores, and a boolean mask of spikes (z > threshold).
+    """
+    current = matrix[:, -season:].sum(axis=1)
+    previous = matrix[:, -2 * season:-season].sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = np.where(previous > 0, (current - previous) * 100 / previous, np.nan)
+    z = rolling_zscores(matrix, z_window)
+    return {
+        'current': current,
+        'previous': previous,
+        'change': change,
+        'moving_average': moving_average(matrix, ma_window),
+        'zscores': z,
+        'spikes': np.nan_to_num(z, nan=0.0) > threshold,
+    }
+
+
+def _label(start, granularity):
+    return start.strftime('%b %d %H:00' if granularity == 'hour' else '%b %d')
+
+
+def trend_summary(dimension, granularity='day', limit=5, min_views=20):
+    """
+    Top risers, top fallers (week over week, among series with at least
+    ``min_views`` in either week) and the latest spike per series, for the
+    traffic dashboard.
+    """
+    keys, starts, matrix = load_series(dimension, granularity)
+    season = SEASON[granularity]
+    if not keys or matrix.shape[1] < 2 * season:
+        return {'risers': [], 'fallers': [], 'spikes': []}
+
+    stats = analyze(matrix, season=season, ma_window=season if granularity == 'day' else 24)
+    eligible = (np.maximum(stats['current'], stats['previous']) >= min_views) & ~np.isnan(stats['change'])
+    candidates = np.flatnonzero(eligible)
+    order = candidates[np.argsort(stats['change'][candidates])]
+
+    def mover(i):
+        return {
+            'key': keys[i],
+            'current': int(stats['current'][i]),
+            'previous': int(stats['previous'][i]),
+            'change': round(float(stats['change'][i]), 1),
+        }
+
+    # Most recent spike per series within the last season
+    recent = stats['spikes'][:, -season:]
+    has_spike = recent.any(axis=1)
+    last_spike = season - 1 - np.argmax(recent[:, ::-1], axis=1)
+    spikes = []
+    for i in np.flatnonzero(has_spike):
+        t = matrix.shape[1] - season + last_spike[i]
+        spikes.append({
+            'key': keys[i],
+            'bucket': _label(starts[t], granularity),
+            'views': int(matrix[i, t]),
+            'expected': round(float(stats['moving_average'][i, t - 1]), 1),
+            'zscore': round(float(stats['zscores'][i, t]), 1),
+        })
+    spikes.sort(key=lambda spike: spike['zscore'], reverse=True)
+
+    return {
+        'risers': [mover(i) for i in order[::-1][:limit] if stats['change'][i] > 0],
+        'fallers': [mover(i) for i in order[:limit] if stats['change'][i] < 0],
+        'spikes': spikes[:limit],
+    }
@@ -10,4 +10,6 @@ urlpatterns = [
     path('traffic-data/', views.traffic_data, name='traffic_data'),
     path('location-data/', views.location_data, name='location_data'),
     path('traffic-sources-detail/', views.traffic_sources_detail, name='traffic_sources_detail'),
+    path('export/', views.export_pageviews, name='export_pageviews'),
+    path('live/', views.live_visitors, name='live_visitors'),
 ]
\ No newline at end of file
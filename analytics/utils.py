@@ -1,6 +1,11 @@
 # analytics/utils.py
-import re
-from urllib.parse import urlparse
+from functools import lru_cache
+
+from django.conf import settings
+
+# Second-level labels under a country code TLD that act as a public suffix
+# (google.co.uk, bing.com.ng, yahoo.co.jp)
+COUNTRY_SECOND_LEVEL = {'co', 'com', 'net', 'org', 'ne', 'or', 'ac', 'gov', 'edu'}
 
 class TrafficSourceDetector:
     SEARCH_ENGINES = [
@@ -13,30 +18,110 @@ class TrafficSourceDetector:
         'instagram.com', 'youtube.com', 'tiktok.com', 'pinterest.com',
         'reddit.com', 'telegram.org', 'whatsapp.com', 'medium.com', 'threads.com'
     ]
-    
+
+    # Referrers from our own site count as direct (internal navigation)
+    INTERNAL_DOMAINS = ['doclumina.org']
+
+    _domain_sources = None
+    _search_names = None
+
+    @classmethod
+    def domain_sources(cls):
+        """
+        {registrable domain: source}, built once from settings
+        (ANALYTICS_SEARCH_ENGINES / _SOCIAL_PLATFORMS / _INTERNAL_DOMAINS)
+        falling back to the lists above.
+        """
+        if cls._domain_sources is None:
+            table = {}
+            for setting, default, source in (
+                ('ANALYTICS_SOCIAL_PLATFORMS', cls.SOCIAL_PLATFORMS, 'social'),
+                ('ANALYTICS_SEARCH_ENGINES', cls.SEARCH_ENGINES, 'search'),
+                ('ANALYTICS_INTERNAL_DOMAINS', cls.INTERNAL_DOMAINS, 'direct'),
+            ):
+                for domain in getattr(settings, setting, default):
+                    table[domain.lower().strip('.')] = source
+            cls._domain_sources = table
+        return cls._domain_sources
+
+    @classmethod
+    def search_names(cls):
+        """
+        Engine names ('google', 'bing', ...) from ANALYTICS_SEARCH_ENGINES,
+        matched under any public suffix, as the substring scan did.
+        """
+        if cls._search_names is None:
+            cls._search_names = frozenset(
+                domain.lower().strip('.').split('.')[0]
+                for domain in getattr(settings, 'ANALYTICS_SEARCH_ENGINES', cls.SEARCH_ENGINES)
+            )
+        return cls._search_names
+
+    @classmethod
+    def classify(cls, referrer):
+        """
+        Return (traffic_source, referrer_domain) for a Referer header.
+        referrer_domain is the host without a leading 'www.', or None for
+        direct traffic.
+        """
+        host = _referrer_host(referrer) if referrer else None
+        if not host:
+            return 'direct', None
+        return _classify_host(host)
+
     @classmethod
     def detect_source(cls, referrer):
-        if not referrer:
-            return 'direct'
-        
-        try:
-            domain = urlparse(referrer).netloc.lower()
-            
-            # Remove www prefix
-            domain = re.sub(r'^www\.', '', domain)
-            
-            # Check if referrer is from same domain (internal navigation)
-            if 'doclumina.org' in domain:
-                return 'direct'
-            
-            if any(search in domain for search in cls.SEARCH_ENGINES):
-                return 'search'
-            elif any(social in domain for social in cls.SOCIAL_PLATFORMS):
-                return 'social'
-            else:
-                return 'referral'
-        except:
-            return 'direct'
+        return cls.classify(referrer)[0]
+
+
+def _referrer_host(referrer):
+    """Lowercased host of an absolute URL, without userinfo, port or 'www.'."""
+    _, sep, rest = referrer.partition('://')
+    if not sep:
+        return None
+    host = rest.split('/', 1)[0].split('?', 1)[0].split('#', 1)[0].rpartition('@')[2]
+    if host.startswith('['):
+        # IPv6 literal
+        host = host[1:].partition(']')[0]
+    else:
+        host = host.partition(':')[0]
+    host = host.lower().rstrip('.')
+    return host[4:] if host.startswith('www.') else host
+
+
+@lru_cache(maxsize=4096)
+def _classify_host(host):
+    # Look up the host and each parent domain: news.google.com, google.com, com
+    sources = TrafficSourceDetector.domain_sources()
+    labels = host.split('.')
+    for i in range(len(labels)):
+        source = sources.get('.'.join(labels[i:]))
+        if source is not None:
+            break
+    else:
+        source = 'search' if _is_search_engine(labels) else 'referral'
+
+    if source == 'direct':
+        return 'direct', None
+    return source, host
+
+
+def _is_search_engine(labels):
+    """
+    True when an engine name is followed only by a public suffix:
+    google.com.ng, news.google.co.uk, yandex.ru; not google.example.com.
+    """
+    names = TrafficSourceDetector.search_names()
+    for i, label in enumerate(labels[:-1]):
+        if label not in names:
+            continue
+        suffix = labels[i + 1:]
+        if len(suffix) == 1 or (
+            len(suffix) == 2 and len(suffix[1]) == 2 and suffix[0] in COUNTRY_SECOND_LEVEL
+        ):
+            return True
+    return False
+
 
 # Page tracking configuration
 TRACKED_PAGES = {
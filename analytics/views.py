@@ -1,61 +1,90 @@
 # analytics/views.py
-from django.http import JsonResponse
-from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_GET
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 from django.shortcuts import render
-from django.db.models import Count
 
-from analytics.models import PageView
+from .beacon import parse_beacon, record_beacon
+from .cache import payload_cache
+from .export import FORMATS, aiter_export, export_filename, stream_export
+from .live import LiveStream, live_visitors as live_visitors_ring
+from .periods import PRESETS, period_from_params
 from .services import AnalyticsService
 
+def _period(request):
+    """(period, compare) from ?period= or ?start=&end=, plus ?compare=1."""
+    return period_from_params(request.GET), request.GET.get('compare') == '1'
+
 @login_required
 @require_GET
 def dashboard_data(request):
-    period = request.GET.get('period', 'week')
-    
-    if period not in ['today', 'week', 'month', 'year']:
-        period = 'week'
-    
-    data = AnalyticsService.get_dashboard_data(period)
+    try:
+        period, compare = _period(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    data = payload_cache.get(
+        f'dashboard:{period}:{int(compare)}',
+        lambda: AnalyticsService.get_dashboard_data(period, compare),
+    )
     return JsonResponse(data)
 
 @login_required
 def traffic_stats(request):
+    vitals_period = request.GET.get('vitals_period', 'month')
+    if vitals_period not in PRESETS:
+        vitals_period = 'month'
 
-    return render(request, 'analytics/traffic_stats.html')
+    vitals = payload_cache.get(
+        f'vitals:{vitals_period}', lambda: AnalyticsService.get_vitals(vitals_period)
+    )
+    trends_granularity = 'hour' if request.GET.get('trends') == 'hour' else 'day'
+    trends = payload_cache.get(
+        f'trends:{trends_granularity}', lambda: AnalyticsService.get_trends(trends_granularity)
+    )
+    return render(request, 'analytics/traffic_stats.html', {
+        'trends': trends,
+        'trends_granularity': trends_granularity,
+        'vitals': vitals,
+        'vitals_period': vitals_period,
+        'vitals_periods': PRESETS,
+    })
 
 @login_required 
 @require_GET
 def traffic_data(request):
 
-    period = request.GET.get('period', 'week')
-    
-    if period not in ['today', 'week', 'month', 'year']:
-        period = 'week'
-    
-    dashboard_data = AnalyticsService.get_dashboard_data(period)
-    blog_data = AnalyticsService.get_blog_analytics(period)
-    chart_data = AnalyticsService.get_chart_data(period)
-    
-    return JsonResponse({
-        **dashboard_data,
-        'blog_analytics': blog_data,
-        'chart_data': chart_data
-    })
+    try:
+        period, compare = _period(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    data = payload_cache.get(
+        f'traffic:{period}:{int(compare)}',
+        lambda: AnalyticsService.get_traffic_data(period, compare),
+    )
+    return JsonResponse(data)
 
 @login_required
 @require_GET
 def location_data(request):
 
     location_type = request.GET.get('type', 'countries')
-    period = request.GET.get('period', 'week')
+    try:
+        period = period_from_params(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
     if location_type not in ['countries', 'regions']:
         location_type = 'countries'
     
-    if period not in ['today', 'week', 'month', 'year']:
-        period = 'week'
-    
     # Get location data from your service
     location_data = AnalyticsService.get_location_data(location_type, period)
     
@@ -68,41 +97,86 @@ def location_data(request):
 def traffic_sources_detail(request):
 
     source_type = request.GET.get('type', 'search')
-    period = request.GET.get('period', 'week')
-    
-    page_views = AnalyticsService._filter_by_period(PageView.objects.all(), period)
-    
-    if source_type == 'direct':
-        # For direct traffic, show page titles instead of domains
-        sources = page_views.filter(traffic_source='direct').values('page_title').annotate(
-            count=Count('id')
-        ).order_by('-count')[:10]
-        
-        return JsonResponse({
-            'sources': [
-                {
-                    'domain': source['page_title'] or 'Homepage',
-                    'count': source['count']
-                } for source in sources
-            ]
+    try:
+        period = period_from_params(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'sources': AnalyticsService.get_source_detail(source_type, period)
+    })
+
+def _parse_day(value, default):
+    if not value:
+        return default
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(value)
+    return day
+
+@login_required
+@user_passes_test(lambda user: user.is_staff)
+@require_GET
+def export_pageviews(request):
+    """Raw page views for ?start=YYYY-MM-DD&end=YYYY-MM-DD (default: last 30 days)."""
+    today = timezone.localdate()
+    try:
+        start = _parse_day(request.GET.get('start'), today - timedelta(days=29))
+        end = _parse_day(request.GET.get('end'), today)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date'}, status=400)
+    if start > end:
+        return JsonResponse({'error': 'start is after end'}, status=400)
+
+    fmt = request.GET.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        return JsonResponse({'error': 'Invalid format'}, status=400)
+    compress = request.GET.get('gzip', '1') != '0'
+
+    parts = stream_export(start, end, fmt, compress)
+    if isinstance(request, ASGIRequest):
+        parts = aiter_export(parts)
+    response = StreamingHttpResponse(
+        parts,
+        content_type='application/gzip' if compress else FORMATS[fmt][0],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{export_filename(start, end, fmt, compress)}"'
+    )
+    return response
+
+@login_required
+@require_GET
+def live_visitors(request):
+    """
+    Live visitor counter (see analytics/live.py).
+    Under ASGI a Server-Sent Events stream; under WSGI a stream would pin a
+    worker for minutes, so EventSource gets a 204 (which stops it
+    reconnecting) and the dashboard polls for the JSON snapshot instead.
+    """
+    if not isinstance(request, ASGIRequest):
+        if 'text/event-stream' in request.headers.get('Accept', ''):
+            return HttpResponse(status=204)
+        response = JsonResponse({
+            **live_visitors_ring.snapshot(),
+            'interval': getattr(settings, 'ANALYTICS_LIVE_INTERVAL', 5),
         })
-    else:
-        # For other sources, filter out null/empty domains
-        sources = page_views.filter(
-            traffic_source=source_type
-        ).exclude(
-            referrer_domain__isnull=True
-        ).exclude(
-            referrer_domain=''
-        ).values('referrer_domain').annotate(
-            count=Count('id')
-        ).order_by('-count')[:10]
-        
-        return JsonResponse({
-            'sources': [
-                {
-                    'domain': source['referrer_domain'],
-                    'count': source['count']
-                } for source in sources
-            ]
-        })
\ No newline at end of file
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    response = StreamingHttpResponse(LiveStream().__aiter__(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@csrf_exempt
+@require_POST
+def beacon(request):
+    """navigator.sendBeacon target: queues the page views and vitals in the body, answers 204."""
+    try:
+        events, vitals = parse_beacon(request.body)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    record_beacon(request, events, vitals)
+    return HttpResponse(status=204)
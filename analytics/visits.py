@@ -0,0 +1,171 @@
+# analytics/visits.py
+import hashlib
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .cache import payload_cache
+from .models import AnalyticsWatermark, DailyVisitStat, PageView, Visit, pageview_lookup
+from .rollups import get_watermark
+
+WATERMARK = 'visits'
+VISIT_TIMEOUT = 1800  # 30 minutes of inactivity ends a visit
+
+
+def visitor_key(ip_address, user_agent):
+    return hashlib.blake2b(
+        f'{ip_address}\0{user_agent}'.encode('utf-8'), digest_size=16
+    ).hexdigest()
+
+
+class Sessionizer:
+    """
+    Folds page views, in timestamp order, into Visits. Only visits that
+    can still be extended are held in memory: ``open`` is ordered by last
+    activity, so once the oldest entry is more than ``timeout`` behind the
+    current view it (and anything like it) is closed and queued for
+    writing.
+    """
+
+    def __init__(self, timeout, batch_size=1000):
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.open = OrderedDict()  # visitor_key -> Visit, least recently active first
+        self.dirty = set()         # ids of Visits extended since they were opened
+        self.to_create = []
+        self.to_update = []
+        self.days = set()
+
+    def resume(self, visits):
+        """Reopen previously written visits that later views may extend."""
+        for visit in visits.order_by('ended_at'):
+            self.open[visit.visitor_key] = visit
+            self.open.move_to_end(visit.visitor_key)
+
+    def add(self, timestamp, ip_address, user_agent, page_url, traffic_source, referrer_domain):
+        self._close_idle(timestamp)
+        key = visitor_key(ip_address, user_agent)
+        visit = self.open.get(key)
+        if visit is not None and timestamp - visit.ended_at <= self.timeout:
+            visit.ended_at = timestamp
+            visit.exit_page = page_url
+            visit.depth += 1
+            visit.duration = int((timestamp - visit.started_at).total_seconds())
+            self.dirty.add(id(visit))
+            self.open.move_to_end(key)
+            return
+
+        if visit is not None:
+            self._close(self.open.pop(key))
+        self.open[key] = Visit(
+            visitor_key=key,
+            date=timezone.localdate(timestamp),
+            started_at=timestamp,
+            ended_at=timestamp,
+            entry_page=page_url,
+            exit_page=page_url,
+            traffic_source=traffic_source,
+            referrer_domain=referrer_domain or '',
+        )
+
+    def _close_idle(self, now):
+        while self.open:
+            key, visit = next(iter(self.open.items()))
+            if now - visit.ended_at <= self.timeout:
+                break
+            del self.open[key]
+            self._close(visit)
+
+    def _close(self, visit):
+        changed = id(visit) in self.dirty
+        self.dirty.discard(id(visit))
+        if visit.pk is None:
+            self.to_create.append(visit)
+        elif changed:
+            self.to_update.append(visit)
+        else:
+            return
+        self.days.add(visit.date)
+        if len(self.to_create) + len(self.to_update) >= self.batch_size:
+            self._write()
+
+    def _write(self):
+        Visit.objects.bulk_create(self.to_create, batch_size=self.batch_size)
+        Visit.objects.bulk_update(
+            self.to_update, ['ended_at', 'exit_page', 'depth', 'duration'],
+            batch_size=self.batch_size,
+        )
+        self.to_create = []
+        self.to_update = []
+
+    def finish(self):
+        """Write everything, including visits still open, which the next run resumes."""
+        for visit in self.open.values():
+            self._close(visit)
+        self.open.clear()
+        self._write()
+        return self.days
+
+
+def rollup_visit_day(day):
+    totals = Visit.objects.filter(date=day).aggregate(
+        visits=Count('id'),
+        bounces=Count('id', filter=Q(depth=1)),
+        pageviews=Sum('depth'),
+        duration=Sum('duration'),
+    )
+    DailyVisitStat.objects.update_or_create(
+        date=day, defaults={name: value or 0 for name, value in totals.items()}
+    )
+
+
+def sessionize(until=None, timeout=None, rebuild=False, batch_size=1000):
+    """
+    Group page views recorded since the 'visits' watermark (and before
+    ``until``, default now minus ANALYTICS_ROLLUP_GRACE) into Visits, then
+    refresh DailyVisitStat for every day a visit was written to. Returns
+    the days refreshed.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'ANALYTICS_VISIT_TIMEOUT', VISIT_TIMEOUT)
+    timeout = timedelta(seconds=timeout)
+    if until is None:
+        grace = getattr(settings, 'ANALYTICS_ROLLUP_GRACE', 600)
+        until = timezone.now() - timedelta(seconds=grace)
+
+    start = None if rebuild else get_watermark(WATERMARK)
+    if start is not None and until <= start:
+        return []
+
+    rows = PageView.objects.filter(timestamp__lt=until)
+    if start is not None:
+        rows = rows.filter(timestamp__gte=start)
+    rows = rows.order_by('timestamp').values_list(*map(pageview_lookup, (
+        'timestamp', 'ip_address', 'user_agent', 'page_url', 'traffic_source', 'referrer_domain'
+    )))
+
+    sessionizer = Sessionizer(timeout, batch_size)
+    with transaction.atomic():
+        if rebuild:
+            Visit.objects.all().delete()
+            DailyVisitStat.objects.all().delete()
+        elif start is not None:
+            sessionizer.resume(Visit.objects.filter(ended_at__gte=start - timeout))
+
+        for row in rows.iterator(chunk_size=batch_size):
+            sessionizer.add(*row)
+        days = sorted(sessionizer.finish())
+
+        for day in days:
+            rollup_visit_day(day)
+        AnalyticsWatermark.objects.update_or_create(
+            name=WATERMARK, defaults={'position': until}
+        )
+
+    if days:
+        payload_cache.invalidate()
+    return days
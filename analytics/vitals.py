@@ -0,0 +1,147 @@
+# analytics/vitals.py
+import math
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .ingest import PageViewBuffer
+from .models import DailyVitalStat
+
+# Largest value accepted per metric; LCP/INP/TTFB are milliseconds, CLS is
+# unitless and stored x1000 so every metric shares the integer buckets
+METRIC_LIMITS = {'LCP': 120000, 'INP': 60000, 'TTFB': 60000, 'CLS': 10}
+SCALE = {'CLS': 1000}
+
+# p75 at or below the first value is "good", above the second "poor"
+# (web.dev thresholds)
+THRESHOLDS = {'LCP': (2500, 4000), 'INP': (200, 500), 'CLS': (0.1, 0.25), 'TTFB': (800, 1800)}
+
+# Log-spaced buckets: 0 holds values below 1, bucket i holds
+# [RATIO**(i-1), RATIO**i). With RATIO 1.1 a percentile read back from the
+# histogram is within ~5% of the exact sample percentile.
+RATIO = 1.1
+MAX_BUCKET = math.ceil(math.log(120000) / math.log(RATIO)) + 1
+
+
+def bucket_for(metric, value):
+    scaled = value * SCALE.get(metric, 1)
+    if scaled < 1:
+        return 0
+    return min(int(math.log(scaled) / math.log(RATIO)) + 1, MAX_BUCKET)
+
+
+def bucket_value(metric, bucket):
+    """Representative (geometric middle) value of a bucket, in the metric's unit."""
+    if bucket == 0:
+        return 0
+    return RATIO ** (bucket - 0.5) / SCALE.get(metric, 1)
+
+
+def percentiles(metric, histogram, quantiles=(50, 75, 95)):
+    """
+    {q: value} read from a {bucket: count} histogram, plus 'samples'.
+    Values are rounded to ms (3 decimals for CLS); None when empty.
+    """
+    total = sum(histogram.values())
+    result = {'samples': total}
+    digits = 3 if metric == 'CLS' else 0
+    buckets = sorted(histogram.items())
+    for q in quantiles:
+        if not total:
+            result[f'p{q}'] = None
+            continue
+        rank = math.ceil(total * q / 100)
+        seen = 0
+        for bucket, count in buckets:
+            seen += count
+            if seen >= rank:
+                value = round(bucket_value(metric, bucket), digits)
+                result[f'p{q}'] = int(value) if digits == 0 else value
+                break
+    return result
+
+
+class VitalsBuffer(PageViewBuffer):
+    """
+    Queues {'page_url', 'metric', 'value', 'date'} samples and folds each
+    flushed batch into DailyVitalStat counts: one increment per distinct
+    (date, page, metric, bucket) instead of one row per sample.
+    """
+    label = 'web vitals samples'
+    thread_name = 'analytics-vitals-flusher'
+
+    # Rows per INSERT statement, well inside every backend's parameter limit
+    UPSERT_ROWS = 1000
+
+    def after_save(self, batch):
+        # Samples are not page views: the live counter only counts the latter
+        pass
+
+    def save(self, batch):
+        counts = Counter(
+            (s['date'], s['page_url'], s['metric'], bucket_for(s['metric'], s['value']))
+            for s in batch
+        )
+        # One INSERT ... ON CONFLICT adding to the stored count per chunk;
+        # bulk_create(update_conflicts=True) can only overwrite it. Sorted,
+        # so workers flushing the same buckets lock them in the same order.
+        rows = sorted(key + (n,) for key, n in counts.items())
+        quote = connection.ops.quote_name
+        table = quote(DailyVitalStat._meta.db_table)
+        unique = ', '.join(quote(name) for name in ('date', 'page_url', 'metric', 'bucket'))
+        count = quote('count')
+        with transaction.atomic(), connection.cursor() as cursor:
+            for start in range(0, len(rows), self.UPSERT_ROWS):
+                chunk = rows[start:start + self.UPSERT_ROWS]
+                cursor.execute(
+                    f'INSERT INTO {table} ({unique}, {count}) VALUES {", ".join(["(%s, %s, %s, %s, %s)"] * len(chunk))} '
+                    f'ON CONFLICT ({unique}) '
+                    f'DO UPDATE SET {count} = {table}.{count} + EXCLUDED.{count}',
+                    [value for row in chunk for value in row],
+                )
+
+
+vitals_buffer = VitalsBuffer(
+    max_size=getattr(settings, 'ANALYTICS_BUFFER_MAX_SIZE', 10000),
+    batch_size=getattr(settings, 'ANALYTICS_BUFFER_BATCH_SIZE', 500),
+    flush_interval=getattr(settings, 'ANALYTICS_VITALS_FLUSH_INTERVAL', 10.0),
+)
+
+
+def vitals_sample(page_url, metric, value):
+    return {'page_url': page_url, 'metric': metric, 'value': value, 'date': timezone.localdate()}
+
+
+def rating(metric, p75):
+    if p75 is None:
+        return ''
+    good, poor = THRESHOLDS[metric]
+    return 'good' if p75 <= good else 'poor' if p75 > poor else 'needs-improvement'
+
+
+def page_vitals(queryset, limit=20):
+    """
+    [{'page_url', 'samples', 'metrics': {metric: {p50, p75, p95, samples, rating}}}]
+    for the pages with the most LCP samples in ``queryset`` (DailyVitalStat).
+    """
+    histograms = {}
+    rows = queryset.values('page_url', 'metric', 'bucket').annotate(n=Sum('count')).order_by()
+    for row in rows:
+        histograms.setdefault(row['page_url'], {}).setdefault(row['metric'], Counter())[row['bucket']] += row['n']
+
+    pages = []
+    for page_url, metrics in histograms.items():
+        summary = {}
+        for metric, _ in DailyVitalStat.METRICS:
+            summary[metric] = percentiles(metric, metrics.get(metric, {}))
+            summary[metric]['rating'] = rating(metric, summary[metric]['p75'])
+        pages.append({
+            'page_url': page_url,
+            'samples': summary['LCP']['samples'],
+            'metrics': summary,
+        })
+    pages.sort(key=lambda page: page['samples'], reverse=True)
+    return pages[:limit]
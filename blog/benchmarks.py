@@ -0,0 +1,141 @@
+# blog/benchmarks.py
+# Benchmarks for the public blog, run with `manage.py benchmark_blog <name>`.
+# They read (and with --seed, write) the configured database, so point
+# them at a scratch copy.
+import random
+import time
+from datetime import timedelta
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils import timezone
+
+from analytics.benchmarks import measure
+
+from .models import Post
+from .pagination import ORDERING, encode_cursor, keyset_page
+from .related import compute_related
+from .search import post_search_vector, search_posts, with_headlines
+from .text import text_fields
+
+TOPICS = [
+    'germany', 'approbation', 'licensing', 'visa', 'language', 'exam', 'hospital',
+    'residency', 'doctor', 'nurse', 'migration', 'salary', 'insurance', 'housing',
+    'fachsprachprüfung', 'kenntnisprüfung', 'berufserlaubnis', 'documents', 'embassy',
+]
+QUERIES = ['germany', 'approbation visa', 'kenntnisprüfung exam', '"language exam"', 'salary -nurse']
+
+
+def seed_posts(rows, words=600, batch_size=1000, seed=0):
+    """Insert ``rows`` synthetic published posts of about ``words`` words of HTML."""
+    rnd = random.Random(seed)
+    vocabulary = TOPICS + [f'word{i}' for i in range(5000)]
+    now = timezone.now()
+    prefix = f'bench-{rnd.randint(0, 10 ** 9)}'
+    created = 0
+    while created < rows:
+        batch = []
+        for i in range(created, min(created + batch_size, rows)):
+            paragraphs = [
+                '<p>' + ' '.join(rnd.choice(vocabulary) for _ in range(60)) + '</p>'
+                for _ in range(words // 60)
+            ]
+            title = ' '.join(rnd.choice(vocabulary) for _ in range(6)).title()
+            excerpt = ' '.join(rnd.choice(vocabulary) for _ in range(25))
+            content = '\n'.join(paragraphs)
+            batch.append(Post(
+                title=title,
+                slug=f'{prefix}-{i}',
+                excerpt=excerpt,
+                content=content,
+                status='published',
+                published_date=now - timedelta(minutes=i),
+                search_vector=post_search_vector(title, excerpt, content),
+                **text_fields(content),
+            ))
+        Post.objects.bulk_create(batch, batch_size=batch_size)
+        created += len(batch)
+    return created
+
+
+def legacy_search(query):
+    """The icontains search blog.views.search replaced: count plus first page."""
+    posts = Post.objects.filter(
+        Q(title__icontains=query) | Q(content__icontains=query) | Q(excerpt__icontains=query),
+        status='published', is_trashed=False,
+    ).order_by('-published_date')
+    return posts.count(), list(posts[:12])
+
+
+def fulltext_search(query):
+    posts = search_posts(Post.objects.filter(status='published', is_trashed=False), query)
+    return posts.count(), list(with_headlines(posts, query)[:12])
+
+
+def bench_search(out, repeat=5):
+    out.write(f"Post rows: {Post.objects.count()}")
+    out.write(f"{'query':<24} {'icontains':>9} {'ms':>8} {'fts':>7} {'ms':>8}")
+    for query in QUERIES:
+        # icontains has no syntax: it looks for the literal text
+        legacy_count = legacy_search(query)[0]
+        _, legacy_ms = measure(lambda: legacy_search(query), repeat)
+        count = fulltext_search(query)[0]
+        _, fts_ms = measure(lambda: fulltext_search(query), repeat)
+        out.write(f"{query:<24} {legacy_count:>9} {legacy_ms:>8.1f} {count:>7} {fts_ms:>8.1f}")
+
+
+def offset_page(page):
+    """The Paginator listing load_more replaced: COUNT plus an OFFSET scan."""
+    posts = Post.objects.filter(status='published', is_trashed=False).cards().order_by('-published_date')
+    return list(Paginator(posts, 4).get_page(page))
+
+
+def cursor_at(page):
+    """The load_more cursor for the start of ``page`` (not timed)."""
+    posts = Post.objects.filter(status='published', is_trashed=False).order_by(*ORDERING)
+    return encode_cursor(posts[(page - 1) * 4 - 1]) if page > 1 else None
+
+
+def bench_pagination(out, repeat=5):
+    total = Post.objects.filter(status='published', is_trashed=False).count()
+    out.write(f"Published posts: {total}")
+    out.write(f"{'page':>7} {'offset q':>9} {'ms':>8} {'keyset q':>9} {'ms':>8}")
+    posts = Post.objects.filter(status='published', is_trashed=False).cards()
+    for page in (1, 10, 100, 1000, total // 4):
+        if page < 1 or (page - 1) * 4 >= total:
+            continue
+        cursor = cursor_at(page)
+        offset_q, offset_ms = measure(lambda: offset_page(page), repeat)
+        keyset_q, keyset_ms = measure(lambda: list(keyset_page(posts, 4, after=cursor)), repeat)
+        out.write(f"{page:>7} {offset_q:>9} {offset_ms:>8.1f} {keyset_q:>9} {keyset_ms:>8.1f}")
+
+
+def legacy_related(post):
+    """The category join single posts used before the related-posts table."""
+    return list(Post.objects.filter(
+        category__in=list(post.category.all()), status='published', is_trashed=False,
+    ).exclude(id=post.id).distinct().cards()[:5])
+
+
+def bench_related(out, repeat=5, sample=20):
+    out.write(f"Published posts: {Post.objects.published().count()}")
+    start = time.perf_counter()
+    updated = compute_related(full=True)
+    out.write(f"Full compute: {updated} posts in {time.perf_counter() - start:.1f} s")
+    start = time.perf_counter()
+    updated = compute_related()
+    out.write(f"Incremental, nothing changed: {updated} posts in {time.perf_counter() - start:.1f} s")
+
+    posts = list(Post.objects.published().order_by('?')[:sample])
+    _, legacy_ms = measure(lambda: [legacy_related(post) for post in posts], repeat)
+    _, table_ms = measure(lambda: [list(Post.objects.published().related_to(post).cards()[:5]) for post in posts], repeat)
+    out.write(f"{'read':<12} {'ms/post':>8}")
+    out.write(f"{'category':<12} {legacy_ms / len(posts):>8.2f}")
+    out.write(f"{'table':<12} {table_ms / len(posts):>8.2f}")
+
+
+BENCHMARKS = {
+    'search': bench_search,
+    'pagination': bench_pagination,
+    'related': bench_related,
+}
@@ -0,0 +1,264 @@
+# blog/cache.py
+import functools
+import hashlib
+import re
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+# Tag every cached page depends on: the category sidebar, category names
+# on cards
+CATEGORIES = 'categories'
+# Tag for pages listing published posts (blog index, load more, search)
+LISTING = 'listing'
+
+CSRF_FIELD = re.compile(r'name="csrfmiddlewaretoken" value="([A-Za-z0-9]+)"')
+CSRF_PLACEHOLDER = '\x00csrf\x00'
+
+STATS = ('hit', 'miss', 'bypass', 'render_us', 'hit_us')
+
+
+class PageCache:
+    """
+    Cache of the anonymous GET render of public blog views.
+
+    Each entry records the version of every tag it depends on; a signal
+    that changes a post, category or approved comment gives the matching
+    tags a new version, and entries recorded under an old one stop
+    matching. Tag versions live in the same cache, so with a shared
+    backend a save in one worker invalidates pages cached by all of them;
+    with a per-process cache other workers catch up within ``timeout``.
+    The CSRF token in cached forms is replaced per request on the way out.
+
+    Hit/miss counters are kept per process. On Redis, where incr is atomic,
+    each worker adds what it counted to shared totals at most every
+    ``stats_interval`` seconds, off the per-request path.
+    """
+
+    def __init__(self, timeout=None, alias=None, stats_interval=None):
+        self.timeout = getattr(settings, 'BLOG_PAGE_CACHE_TIMEOUT', 600) if timeout is None else timeout
+        self.alias = alias or getattr(settings, 'BLOG_PAGE_CACHE', 'default')
+        self.stats_interval = (
+            getattr(settings, 'BLOG_PAGE_CACHE_STATS_INTERVAL', 30) if stats_interval is None else stats_interval
+        )
+        self.views = []
+        self._counts = Counter()
+        self._pending = Counter()
+        self._published = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _tag_keys(self, tags):
+        return {f'blog:page:tag:{tag}': tag for tag in tags}
+
+    def versions(self, tags):
+        keys = self._tag_keys(tags)
+        found = self.cache.get_many(list(keys))
+        return {tag: found.get(key) for key, tag in keys.items()}
+
+    def invalidate(self, *tags):
+        # A fresh timestamp rather than incr: nothing to race, and a
+        # version evicted from the cache cannot come back as an old value
+        version = time.time_ns()
+        self.cache.set_many({key: version for key in self._tag_keys(tags)}, None)
+
+    def posts_changed(self, post_ids):
+        """Invalidate the pages showing any of ``post_ids``, including bulk updates that send no signals."""
+        from .models import Post
+
+        post_ids = list(post_ids)
+        category_ids = (
+            Post.category.through.objects
+            .filter(post_id__in=post_ids)
+            .values_list('category_id', flat=True)
+            .distinct()
+        )
+        self.invalidate(
+            LISTING,
+            *(f'post:{pk}' for pk in post_ids),
+            *(f'category:{pk}' for pk in category_ids),
+        )
+
+    def tag(self, request, *tags):
+        """Declare extra tags (a post, its categories) for the page being rendered."""
+        extra = getattr(request, '_page_cache_tags', None)
+        if extra is not None:
+            extra.update(tags)
+
+    def accepts(self, request):
+        return (
+            self.timeout > 0
+            and request.method in ('GET', 'HEAD')
+            and not request.user.is_authenticated
+            # A pending flash message is for this visitor only
+            and not len(get_messages(request))
+        )
+
+    def key(self, view_name, request, params):
+        # Scheme and host are part of the page (absolute URLs in the
+        # JSON-LD and canonical links), so one Host header cannot poison
+        # another's entry
+        query = urlencode([(name, request.GET.get(name, '')) for name in params])
+        url = f'{request.scheme}://{request.get_host()}{request.path}?{query}'
+        digest = hashlib.md5(url.encode()).hexdigest()
+        return f'blog:page:{view_name}:{digest}'
+
+    @property
+    def shared_stats(self):
+        return isinstance(self.cache, RedisCache)
+
+    def _stat_key(self, view_name, stat):
+        return f'blog:page:stats:{view_name}:{stat}'
+
+    def count(self, view_name, stat, delta=1):
+        with self._lock:
+            self._counts[view_name, stat] += delta
+            self._pending[view_name, stat] += delta
+            due = time.monotonic() - self._published >= self.stats_interval
+        if due and self.shared_stats:
+            self.publish_stats()
+
+    def publish_stats(self):
+        """Add the counts since the last call to the shared totals."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._published = time.monotonic()
+        for (view_name, stat), delta in pending.items():
+            key = self._stat_key(view_name, stat)
+            try:
+                self.cache.incr(key, delta)
+            except ValueError:
+                if not self.cache.add(key, delta, None):
+                    self.cache.incr(key, delta)
+
+    def _totals(self):
+        if not self.shared_stats:
+            with self._lock:
+                return {self._stat_key(*name): count for name, count in self._counts.items()}
+        self.publish_stats()
+        return self.cache.get_many([self._stat_key(view, stat) for view in self.views for stat in STATS])
+
+    def stats(self):
+        """
+        {view: {'hit', 'miss', 'bypass', 'hit_ratio', 'render_ms', 'hit_ms'}}:
+        across workers on Redis (up to ``stats_interval`` behind), otherwise
+        for this process.
+        """
+        found = self._totals()
+        result = {}
+        for view in self.views:
+            counts = {stat: found.get(self._stat_key(view, stat), 0) for stat in STATS}
+            lookups = counts['hit'] + counts['miss']
+            result[view] = {
+                'hit': counts['hit'],
+                'miss': counts['miss'],
+                'bypass': counts['bypass'],
+                'hit_ratio': counts['hit'] / lookups if lookups else None,
+                # Average render time of a miss and serve time of a hit
+                'render_ms': counts['render_us'] / counts['miss'] / 1000 if counts['miss'] else None,
+                'hit_ms': counts['hit_us'] / counts['hit'] / 1000 if counts['hit'] else None,
+            }
+        return result
+
+    def reset_stats(self):
+        with self._lock:
+            self._counts.clear()
+            self._pending.clear()
+        if self.shared_stats:
+            self.cache.delete_many([self._stat_key(view, stat) for view in self.views for stat in STATS])
+
+    def _response(self, request, entry):
+        content = entry['content']
+        if entry['csrf']:
+            content = content.replace(CSRF_PLACEHOLDER.encode(), get_token(request).encode())
+        return HttpResponse(content, content_type=entry['content_type'])
+
+    def _entry(self, request, response, versions):
+        if response.status_code != 200 or response.streaming or response.cookies:
+            return None
+        content = response.content
+        csrf = False
+        if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+            # The page rendered a CSRF token; store it as a placeholder, or
+            # not at all if it ended up somewhere other than a form field
+            tokens = set(CSRF_FIELD.findall(content.decode(response.charset)))
+            if len(tokens) != 1:
+                return None
+            content = content.replace(tokens.pop().encode(), CSRF_PLACEHOLDER.encode())
+            csrf = True
+        return {
+            'versions': versions,
+            'content': content,
+            'content_type': response['Content-Type'],
+            'csrf': csrf,
+        }
+
+    def serve(self, view, view_name, params, tags, request, *args, **kwargs):
+        if not self.accepts(request):
+            self.count(view_name, 'bypass')
+            response = view(request, *args, **kwargs)
+            response['X-Page-Cache'] = 'BYPASS'
+            return response
+
+        start = time.perf_counter()
+        key = self.key(view_name, request, params)
+        entry = self.cache.get(key)
+        if entry is not None and self.versions(entry['versions']) == entry['versions']:
+            response = self._response(request, entry)
+            elapsed = time.perf_counter() - start
+            self.count(view_name, 'hit')
+            self.count(view_name, 'hit_us', int(elapsed * 1e6))
+            response['X-Page-Cache'] = 'HIT'
+            response['Server-Timing'] = f'cache;dur={elapsed * 1000:.1f}'
+            return response
+
+        # Versions are read before rendering, so an invalidation that lands
+        # mid-render leaves this entry already out of date
+        versions = self.versions((CATEGORIES, *tags))
+        request._page_cache_tags = set()
+        start = time.perf_counter()
+        response = view(request, *args, **kwargs)
+        elapsed = time.perf_counter() - start
+        if request._page_cache_tags:
+            versions.update(self.versions(request._page_cache_tags))
+        entry = self._entry(request, response, versions)
+        if entry is not None:
+            self.cache.set(key, entry, self.timeout)
+        self.count(view_name, 'miss')
+        self.count(view_name, 'render_us', int(elapsed * 1e6))
+        response['X-Page-Cache'] = 'MISS'
+        response['Server-Timing'] = f'render;dur={elapsed * 1000:.1f}'
+        return response
+
+
+page_cache = PageCache()
+
+
+def cache_anonymous_page(params=('page',), tags=()):
+    """
+    Serve a view's anonymous GET render from ``page_cache``. The key is
+    the path plus the ``params`` the view reads from the query string;
+    ``tags`` are the invalidation tags every render of the view depends
+    on (CATEGORIES is always added). Views add per-object tags with
+    ``page_cache.tag(request, ...)``.
+    """
+    def decorator(view):
+        view_name = view.__name__
+        page_cache.views.append(view_name)
+
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            return page_cache.serve(view, view_name, params, tags, request, *args, **kwargs)
+        return wrapped
+    return decorator
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import Post
+from blog.search import stored_search_vector
+from blog.text import text_fields
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute plain_text, word_count, read_time and auto_excerpt and '
+        'rebuild search vectors from the stored text. Migration 0008 backfills '
+        'existing posts and saves keep them current; run this after changing '
+        'blog.text or for rows written with queryset.update().'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recompute every post, not only those without plain text',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        posts = Post.all_objects.order_by('pk')
+        if not options['all']:
+            posts = posts.filter(plain_text='').exclude(content='')
+        fields = list(text_fields(''))
+
+        done = 0
+        last_pk = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk).only('pk', 'content')[:batch_size])
+            if not batch:
+                break
+            for post in batch:
+                for field, value in text_fields(post.content).items():
+                    setattr(post, field, value)
+            Post.all_objects.bulk_update(batch, fields)
+            Post.all_objects.filter(pk__in=[post.pk for post in batch]).update(
+                search_vector=stored_search_vector()
+            )
+            last_pk = batch[-1].pk
+            done += len(batch)
+            self.stdout.write(f"  {done} posts")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled text fields for {done} post(s)"))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from blog.benchmarks import BENCHMARKS, seed_posts
+
+
+class Command(BaseCommand):
+    help = (
+        'Run a blog benchmark against the configured database. '
+        'Use a scratch database: --seed inserts synthetic published posts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(BENCHMARKS))
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Insert this many synthetic posts first (e.g. 50000)',
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            created = seed_posts(options['seed'])
+            self.stdout.write(f"Seeded {created} posts")
+        BENCHMARKS[options['name']](self.stdout, repeat=options['repeat'])
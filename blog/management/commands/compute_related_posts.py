@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from blog.related import compute_related
+
+
+class Command(BaseCommand):
+    help = (
+        'Refresh the related-posts table from TF-IDF similarity and category '
+        'overlap. Run it from cron (e.g. hourly); only posts changed since the '
+        'last run and those their changes affect are recomputed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recompute every published post (e.g. nightly, to follow corpus-wide idf changes)',
+        )
+
+    def handle(self, *args, **options):
+        updated = compute_related(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f"Recomputed related posts for {updated} post(s)"))
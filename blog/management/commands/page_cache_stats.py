@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+import blog.views  # noqa: F401  (registers the cached views)
+from blog.cache import page_cache
+
+
+class Command(BaseCommand):
+    help = 'Show hit ratio and render times of the public blog page cache (summed across workers on Redis).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters afterwards')
+
+    def handle(self, *args, **options):
+        def ms(value):
+            return '-' if value is None else f'{value:.1f}'
+
+        self.stdout.write(f"{'view':<28} {'hits':>8} {'misses':>8} {'bypass':>8} {'ratio':>6} {'render ms':>10} {'hit ms':>7}")
+        for view, stats in page_cache.stats().items():
+            ratio = '-' if stats['hit_ratio'] is None else f"{stats['hit_ratio']:.0%}"
+            self.stdout.write(
+                f"{view:<28} {stats['hit']:>8} {stats['miss']:>8} {stats['bypass']:>8} {ratio:>6} "
+                f"{ms(stats['render_ms']):>10} {ms(stats['hit_ms']):>7}"
+            )
+        if options['reset']:
+            page_cache.reset_stats()
+            self.stdout.write('Counters reset')
@@ -0,0 +1,43 @@
+import re
+from html import unescape
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Value
+from django.utils.html import strip_tags
+
+
+def backfill_search_vectors(apps, schema_editor):
+    # Frozen copy of blog.search.post_search_vector as it was for this migration
+    Post = apps.get_model('blog', 'Post')
+    config = getattr(settings, 'BLOG_SEARCH_CONFIG', 'english')
+    for post in Post.objects.only('title', 'excerpt', 'content').iterator(chunk_size=500):
+        text = re.sub(r'\s+', ' ', unescape(strip_tags(post.content or ''))).strip()
+        Post.objects.filter(pk=post.pk).update(search_vector=(
+            SearchVector(Value(post.title or ''), config=config, weight='A')
+            + SearchVector(Value(post.excerpt or ''), config=config, weight='B')
+            + SearchVector(Value(text), config=config, weight='C')
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_alter_category_id_alter_comment_id_alter_post_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='blog_post_search_gin'),
+        ),
+    ]
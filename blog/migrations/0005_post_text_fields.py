@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_post_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='plain_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='auto_excerpt',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_post_text_fields'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(
+                condition=models.Q(('is_trashed', False), ('status', 'published')),
+                fields=['-published_date', '-id'],
+                name='blog_post_published_keyset',
+            ),
+        ),
+    ]
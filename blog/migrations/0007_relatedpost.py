@@ -0,0 +1,27 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_post_published_keyset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedPost',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='blog.post')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_from', to='blog.post')),
+            ],
+            options={
+                'ordering': ['post', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('post', 'rank'), name='blog_related_post_rank_uniq')],
+            },
+        ),
+    ]
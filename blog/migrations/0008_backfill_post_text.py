@@ -0,0 +1,52 @@
+import math
+import re
+from html import unescape
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+# Frozen copies of blog.text's constants for this migration
+WORDS_PER_MINUTE = 200
+EXCERPT_WORDS = 35
+
+
+def backfill_post_text(apps, schema_editor):
+    """
+    plain_text, word_count, read_time and auto_excerpt for posts saved
+    before 0005, then their search vectors rebuilt from the stored text.
+    ``manage.py backfill_post_text`` does the same on demand.
+    """
+    Post = apps.get_model('blog', 'Post')
+    config = getattr(settings, 'BLOG_SEARCH_CONFIG', 'english')
+    posts = Post.objects.filter(plain_text='').exclude(content='').order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(posts.filter(pk__gt=last_pk).only('pk', 'content')[:500])
+        if not batch:
+            break
+        for post in batch:
+            post.plain_text = re.sub(r'\s+', ' ', unescape(strip_tags(post.content or ''))).strip()
+            post.word_count = len(post.plain_text.split())
+            post.read_time = math.ceil(post.word_count / WORDS_PER_MINUTE)
+            post.auto_excerpt = Truncator(post.plain_text).words(EXCERPT_WORDS, truncate='…')
+        Post.objects.bulk_update(batch, ['plain_text', 'word_count', 'read_time', 'auto_excerpt'])
+        Post.objects.filter(pk__in=[post.pk for post in batch]).update(search_vector=(
+            SearchVector('title', config=config, weight='A')
+            + SearchVector('excerpt', config=config, weight='B')
+            + SearchVector('plain_text', config=config, weight='C')
+        ))
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_relatedpost'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_post_text, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def record_computed_posts(apps, schema_editor):
+    # Posts that already have recommendations count as computed, so the
+    # next incremental run does not start over
+    RelatedPost = apps.get_model('blog', 'RelatedPost')
+    RelatedPostState = apps.get_model('blog', 'RelatedPostState')
+    RelatedPostState.objects.bulk_create(
+        [
+            RelatedPostState(post_id=row['post'], computed_at=row['last'])
+            for row in RelatedPost.objects.values('post').annotate(last=Max('computed_at')).order_by()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_backfill_post_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedPostState',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='related_state', serialize=False, to='blog.post')),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(record_computed_posts, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,17 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.utils import timezone
+from django.utils.safestring import mark_safe
 from django.utils.text import slugify
 from tinymce.models import HTMLField
+from .search import update_search_vector
+from .text import text_fields
+
+# Fields the derived text and the search vector are computed from
+SEARCH_FIELDS = frozenset({'title', 'excerpt', 'content'})
+
 
 class BaseContentQuerySet(models.QuerySet):
     def active(self):
@@ -14,10 +23,19 @@ class BaseContentQuerySet(models.QuerySet):
     def published(self):
         return self.active().filter(status='published')
 
+    def related_to(self, post):
+        # Precomputed recommendations for ``post``, best first (blog/related.py)
+        return self.filter(related_from__post=post).order_by('related_from__rank')
+
+    def cards(self):
+        # Cards render the stored summary, not the HTML body
+        return self.defer('content')
+
 
 class PostManager(models.Manager):
     def get_queryset(self):
-        return BaseContentQuerySet(self.model, using=self._db)
+        # Listings never need the search vector or the full plain text
+        return BaseContentQuerySet(self.model, using=self._db).defer('search_vector', 'plain_text')
     
     def active(self):
         return self.get_queryset().active()
@@ -56,23 +74,63 @@ class Post(models.Model):
     trashed_at = models.DateTimeField(null=True, blank=True)
     trashed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='trashed_%(class)s')
     read_time = models.PositiveIntegerField(default=0, help_text="Estimated reading time in minutes")
+    # Derived from content on save (see blog/text.py)
+    plain_text = models.TextField(blank=True, default='', editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    auto_excerpt = models.TextField(blank=True, default='', editable=False)
+    # Full-text search: weighted title/excerpt/content, see blog/search.py
+    search_vector = SearchVectorField(null=True, editable=False)
 
     objects = PostManager()
     all_objects = models.Manager()
     
     class Meta:
         ordering = ['-published_date']
-    
+        indexes = [
+            GinIndex(fields=['search_vector'], name='blog_post_search_gin'),
+            # Keyset pagination of the public listings (blog/pagination.py)
+            models.Index(
+                fields=['-published_date', '-id'],
+                condition=models.Q(status='published', is_trashed=False),
+                name='blog_post_published_keyset',
+            ),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        post._loaded_text = {name: post.__dict__[name] for name in SEARCH_FIELDS if name in post.__dict__}
+        return post
+
+    def _text_changed(self, update_fields):
+        """The SEARCH_FIELDS this save writes with a value other than the one loaded."""
+        fields = SEARCH_FIELDS if update_fields is None else SEARCH_FIELDS & set(update_fields)
+        loaded = getattr(self, '_loaded_text', {})
+        missing = object()
+        return {name for name in fields if loaded.get(name, missing) != getattr(self, name)}
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+        update_fields = kwargs.get('update_fields')
+        # A full save of e.g. is_featured leaves the derived text and the
+        # search vector alone
+        changed = self._text_changed(update_fields)
+        if 'content' in changed:
+            derived = text_fields(self.content)
+            for field, value in derived.items():
+                setattr(self, field, value)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *derived}
         super().save(*args, **kwargs)
+        if changed:
+            update_search_vector(self)
+        self._loaded_text = {name: getattr(self, name) for name in SEARCH_FIELDS}
 
-    def calculate_read_time(self):
-        plain_text = strip_tags(self.content)
-        word_count = len(plain_text.split())
-        words_per_minute = 200
-        return math.ceil(word_count / words_per_minute) if word_count > 0 else 0
+    @property
+    def summary(self):
+        """The author's excerpt (trusted HTML), else the first words of the content."""
+        return mark_safe(self.excerpt) if self.excerpt else self.auto_excerpt
     
     
     def move_to_trash(self, user=None):
@@ -137,6 +195,40 @@ class Comment(models.Model):
         return self.comment_replies.filter(approved=True)
 
 
+class RelatedPost(models.Model):
+    """
+    A post's precomputed recommendations, best first (see blog/related.py).
+    Rebuilt by the compute_related_posts command.
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_links')
+    related = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_from')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['post', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'rank'], name='blog_related_post_rank_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} -> {self.related_id} (#{self.rank}, {self.score:.3f})"
+
+
+class RelatedPostState(models.Model):
+    """
+    When a post's recommendations were last computed, recorded even when
+    it got none, so an incremental run can tell "no related posts" from
+    "not computed yet".
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='related_state')
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.post_id} computed {self.computed_at:%Y-%m-%d %H:%M}"
+
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     first_name = models.CharField(max_length=150, blank=True)
@@ -0,0 +1,89 @@
+# blog/pagination.py
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+# Listings are ordered newest first; id breaks ties between posts published
+# at the same moment
+ORDERING = ('-published_date', '-id')
+
+
+def encode_cursor(post):
+    """Opaque token for the position of ``post`` in the listing order."""
+    raw = f'{post.published_date.isoformat()}|{post.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """(published_date, id) from a cursor token. Raises ValueError when it is not one."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        published, pk = raw.split('|')
+        return datetime.fromisoformat(published), int(pk)
+    except (TypeError, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError('Invalid cursor') from exc
+
+
+class KeysetPage:
+    """
+    One page of a keyset-paginated listing. Iterates like a Paginator page
+    and carries the cursors for the pages either side; there are no page
+    numbers and no total count.
+    """
+
+    def __init__(self, items, has_next, has_previous):
+        self.items = items
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.items[-1]) if self.has_next else None
+
+    @property
+    def previous_cursor(self):
+        return encode_cursor(self.items[0]) if self.has_previous else None
+
+
+def keyset_page(queryset, per_page, after=None, before=None):
+    """
+    The ``per_page`` posts of ``queryset`` following the ``after`` cursor
+    (or preceding ``before``; the first page with neither). Each page is a
+    range scan of ORDERING from the cursor, so page 100 costs what page 1
+    does. Raises ValueError for an invalid cursor.
+    """
+    if before:
+        published, pk = decode_cursor(before)
+        rows = list(
+            queryset
+            .filter(published_date__gte=published)
+            .filter(Q(published_date__gt=published) | Q(id__gt=pk))
+            .order_by('published_date', 'id')[:per_page + 1]
+        )
+        has_previous = len(rows) > per_page
+        return KeysetPage(rows[:per_page][::-1], has_next=True, has_previous=has_previous)
+
+    if after:
+        published, pk = decode_cursor(after)
+        # The redundant published_date bound lets the scan start at the cursor
+        queryset = (
+            queryset
+            .filter(published_date__lte=published)
+            .filter(Q(published_date__lt=published) | Q(id__lt=pk))
+        )
+    rows = list(queryset.order_by(*ORDERING)[:per_page + 1])
+    return KeysetPage(rows[:per_page], has_next=len(rows) > per_page, has_previous=bool(after))
@@ -0,0 +1,252 @@
+# blog/related.py
+import re
+from collections import Counter
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .cache import page_cache
+from .models import Post, RelatedPost, RelatedPostState
+
+RELATED_LIMIT = 5
+# Each post keeps only its highest weighted terms: enough to characterise
+# it, and it keeps common words from producing huge posting lists
+TERMS_PER_POST = 64
+# Weight of category overlap (Jaccard, 0-1) next to text similarity (cosine, 0-1)
+CATEGORY_WEIGHT = 0.3
+# Upper bound on postings gathered per similarity block, to bound memory
+MAX_GATHER = 4_000_000
+
+TOKEN = re.compile(r'[^\W\d_]{3,}')
+
+
+def _ranges(starts, lengths):
+    """Concatenation of range(start, start + length) for each pair, without a Python loop."""
+    offsets = starts - np.cumsum(lengths) + lengths
+    return np.repeat(offsets, lengths) + np.arange(lengths.sum())
+
+
+class Corpus:
+    """
+    TF-IDF vectors and category sets of the published posts, as NumPy
+    arrays: a row-ordered (CSR) copy for reading one post's terms and a
+    term-ordered (postings) copy for finding every post that shares them.
+    Row ``i`` is post ``ids[i]``.
+    """
+
+    def __init__(self, ids, updated, texts, categories):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.updated = updated
+        self.index = {pk: row for row, pk in enumerate(ids)}
+        n = len(ids)
+
+        vocabulary = {}
+        doc, term, count = [], [], []
+        for row, text in enumerate(texts):
+            counts = Counter(TOKEN.findall(text.lower()))
+            doc.extend([row] * len(counts))
+            term.extend(vocabulary.setdefault(word, len(vocabulary)) for word in counts)
+            count.extend(counts.values())
+        doc = np.asarray(doc, dtype=np.int64)
+        term = np.asarray(term, dtype=np.int64)
+
+        # Sublinear tf, smoothed idf
+        df = np.bincount(term, minlength=len(vocabulary))
+        weight = (1 + np.log(np.asarray(count, dtype=np.float64))) * (np.log((1 + n) / (1 + df)) + 1)[term]
+
+        # Top TERMS_PER_POST terms of each post, then L2-normalise
+        order = np.lexsort((-weight, doc))
+        doc, term, weight = doc[order], term[order], weight[order]
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(doc, minlength=n), out=indptr[1:])
+        keep = np.arange(len(doc)) - indptr[doc] < TERMS_PER_POST
+        doc, term, weight = doc[keep], term[keep], weight[keep]
+        norms = np.sqrt(np.bincount(doc, weight * weight, minlength=n))
+        weight /= norms[doc]
+
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(doc, minlength=n), out=self.indptr[1:])
+        self.terms, self.weights = term, weight
+
+        # Postings a row gathers when scored, for sizing blocks
+        gathered = np.concatenate(([0], np.cumsum(np.bincount(term, minlength=len(vocabulary))[term])))
+        self.row_cost = gathered[self.indptr[1:]] - gathered[self.indptr[:-1]]
+
+        by_term = np.argsort(term, kind='stable')
+        self.postings_doc, self.postings_weight = doc[by_term], weight[by_term]
+        self.term_ptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term, minlength=len(vocabulary)), out=self.term_ptr[1:])
+
+        category_ids = sorted({c for cats in categories for c in cats})
+        column = {c: j for j, c in enumerate(category_ids)}
+        self.categories = np.zeros((n, len(category_ids)), dtype=np.float32)
+        for row, cats in enumerate(categories):
+            self.categories[row, [column[c] for c in cats]] = 1
+        self.category_counts = self.categories.sum(axis=1)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def load(cls):
+        posts = (
+            Post.all_objects.filter(status='published', is_trashed=False)
+            .order_by('pk')
+            .values_list('pk', 'updated_at', 'title', 'plain_text')
+        )
+        ids, updated, texts = [], [], []
+        for pk, updated_at, title, plain_text in posts.iterator(chunk_size=1000):
+            ids.append(pk)
+            updated.append(updated_at)
+            texts.append(f'{title} {plain_text}')
+        index = {pk: row for row, pk in enumerate(ids)}
+        categories = [[] for _ in ids]
+        links = Post.category.through.objects.values_list('post_id', 'category_id')
+        for post_id, category_id in links.iterator(chunk_size=5000):
+            if post_id in index:
+                categories[index[post_id]].append(category_id)
+        return cls(ids, updated, texts, categories)
+
+    def _blocks(self, rows):
+        """
+        Split ``rows`` into blocks that each gather about MAX_GATHER
+        postings and score entries (every row also fills a dense row of
+        len(self) scores).
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        cost = np.cumsum(self.row_cost[rows] + len(self))
+        block = cost // max(MAX_GATHER, len(self))
+        return np.split(rows, np.flatnonzero(np.diff(block)) + 1) if len(rows) else []
+
+    def similarities(self, rows):
+        """(len(rows), len(self)) scores: cosine of TF-IDF plus weighted category Jaccard; -inf on the diagonal."""
+        rows = np.asarray(rows, dtype=np.int64)
+        n = len(self)
+        lengths = np.diff(self.indptr)[rows]
+        local = np.repeat(np.arange(len(rows)), lengths)
+        nonzero = _ranges(self.indptr[rows], lengths)
+        terms, weights = self.terms[nonzero], self.weights[nonzero]
+
+        posting_lengths = np.diff(self.term_ptr)[terms]
+        postings = _ranges(self.term_ptr[terms], posting_lengths)
+        scores = np.bincount(
+            np.repeat(local, posting_lengths) * n + self.postings_doc[postings],
+            weights=np.repeat(weights, posting_lengths) * self.postings_weight[postings],
+            minlength=len(rows) * n,
+        ).reshape(len(rows), n)
+
+        if self.categories.shape[1]:
+            overlap = self.categories[rows] @ self.categories.T
+            union = self.category_counts[rows][:, None] + self.category_counts[None, :] - overlap
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scores += CATEGORY_WEIGHT * np.where(union > 0, overlap / union, 0)
+        scores[np.arange(len(rows)), rows] = -np.inf
+        return scores
+
+
+def top_related(scores, limit=RELATED_LIMIT):
+    """Per row of ``scores``: (columns, scores) of the best ``limit`` positive scores, best first."""
+    limit = min(limit, scores.shape[1])
+    if not limit:
+        return [([], [])] * len(scores)
+    candidates = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+    best = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-best, axis=1, kind='stable')
+    candidates = np.take_along_axis(candidates, order, axis=1)
+    best = np.take_along_axis(best, order, axis=1)
+    return [(cols[vals > 0], vals[vals > 0]) for cols, vals in zip(candidates, best)]
+
+
+def _stored():
+    """{post_id: [(related_id, score), ...]} best first, for every computed post (an empty list when it has none)."""
+    stored = {pk: [] for pk in RelatedPostState.objects.values_list('post_id', flat=True).iterator(chunk_size=5000)}
+    for post_id, related_id, score in RelatedPost.objects.order_by('post', 'rank').values_list(
+        'post_id', 'related_id', 'score'
+    ).iterator(chunk_size=5000):
+        stored.setdefault(post_id, []).append((related_id, score))
+    return stored
+
+
+def _affected(corpus, stored, changed):
+    """
+    Rows whose top list a change can alter: the changed posts themselves,
+    posts listing one of them (its score may have dropped, letting the
+    next best in) and posts where one now beats the weakest stored entry.
+    Similarity is symmetric, so one pass over the changed rows scores them
+    against every post.
+    """
+    n = len(corpus)
+    weakest = np.full(n, -np.inf)
+    lists_changed = np.zeros(n, dtype=bool)
+    changed_ids = set(corpus.ids[changed].tolist())
+    for pk, row in corpus.index.items():
+        entries = stored.get(pk, [])
+        if len(entries) >= RELATED_LIMIT:
+            weakest[row] = entries[-1][1]
+        # A vanished post (unpublished, deleted) counts as a changed entry
+        if any(related in changed_ids or related not in corpus.index for related, _ in entries):
+            lists_changed[row] = True
+
+    best_new = np.full(n, -np.inf)
+    for block in corpus._blocks(changed):
+        np.maximum(best_new, corpus.similarities(block).max(axis=0), out=best_new)
+    affected = lists_changed | ((best_new > weakest) & (best_new > 0))
+    affected[changed] = True
+    return np.flatnonzero(affected)
+
+
+def compute_related(full=False):
+    """
+    Refresh RelatedPost. With ``full`` (or on the first run) every published
+    post is recomputed; otherwise only posts saved since the last run, posts
+    never computed, and the posts whose top list they can change. Every
+    computed post gets a RelatedPostState, including one with no positive
+    neighbour, so it is not recomputed on every run.
+    The idf weights come from the current corpus either way, so an
+    occasional full run keeps older lists in step with it. Returns the
+    number of posts whose recommendations were rewritten.
+    """
+    # Taken first: a post saved while this runs is newer than the rows
+    # written, so the next run picks it up
+    now = timezone.now()
+    corpus = Corpus.load()
+    stored = _stored()
+    last_run = RelatedPostState.objects.aggregate(last=Max('computed_at'))['last']
+    # Computed before, no longer published
+    gone = [pk for pk in stored if pk not in corpus.index]
+
+    if full or last_run is None:
+        rows = np.arange(len(corpus))
+    else:
+        changed = np.array([
+            row for row, pk in enumerate(corpus.ids.tolist())
+            if corpus.updated[row] > last_run or pk not in stored
+        ], dtype=np.int64)
+        # An unpublished post changes the lists that named it, even when
+        # nothing was saved
+        rows = _affected(corpus, stored, changed) if len(changed) or gone else np.array([], dtype=np.int64)
+
+    links = []
+    for block in corpus._blocks(rows):
+        for row, (columns, scores) in zip(block, top_related(corpus.similarities(block))):
+            links.extend(
+                RelatedPost(
+                    post_id=int(corpus.ids[row]), related_id=int(corpus.ids[column]),
+                    rank=rank, score=float(score), computed_at=now,
+                )
+                for rank, (column, score) in enumerate(zip(columns, scores))
+            )
+
+    post_ids = corpus.ids[rows].tolist()
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id__in=post_ids + gone).delete()
+        RelatedPostState.objects.filter(post_id__in=post_ids + gone).delete()
+        RelatedPost.objects.bulk_create(links, batch_size=1000)
+        RelatedPostState.objects.bulk_create(
+            [RelatedPostState(post_id=pk, computed_at=now) for pk in post_ids], batch_size=1000,
+        )
+    if post_ids or gone:
+        page_cache.invalidate(*(f'post:{pk}' for pk in post_ids + gone))
+    return len(post_ids)
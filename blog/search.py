@@ -0,0 +1,103 @@
+# blog/search.py
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchHeadline, SearchQuery, SearchRank, SearchVector,
+)
+from django.db.models import F, Value
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .text import html_to_text
+
+# Markers ts_headline wraps matches in; swapped for <mark> after escaping
+START_SEL, STOP_SEL = '\x02', '\x03'
+
+WORD = re.compile(r'\w+')
+
+
+def search_config():
+    return getattr(settings, 'BLOG_SEARCH_CONFIG', 'english')
+
+
+def post_search_vector(title, excerpt, content):
+    """
+    Weighted tsvector expression for a post: title (A) > excerpt (B) >
+    content with the HTML stripped (C). Built from values, for rows whose
+    plain_text is not stored yet (migrations, bulk inserts).
+    """
+    config = search_config()
+    return (
+        SearchVector(Value(title or ''), config=config, weight='A')
+        + SearchVector(Value(excerpt or ''), config=config, weight='B')
+        + SearchVector(Value(html_to_text(content)), config=config, weight='C')
+    )
+
+
+def stored_search_vector():
+    """The same vector built from the stored title, excerpt and plain_text columns."""
+    config = search_config()
+    return (
+        SearchVector('title', config=config, weight='A')
+        + SearchVector('excerpt', config=config, weight='B')
+        + SearchVector('plain_text', config=config, weight='C')
+    )
+
+
+def update_search_vector(post):
+    """Recompute ``post``'s search_vector in place (one UPDATE)."""
+    type(post).all_objects.filter(pk=post.pk).update(search_vector=stored_search_vector())
+
+
+def search_query(query, prefix=False):
+    """
+    SearchQuery for user input: web-search syntax ("quoted phrases", -not,
+    or), or with ``prefix`` every word as a prefix so results narrow as
+    the user types. None when the input has no words.
+    """
+    config = search_config()
+    if prefix:
+        words = WORD.findall(query)
+        if not words:
+            return None
+        return SearchQuery(' & '.join(f'{word}:*' for word in words), config=config, search_type='raw')
+    if not WORD.search(query):
+        return None
+    return SearchQuery(query, config=config, search_type='websearch')
+
+
+def search_posts(queryset, query, prefix=False):
+    """
+    ``queryset`` narrowed to posts matching ``query`` through the GIN
+    indexed search_vector, annotated with ``rank`` and ordered by it.
+    """
+    tsquery = search_query(query, prefix)
+    if tsquery is None:
+        return queryset.none()
+    return (
+        queryset
+        .filter(search_vector=tsquery)
+        .annotate(rank=SearchRank(F('search_vector'), tsquery))
+        .order_by('-rank', '-published_date')
+    )
+
+
+def with_headlines(queryset, query, prefix=False):
+    """
+    Annotate ``headline``: a snippet of the post's text around the matches.
+    Postgres evaluates it after the sort and LIMIT, so only for the page
+    of results shown.
+    """
+    tsquery = search_query(query, prefix)
+    if tsquery is None:
+        return queryset
+    return queryset.annotate(headline=SearchHeadline(
+        'plain_text', tsquery, config=search_config(),
+        start_sel=START_SEL, stop_sel=STOP_SEL, max_words=35, min_words=15,
+    ))
+
+
+def highlight(headline):
+    """Escaped headline HTML with the matches in <mark>."""
+    return mark_safe(escape(headline).replace(START_SEL, '<mark>').replace(STOP_SEL, '</mark>'))
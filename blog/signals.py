@@ -0,0 +1,51 @@
+# blog/signals.py
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import CATEGORIES, page_cache
+from .models import Category, Comment, Post
+
+
+@receiver(post_save, sender=Post)
+@receiver(pre_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    # pre_delete, while the post's categories are still linked
+    page_cache.posts_changed([instance.pk])
+
+
+@receiver(m2m_changed, sender=Post.category.through)
+def post_categories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # The categories being cleared are not in pk_set
+        if reverse:
+            page_cache.invalidate(f'category:{instance.pk}')
+        else:
+            page_cache.posts_changed([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        if reverse:
+            # category.posts.add(...)
+            page_cache.posts_changed(pk_set)
+            page_cache.invalidate(f'category:{instance.pk}')
+        else:
+            page_cache.posts_changed([instance.pk])
+            page_cache.invalidate(*(f'category:{pk}' for pk in pk_set))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, **kwargs):
+    # Every page shows the category list
+    page_cache.invalidate(CATEGORIES)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    # A new comment awaiting approval is not shown anywhere yet
+    if instance.approved or not created:
+        page_cache.invalidate(f'post:{instance.post_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if instance.approved:
+        page_cache.invalidate(f'post:{instance.post_id}')
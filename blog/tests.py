@@ -1,3 +1,177 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import page_cache
+from .models import Category, Post
+from .pagination import ORDERING, decode_cursor, keyset_page
+from .text import text_fields
+
+
+class PostSaveTests(TestCase):
+    def _save(self, post, **kwargs):
+        with mock.patch('blog.models.update_search_vector') as vector, \
+                mock.patch('blog.models.text_fields', wraps=text_fields) as derive:
+            post.save(**kwargs)
+        return derive.call_count, vector.call_count
+
+    def test_text_is_derived_only_when_it_changes(self):
+        post = Post(title='Blood pressure basics', content='<p>Know your numbers.</p>', status='published')
+        self.assertEqual(self._save(post), (1, 1))
+        self.assertEqual(post.plain_text, 'Know your numbers.')
+
+        post = Post.objects.get(pk=post.pk)
+        post.is_featured = True
+        self.assertEqual(self._save(post), (0, 0))
+        post.title = 'Blood pressure, explained'
+        self.assertEqual(self._save(post), (0, 1))
+        self.assertEqual(self._save(post, update_fields=['content']), (0, 0))
+        post.content = '<p>Check it yearly.</p>'
+        self.assertEqual(self._save(post, update_fields=['content']), (1, 1))
+        self.assertEqual(Post.objects.get(pk=post.pk).plain_text, 'Check it yearly.')
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        # Three posts share a timestamp, so the id tiebreak is exercised
+        dates = [now - timedelta(hours=h) for h in (0, 1, 2, 2, 2, 3, 5, 8, 9, 12)]
+        Post.all_objects.bulk_create(
+            [Post(title=f'Post {i}', slug=f'post-{i}', content='<p>x</p>', status='published', published_date=d)
+             for i, d in enumerate(dates)]
+            + [Post(title='Draft', slug='draft', content='', status='draft', published_date=now),
+               Post(title='Trashed', slug='trashed', content='', status='published', is_trashed=True,
+                    published_date=now)]
+        )
+        self.posts = Post.objects.filter(status='published', is_trashed=False)
+        self.expected = list(self.posts.order_by(*ORDERING).values_list('pk', flat=True))
+
+    def _pks(self, page):
+        return [post.pk for post in page]
+
+    def test_walks_every_post_once_forward_and_back(self):
+        pages, after = [], None
+        while True:
+            page = keyset_page(self.posts, 3, after=after)
+            pages.append(self._pks(page))
+            if not page.has_next:
+                break
+            after = page.next_cursor
+        self.assertEqual(sum(pages, []), self.expected)
+        self.assertEqual([len(p) for p in pages], [3, 3, 3, 1])
+
+        back, before = [], keyset_page(self.posts, 3, after=after).previous_cursor
+        while before:
+            page = keyset_page(self.posts, 3, before=before)
+            back.append(self._pks(page))
+            before = page.previous_cursor
+        self.assertEqual(back[::-1], pages[:-1])
+
+    def test_new_post_does_not_shift_the_next_page(self):
+        first = keyset_page(self.posts, 3)
+        Post.all_objects.create(
+            title='Newest', slug='newest', content='', status='published',
+            published_date=timezone.now() + timedelta(minutes=1),
+        )
+        second = keyset_page(self.posts, 3, after=first.next_cursor)
+        self.assertEqual(self._pks(second), self.expected[3:6])
+
+    def test_invalid_cursor(self):
+        for token in ('', 'not-a-cursor', 'MjAyNnxub3QtYW4taWQ'):
+            with self.assertRaises(ValueError):
+                decode_cursor(token)
+        response = self.client.get(reverse('load_more'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_load_more_continues_from_cursor(self):
+        first = keyset_page(self.posts, 4)
+        data = self.client.get(reverse('load_more'), {'cursor': first.next_cursor}).json()
+        self.assertTrue(data['success'])
+        self.assertTrue(data['has_next'])
+        self.assertEqual(decode_cursor(data['next_cursor'])[1], self.expected[7])
+
+
+class PageCacheInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        page_cache.reset_stats()
+        self.category = Category.objects.create(name='Heart Health', slug='heart-health')
+        self.post = Post.objects.create(
+            title='Blood pressure basics', slug='blood-pressure-basics',
+            content='<p>Know your numbers.</p>', status='published',
+        )
+        self.post.category.add(self.category)
+        self.url = reverse('posts_by_category_or_post', args=[self.post.slug])
+
+    def _get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['X-Page-Cache'], response.content.decode()
+
+    def test_post_save_invalidates_its_page(self):
+        self.assertEqual(self._get(self.url)[0], 'MISS')
+        self.assertEqual(self._get(self.url)[0], 'HIT')
+
+        self.post.title = 'Blood pressure, explained'
+        self.post.save()
+        status, content = self._get(self.url)
+        self.assertEqual(status, 'MISS')
+        self.assertIn('Blood pressure, explained', content)
+        self.assertEqual(self._get(self.url)[0], 'HIT')
+
+    def test_category_change_invalidates_listing(self):
+        listing = reverse('blog')
+        self._get(listing)
+        self.assertEqual(self._get(listing)[0], 'HIT')
+
+        self.category.name = 'Cardiology'
+        self.category.save()
+        status, content = self._get(listing)
+        self.assertEqual(status, 'MISS')
+        self.assertIn('Cardiology', content)
+
+    def test_unpublishing_invalidates_post_and_listing(self):
+        listing = reverse('blog')
+        self._get(listing)
+        self._get(self.url)
+
+        self.post.status = 'draft'
+        self.post.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        status, content = self._get(listing)
+        self.assertEqual(status, 'MISS')
+        self.assertNotIn('Blood pressure basics', content)
+
+    def test_logged_in_users_bypass_the_cache(self):
+        self._get(self.url)
+        self.client.force_login(User.objects.create_user('editor'))
+        self.assertEqual(self._get(self.url)[0], 'BYPASS')
+        self.assertEqual(page_cache.stats()['posts_by_category_or_post']['bypass'], 1)
+
+    def test_host_and_query_are_part_of_the_key(self):
+        self.assertEqual(self._get(self.url)[0], 'MISS')
+        # A forged Host header renders (and caches) its own copy
+        response = self.client.get(self.url, HTTP_HOST='evil.example')
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertNotIn('evil.example', self._get(self.url)[1])
+
+        request = RequestFactory().get('/blog/', {'page': 'a&b=c'})
+        other = RequestFactory().get('/blog/', {'page': 'a', 'b': 'c'})
+        self.assertNotEqual(
+            page_cache.key('blog', request, ('page', 'b')),
+            page_cache.key('blog', other, ('page', 'b')),
+        )
+
+    def test_stats_stay_in_process_without_redis(self):
+        with mock.patch.object(cache, 'incr') as incr, mock.patch.object(cache, 'add') as add:
+            self._get(self.url)
+            self._get(self.url)
+        incr.assert_not_called()
+        add.assert_not_called()
+        stats = page_cache.stats()['posts_by_category_or_post']
+        self.assertEqual((stats['hit'], stats['miss'], stats['hit_ratio']), (1, 1, 0.5))
@@ -0,0 +1,33 @@
+# blog/text.py
+import math
+import re
+from html import unescape
+
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+WORDS_PER_MINUTE = 200
+EXCERPT_WORDS = 35
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def html_to_text(html):
+    """Readable text of a post's HTML: tags stripped, entities decoded, whitespace collapsed."""
+    return WHITESPACE.sub(' ', unescape(strip_tags(html or ''))).strip()
+
+
+def text_fields(content):
+    """
+    The columns Post derives from its HTML content: plain_text,
+    word_count, read_time (minutes, at least 1 for any text) and
+    auto_excerpt (the first EXCERPT_WORDS words).
+    """
+    plain_text = html_to_text(content)
+    word_count = len(plain_text.split())
+    return {
+        'plain_text': plain_text,
+        'word_count': word_count,
+        'read_time': math.ceil(word_count / WORDS_PER_MINUTE),
+        'auto_excerpt': Truncator(plain_text).words(EXCERPT_WORDS, truncate='…'),
+    }
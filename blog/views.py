@@ -1,19 +1,22 @@
 from django.shortcuts import render, get_object_or_404
 from .models import Post, Category, Comment
+from .cache import LISTING, cache_anonymous_page, page_cache
 from .forms import CommentForm
+from .pagination import keyset_page
+from .search import highlight, search_posts, with_headlines
 from django.core.paginator import Paginator
-from django.db.models import Q
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.template.loader import render_to_string
 
+@cache_anonymous_page(params=(), tags=(LISTING,))
 def blog(request):
     # Get featured posts - try featured first, then fall back to latest
     featured_posts = list(Post.objects.filter(
         status='published', 
         is_trashed=False, 
         is_featured=True
-    ).select_related('author').prefetch_related('category')[:3])
+    ).select_related('author').prefetch_related('category').cards()[:3])
     
     # If not enough featured, fill with latest posts
     if len(featured_posts) < 3:
@@ -21,20 +24,18 @@ def blog(request):
         additional = Post.objects.filter(
             status='published', 
             is_trashed=False
-        ).exclude(id__in=existing_ids).select_related('author').prefetch_related('category')[:3 - len(featured_posts)]
+        ).exclude(id__in=existing_ids).select_related('author').prefetch_related('category').cards()[:3 - len(featured_posts)]
         featured_posts.extend(list(additional))
     
     # Get all categories
     categories = Category.objects.all()
     
-    # Get all published posts with pagination (4 per page)
+    # First page of published posts (4 per page); load_more continues from its cursor
     posts_list = Post.objects.filter(
         status='published', 
         is_trashed=False
-    ).select_related('author').prefetch_related('category').order_by('-published_date')
-    paginator = Paginator(posts_list, 4)
-    page = request.GET.get('page')
-    posts = paginator.get_page(page)
+    ).select_related('author').prefetch_related('category').cards()
+    posts = keyset_page(posts_list, 4)
     
     context = {
         'featured_posts': featured_posts,
@@ -44,18 +45,23 @@ def blog(request):
     return render(request, 'blog/blog.html', context)
 
 
+@cache_anonymous_page(params=('after', 'before', 'show_all_comments'))
 def posts_by_category_or_post(request, slug):
     # Check if it's a category
     category = Category.objects.filter(slug=slug).first()
     if category:
+        page_cache.tag(request, f'category:{category.pk}')
         posts = Post.objects.filter(
             status='published', 
             is_trashed=False,
             category=category
-        ).select_related('author').prefetch_related('category').order_by('-published_date')
-        paginator = Paginator(posts, 6)
-        page_number = request.GET.get("page")
-        page_obj = paginator.get_page(page_number)
+        ).select_related('author').prefetch_related('category').cards()
+        try:
+            page_obj = keyset_page(
+                posts, 6, after=request.GET.get('after'), before=request.GET.get('before'),
+            )
+        except ValueError:
+            raise Http404('Invalid page')
 
         context = {
             'page_obj': page_obj,
@@ -67,13 +73,24 @@ def posts_by_category_or_post(request, slug):
     # Otherwise treat as single post
     single_post = get_object_or_404(Post, slug=slug, status='published', is_trashed=False)
     
-    # Related posts by category (fetch 5)
-    post_categories = single_post.category.all()
-    related_posts = Post.objects.filter(
-        category__in=post_categories,
-        status='published',
-        is_trashed=False
-    ).exclude(id=single_post.id).distinct()[:5]
+    # Related posts: the precomputed top 5 (compute_related_posts), or the
+    # latest posts sharing a category until the post has been scored
+    post_categories = list(single_post.category.all())
+    related_posts = list(
+        Post.objects.published().related_to(single_post).prefetch_related('category').cards()[:5]
+    )
+    if not related_posts:
+        related_posts = list(Post.objects.filter(
+            category__in=post_categories,
+            status='published',
+            is_trashed=False
+        ).exclude(id=single_post.id).distinct().cards().order_by('-published_date')[:5])
+    page_cache.tag(
+        request,
+        f'post:{single_post.pk}',
+        *(f'category:{c.pk}' for c in post_categories),
+        *(f'post:{p.pk}' for p in related_posts),
+    )
 
     # Comment handling
     comment_form = CommentForm()
@@ -123,15 +140,21 @@ def posts_by_category_or_post(request, slug):
     return render(request, 'blog/single_blog.html', context)
 
 
+@cache_anonymous_page(params=('cursor', 'page'), tags=(LISTING,))
 def load_more(request):    
-    page_number = request.GET.get('page', 2)
+    # The cursor comes from the previous response; blog.js sends it as ?page=
+    cursor = request.GET.get('cursor') or request.GET.get('page')
+    if not cursor:
+        return JsonResponse({'success': False, 'error': 'Missing cursor'}, status=400)
     posts_list = Post.objects.filter(
         status='published', 
         is_trashed=False
-    ).select_related('author').prefetch_related('category').order_by('-published_date')
+    ).select_related('author').prefetch_related('category').cards()
     
-    paginator = Paginator(posts_list, 4)
-    page_obj = paginator.get_page(page_number)
+    try:
+        page_obj = keyset_page(posts_list, 4, after=cursor)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
     
     # Render posts HTML
     html = render_to_string('blog/partials/post_cards.html', {'posts': page_obj})
@@ -139,28 +162,30 @@ def load_more(request):
     return JsonResponse({
         'success': True,
         'html': html,
-        'has_next': page_obj.has_next(),
-        'next_page': page_obj.next_page_number() if page_obj.has_next() else None
+        'has_next': page_obj.has_next,
+        'next_cursor': page_obj.next_cursor,
+        'next_page': page_obj.next_cursor,
     })
 
 
+@cache_anonymous_page(params=('q', 'page'), tags=(LISTING,))
 def search(request):    
     query = request.GET.get('q', '')
     
     if query:
-        posts = Post.objects.filter(
-            Q(title__icontains=query) | 
-            Q(content__icontains=query) | 
-            Q(excerpt__icontains=query),
-            status='published',
-            is_trashed=False
-        ).select_related('author').prefetch_related('category').order_by('-published_date')
+        posts = search_posts(
+            Post.objects.filter(status='published', is_trashed=False),
+            query,
+        ).select_related('author').prefetch_related('category').cards()
+        posts = with_headlines(posts, query)
     else:
         posts = Post.objects.none()
     
     paginator = Paginator(posts, 12)
     page = request.GET.get('page')
     page_obj = paginator.get_page(page)
+    for post in page_obj:
+        post.snippet = highlight(post.headline) if getattr(post, 'headline', None) else ''
     
     context = {
         'query': query,
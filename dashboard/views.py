@@ -2,6 +2,8 @@ from django.shortcuts import render, redirect, get_object_or_404
 from datetime import datetime
 from dashboard.forms import PostForm
 from blog.models import Post, Category, Comment
+from blog.cache import page_cache
+from blog.search import search_posts
 from django.db.models import Count, Q, Sum
 from django.core.paginator import Paginator
 from django.utils import timezone
@@ -136,12 +138,6 @@ def posts(request):
         posts_queryset = posts_queryset.filter(is_trashed=False)
     
     
-    if search_query:
-        posts_queryset = posts_queryset.filter(
-            Q(title__icontains=search_query) | 
-            Q(content__icontains=search_query) |
-            Q(excerpt__icontains=search_query)
-        )
     
     if status_filter == 'mine':
         posts_queryset = posts_queryset.filter(author=request.user)
@@ -168,7 +164,11 @@ def posts(request):
         except (ValueError, IndexError):
             pass
     
-    posts_queryset = posts_queryset.order_by('-created_at')
+    if search_query:
+        # Ranked prefix match, so results narrow as the title is typed
+        posts_queryset = search_posts(posts_queryset, search_query, prefix=True)
+    else:
+        posts_queryset = posts_queryset.order_by('-created_at')
     
     # Get counts for tabs
     def get_tab_counts(user):
@@ -281,6 +281,9 @@ def bulk_action(request):
             posts_to_update.update(status='draft')
             messages.success(request, f'{len(post_ids)} posts moved to draft.')
         
+        # Queryset updates send no signals
+        page_cache.posts_changed(post_ids)
+        
         # Build redirect URL with preserved parameters
         redirect_url = reverse('posts') + f'?status={status_filter}&category={category_filter}&date={date_filter}&search={search_query}&page={page}'
         return redirect(redirect_url)
@@ -899,6 +902,8 @@ def bulk_comment_action(request):
         
         if comment_ids:
             comments = Comment.objects.filter(id__in=comment_ids)
+            # Queryset updates send no signals
+            page_cache.invalidate(*{f'post:{pk}' for pk in comments.values_list('post_id', flat=True)})
             
             if action == 'approve':
                 comments.update(approved=True)
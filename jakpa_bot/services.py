@@ -1,7 +1,6 @@
 from google import genai
 from google.genai import types
 from django.conf import settings
-from django.utils.html import strip_tags
 import os
 
 
@@ -86,16 +85,18 @@ def build_dynamic_context():
     # ── 1. Published Blog Posts ──────────────────
     try:
         from blog.models import Post
-        posts = Post.objects.published().select_related('author').prefetch_related('category').order_by('-published_date')[:20]
+        posts = (
+            Post.objects.published()
+            .only('title', 'excerpt', 'auto_excerpt')
+            .prefetch_related('category')
+            .order_by('-published_date')[:20]
+        )
 
         if posts:
             blog_lines = []
             for post in posts:
                 categories = ', '.join(c.name for c in post.category.all()) or 'General'
-                excerpt = post.excerpt or ''
-                if not excerpt and post.content:
-                    # Strip HTML and take first 200 chars as excerpt
-                    excerpt = strip_tags(post.content)[:200].strip()
+                excerpt = post.excerpt or post.auto_excerpt
                 blog_lines.append(
                     f"  - \"{post.title}\" [{categories}]: {excerpt}"
                 )
@@ -10,7 +10,7 @@ from blog.models import Post
 def home(request):
     faqs = Faq.objects.all().order_by('-created_at')
     testimonials = Testimonial.objects.filter(is_active=True).order_by('-created_at')
-    posts = Post.objects.filter(status='published').order_by('-created_at')[:3]
+    posts = Post.objects.filter(status='published').cards().order_by('-created_at')[:3]
     return render(request, 'main/homepage.html', {'posts': posts, 'testimonials': testimonials, 'faqs': faqs})
 
 def about(request):